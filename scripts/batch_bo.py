@@ -0,0 +1,113 @@
+################################################################################
+ # Copyright (c) 2017 Dan Iorga, Tyler Sorenson, Alastair Donaldson
+
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+
+ # The above copyright notice and this permission notice shall be included in all
+ #copies or substantial portions of the Software.
+
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ # IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ # FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ # AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ # SOFTWARE.
+################################################################################
+
+
+"""@package python_scripts
+Bayesian optimisation proposing a batch of configurations at a time
+The surrogate is the Gaussian process of surrogate.py. A batch is built with the constant liar:
+each point is taken as if the points before it had already returned the worst value seen, so the
+batch spreads instead of proposing the same point k times.
+"""
+
+import numpy as np
+
+from surrogate import ParameterSpace, GaussianProcess, maximize_acquisition
+
+
+class BatchBayesianOptimization:
+    """
+    Maximise a function proposing several points at once
+    The random numbers come from numpy.random, so a tune replayed from its random state
+    proposes the same points again.
+    """
+
+    def __init__(self, params, kappa=6, candidates=2048):
+        """
+        :param params: The (type, min, max) of every parameter
+        :param kappa: Exploration weight of the upper confidence bound
+        :param candidates: Random points the acquisition is maximised over
+        """
+        self._space = ParameterSpace(params)
+        self._kappa = kappa
+        self._candidates = candidates
+        self._gp = GaussianProcess()
+
+        # Observations, encoded
+        self._x = []
+        self._y = []
+
+    def get_size(self):
+        """
+        :return: The number of observations
+        """
+        return len(self._y)
+
+    def random_points(self, count):
+        """
+        :param count: The number of points
+        :return: Points drawn uniformly in the bounds, one by row
+        """
+        return self._space.decode(self._space.sample(count))
+
+    def register(self, points, values):
+        """
+        Add observations, the surrogate is updated one at a time
+        :param points: The points, one by row
+        :param values: Their values
+        """
+        for x, y in zip(self._space.encode(points), values):
+            self._x.append(x)
+            self._y.append(y)
+            self._gp.add(x, y)
+
+    def _ucb(self, x):
+        (mean, std) = self._gp.predict(x)
+        return mean + self._kappa * std
+
+    def suggest(self, count):
+        """
+        Propose the next points, with the constant liar
+        :param count: The number of points
+        :return: The points, one by row
+        """
+        size = self._gp.get_size()
+        lie = min(self._y)
+        best = self._x[int(np.argmax(self._y))]
+
+        batch = []
+        for _ in range(count):
+            batch.append(maximize_acquisition(self._ucb, self._space, best, candidates=self._candidates))
+
+            # Pretend it came back with the worst value, the hyperparameters stay the same
+            self._gp.add(batch[-1], lie, refit=False)
+
+        # Forget the lies
+        self._gp.truncate(size)
+
+        return self._space.decode(np.array(batch))
+
+    def get_max(self):
+        """
+        :return: The best point observed and its value
+        """
+        best = int(np.argmax(self._y))
+        return self._space.decode(self._x[best])[0], self._y[best]
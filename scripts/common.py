@@ -25,15 +25,21 @@ import sys
 import re
 import time
 import os
+import errno
 import json
 import signal
+import select
+import hashlib
+import shutil
+import threading
+import atexit
+import glob
 from copy import deepcopy
-from collections import Counter
+from collections import deque
 
-from statistics import median
-from math import sqrt
-from scipy.special import erfcinv
-from scipy.stats.mstats import mquantiles
+import numpy as np
+from measurement_stats import IncrementalStats, CounterMatrix
+from perf_counters import get_pressure
 
 
 class ExperimentInfo:
@@ -59,6 +65,9 @@ class ExperimentInfo:
         self.max_temperature = 80
         self.stopping = "fixed"
         self.governor = "powersave"
+        # Optional frequency limits in kHz
+        self.min_frequency = None
+        self.max_frequency = None
 
         # Tuning info
         self.tuning_max_time = None
@@ -72,6 +81,63 @@ class ExperimentInfo:
         self.max_file = None
         self.output_binary = None
 
+        # Compiled enemy cache, at the root of the repository wherever the harness is run from
+        self.bin_cache_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           os.pardir, "bin_cache")) + "/"
+        self.bin_cache_size = 512
+
+        # Either "compile" every configuration or launch a "runtime" parameterised binary
+        self.enemy_build = "compile"
+        self.compile_workers = None
+
+        # Configurations compiled ahead while another one is measured, and the core they are compiled on
+        self.pipeline_depth = 0
+        self.pipeline_core = None
+
+        # Reuse the results of configurations measured before, up to max hits and for ttl seconds
+        self.memo_max_hits = 3
+        self.memo_ttl = None
+
+        # Drop candidates early, once they are clearly worse than the best one
+        self.racing = False
+        self.racing_initial_samples = 30
+
+        # Configurations the Bayesian optimisation proposes at a time, and if it searches all the cores together
+        self.bo_batch_size = None
+        self.bo_joint = False
+
+        # Cheaper variants of the experiment screening the candidates, lowest first, and the Hyperband halving rate
+        self.fidelities = []
+        self.hyperband_eta = 3
+        self._json_object = None
+
+        # Durable record of a tune, to resume it, and seconds between its writes
+        self.checkpoint_file = None
+        self.checkpoint_interval = 0
+
+        # Keep the enemies alive between measurements
+        self.persistent_enemies = False
+
+        # Sample the temperature in the background every that many seconds
+        self.temperature_sampling_interval = None
+
+        # How the page cache is reset before each SUT run, and the SUT inputs for "fadvise"
+        self.cache_reset = "sync_drop"
+        self.cache_reset_files = []
+
+        # Runs of a batched SUT per process, and how many runs before them are discarded
+        self.sut_repetitions = 1
+        self.sut_warmup = 0
+
+        # File keeping the confidence bounds of the stopping rules across runs
+        self.bounds_table_file = None
+
+        # Counters read through perf_event_open instead of instrument_cmd
+        self.perf_events = []
+        self.perf_enemy_cores = False
+        self.enemy_perf_events = None
+        self.perf_sample_interval = None
+
     def get_dict(self):
 
         result = dict()
@@ -87,6 +153,8 @@ class ExperimentInfo:
         result["max_temeperature"] = self.max_temperature
         result["stopping"] = self.stopping
         result["governor"] = self.governor
+        result["min_frequency"] = self.min_frequency
+        result["max_frequency"] = self.max_frequency
 
         result["tuning_max_time"] = self.tuning_max_time
         result["tuning_max_iterations"] = self.tuning_max_iterations
@@ -97,6 +165,34 @@ class ExperimentInfo:
         result["max_file"] = self.max_file
         result["output_binary"] = self.output_binary
 
+        result["bin_cache_dir"] = self.bin_cache_dir
+        result["bin_cache_size"] = self.bin_cache_size
+        result["enemy_build"] = self.enemy_build
+        result["compile_workers"] = self.compile_workers
+        result["pipeline_depth"] = self.pipeline_depth
+        result["pipeline_core"] = self.pipeline_core
+        result["memo_max_hits"] = self.memo_max_hits
+        result["memo_ttl"] = self.memo_ttl
+        result["racing"] = self.racing
+        result["racing_initial_samples"] = self.racing_initial_samples
+        result["bo_batch_size"] = self.bo_batch_size
+        result["bo_joint"] = self.bo_joint
+        result["fidelities"] = self.fidelities
+        result["hyperband_eta"] = self.hyperband_eta
+        result["checkpoint_file"] = self.checkpoint_file
+        result["checkpoint_interval"] = self.checkpoint_interval
+        result["persistent_enemies"] = self.persistent_enemies
+        result["temperature_sampling_interval"] = self.temperature_sampling_interval
+        result["cache_reset"] = self.cache_reset
+        result["cache_reset_files"] = self.cache_reset_files
+        result["sut_repetitions"] = self.sut_repetitions
+        result["sut_warmup"] = self.sut_warmup
+        result["bounds_table_file"] = self.bounds_table_file
+        result["perf_events"] = self.perf_events
+        result["perf_enemy_cores"] = self.perf_enemy_cores
+        result["enemy_perf_events"] = self.enemy_perf_events
+        result["perf_sample_interval"] = self.perf_sample_interval
+
         return result
 
     def read_json_object(self, json_object):
@@ -171,6 +267,19 @@ class ExperimentInfo:
             print("Unable to find governor in JSON, going for"
                   "default of powersave")
 
+        try:
+            self.min_frequency = int(json_object["min_frequency"])
+        except KeyError:
+            pass
+
+        try:
+            self.max_frequency = int(json_object["max_frequency"])
+        except KeyError:
+            pass
+
+        if self.min_frequency is not None and self.max_frequency is not None:
+            assert self.min_frequency <= self.max_frequency, "Minimum frequency above the maximum"
+
         # Tuning info
         try:
             self.tuning_max_time = int(json_object["tuning_max_time"])
@@ -205,6 +314,184 @@ class ExperimentInfo:
             # This means this is not a tuning, maybe I can make it more elegant somehow
             pass
 
+        # Compiled enemy cache, an empty folder disables it
+        try:
+            self.bin_cache_dir = str(json_object["bin_cache_dir"])
+        except KeyError:
+            pass
+
+        try:
+            self.bin_cache_size = int(json_object["bin_cache_size"])
+            assert self.bin_cache_size > 0, "Binary cache size is " + str(self.bin_cache_size)
+        except KeyError:
+            pass
+
+        try:
+            self.enemy_build = str(json_object["enemy_build"])
+            assert self.enemy_build in ["compile", "runtime"], "Unknown enemy build " + self.enemy_build
+        except KeyError:
+            pass
+
+        try:
+            self.compile_workers = int(json_object["compile_workers"])
+            assert self.compile_workers > 0, "Compile workers is " + str(self.compile_workers)
+        except KeyError:
+            pass
+
+        try:
+            self.pipeline_depth = int(json_object["pipeline_depth"])
+            assert self.pipeline_depth >= 0, "Pipeline depth is " + str(self.pipeline_depth)
+        except KeyError:
+            pass
+
+        try:
+            self.pipeline_core = int(json_object["pipeline_core"])
+        except KeyError:
+            pass
+
+        try:
+            self.memo_max_hits = int(json_object["memo_max_hits"])
+            assert self.memo_max_hits >= 0, "Memo max hits is " + str(self.memo_max_hits)
+        except KeyError:
+            pass
+
+        try:
+            self.memo_ttl = float(json_object["memo_ttl"])
+            assert self.memo_ttl > 0, "Memo TTL is " + str(self.memo_ttl)
+        except KeyError:
+            pass
+
+        try:
+            self.racing = bool(json_object["racing"])
+        except KeyError:
+            pass
+
+        try:
+            self.racing_initial_samples = int(json_object["racing_initial_samples"])
+            assert self.racing_initial_samples > 0, "Racing initial samples is " + str(self.racing_initial_samples)
+        except KeyError:
+            pass
+
+        try:
+            self.bo_batch_size = int(json_object["bo_batch_size"])
+            assert self.bo_batch_size > 0, "BO batch size is " + str(self.bo_batch_size)
+        except KeyError:
+            pass
+
+        try:
+            self.bo_joint = bool(json_object["bo_joint"])
+        except KeyError:
+            pass
+
+        try:
+            self.fidelities = [dict(fidelity) for fidelity in json_object["fidelities"]]
+        except KeyError:
+            pass
+
+        try:
+            self.hyperband_eta = int(json_object["hyperband_eta"])
+            assert self.hyperband_eta > 1, "Hyperband eta is " + str(self.hyperband_eta)
+        except KeyError:
+            pass
+
+        try:
+            self.checkpoint_file = str(json_object["checkpoint_file"])
+        except KeyError:
+            pass
+
+        try:
+            self.checkpoint_interval = float(json_object["checkpoint_interval"])
+            assert self.checkpoint_interval >= 0, "Checkpoint interval is " + str(self.checkpoint_interval)
+        except KeyError:
+            pass
+
+        try:
+            self.persistent_enemies = bool(json_object["persistent_enemies"])
+        except KeyError:
+            pass
+
+        try:
+            self.temperature_sampling_interval = float(json_object["temperature_sampling_interval"])
+            assert self.temperature_sampling_interval > 0, \
+                "Temperature sampling interval is " + str(self.temperature_sampling_interval)
+        except KeyError:
+            pass
+
+        try:
+            self.cache_reset = str(json_object["cache_reset"])
+            assert self.cache_reset in CacheReset.strategies, "Unknown cache reset " + self.cache_reset
+        except KeyError:
+            pass
+
+        try:
+            self.cache_reset_files = [str(f) for f in json_object["cache_reset_files"]]
+        except KeyError:
+            pass
+
+        try:
+            self.sut_repetitions = int(json_object["sut_repetitions"])
+            assert self.sut_repetitions > 0, "SUT repetitions is " + str(self.sut_repetitions)
+        except KeyError:
+            pass
+
+        try:
+            self.sut_warmup = int(json_object["sut_warmup"])
+            assert self.sut_warmup >= 0, "SUT warm-up is " + str(self.sut_warmup)
+        except KeyError:
+            pass
+
+        try:
+            self.bounds_table_file = str(json_object["bounds_table_file"])
+        except KeyError:
+            pass
+
+        try:
+            self.perf_events = [str(event) for event in json_object["perf_events"]]
+        except KeyError:
+            pass
+
+        try:
+            self.perf_enemy_cores = bool(json_object["perf_enemy_cores"])
+        except KeyError:
+            pass
+
+        try:
+            self.enemy_perf_events = [str(event) for event in json_object["enemy_perf_events"]]
+        except KeyError:
+            pass
+
+        try:
+            self.perf_sample_interval = float(json_object["perf_sample_interval"])
+            assert self.perf_sample_interval > 0, "Perf sample interval is " + str(self.perf_sample_interval)
+        except KeyError:
+            pass
+
+        # The fidelities are read from the same object, with their own attributes on top
+        self._json_object = dict(json_object)
+
+    def get_fidelity_levels(self):
+        """
+        :return: The number of fidelity levels, the full experiment being the last one
+        """
+        return len(self.fidelities) + 1
+
+    def get_fidelity(self, level):
+        """
+        :param level: The fidelity level, 0 is the cheapest
+        :return: The ExperimentInfo measuring at that level
+        """
+        if level is None or level == len(self.fidelities):
+            return self
+
+        assert 0 <= level < len(self.fidelities), "Unknown fidelity level " + str(level)
+        json_object = dict(self._json_object)
+        json_object.pop("fidelities", None)
+        json_object.update(self.fidelities[level])
+
+        experiment_info = ExperimentInfo(self.experiment_name)
+        experiment_info.read_json_object(json_object)
+        return experiment_info
+
 
 class MappingResult:
     """
@@ -216,9 +503,14 @@ class MappingResult:
         Create a MappingResult object
         :param mapping: A mapping dict
         """
-        self.measurements = None                # List of times for the mapping
+        self.measurements = None                # Array of times for the mapping
         self.perf = None                        # A dict of the output of perf
-        self.no_outliers_measurements = None    # List of times with outliers removed
+        self.perf_quantile = None               # A dict of the stable quantile of every perf counter
+        self.perf_runs = None                   # A dict of the perf counters of every run
+        self.perf_samples = None                # The counters read periodically during every run
+        self.enemy_counters = None              # The counters of every enemy core, for every run
+        self.enemy_pressure = None              # Pressure metrics of every enemy core
+        self.no_outliers_measurements = None    # Array of times with outliers removed
         self.temps = None                       # List of temperatures for the mapping
         self.stable_q = None                    # The quantile that was found stable
         self.q_value = None                     # The value of the quantile that was stable
@@ -229,47 +521,86 @@ class MappingResult:
         self.mapping = mapping                  # The mapping of enemy processes
         self.voluntary_switches = None          # Voluntary context switches
         self.involuntary_switches = None        # Involuntary context switches
+        self.cache_reset_time = None            # Seconds spent resetting the page cache
+        self.raced_out = False                  # If the mapping was dropped early by racing
 
     def log_result(self, perf_results, total_times, total_temps,
                          quantile, conf_min, conf_max, success,
                          voluntary_switches, involuntary_switches):
         """
         Log the parameters of the result
-        :param perf_results: A dict of all the params gathered by perf
-        :param total_times: A list of the total execution time
+        :param perf_results: A list of the dicts gathered by perf, or the CounterMatrix holding them
+        :param total_times: A list of the total execution time, or the IncrementalStats holding them
         :param total_temps: All the temperatures of the measurement
         :param quantile: The quantile that was chosen for the results
         :param conf_min: The minimum value of the confidence interval
         :param conf_max: The maximum value of the confidence interval
         :param success: If we were are able successfully get a stable quantile
-        :param voluntary_switches: Voluntary switches
-        :param involuntary_switches: Involuntary switches
+        :param voluntary_switches: Voluntary switches, one for each sample
+        :param involuntary_switches: Involuntary switches, one for each sample
         :return:
         """
-        sums = dict()
-        for res in perf_results:
-            sums = dict(Counter(sums) + Counter(res))
-        means = {k: sums[k] / float(len(perf_results)) for k in sums}
-        self.perf = means
-        self.measurements = total_times
-        self.no_outliers_measurements = remove_outliers(total_times)
+        if isinstance(perf_results, CounterMatrix):
+            counters = perf_results
+        else:
+            counters = CounterMatrix(max_runs=len(perf_results))
+            for res in perf_results:
+                counters.add(res)
+        self.perf = counters.get_means()
+        self.perf_quantile = counters.get_quantiles(quantile)
+        self.perf_runs = counters.get_runs()
+
+        # The outlier filter of the stopping rules is reused, not worked out again
+        if isinstance(total_times, IncrementalStats):
+            stats = total_times
+        else:
+            stats = IncrementalStats()
+            stats.add(total_times)
+        self.measurements = stats.get_samples()
+        self.no_outliers_measurements = self.measurements[stats.get_inlier_mask()]
         self.temps = total_temps
         self.stable_q = quantile
-        self.q_value = mquantiles(self.no_outliers_measurements, quantile)[0]
+        self.q_value = stats.quantiles([quantile])[0]
         self.q_min = conf_min
         self.q_max = conf_max
         self.success = success
         self.voluntary_switches = voluntary_switches
         self.involuntary_switches = involuntary_switches
 
+    def log_enemy_counters(self, core_counters):
+        """
+        Log the counters of the enemy cores
+        :param core_counters: The CoreCounters that counted around every run
+        """
+        total_time = sum(core_counters.windows)
+        self.enemy_counters = dict()
+        self.enemy_pressure = dict()
+        for core in core_counters.cores:
+            counters = CounterMatrix(max_runs=len(core_counters.windows))
+            for values in core_counters.runs[core]:
+                counters.add(values)
+            self.enemy_counters[core] = counters.get_runs()
+
+            # Rates over all the runs together
+            totals = np.nansum(counters.get_matrix(), axis=0).tolist()
+            self.enemy_pressure[core] = get_pressure(dict(zip(counters.get_events(), totals)), total_time)
+
     def get_dict(self):
         """
         :return: A dict with all the stored values
         """
         result = dict()
-        result["measurements"] = self.measurements
+        result["measurements"] = None if self.measurements is None else self.measurements.tolist()
         result['perf'] = self.perf
-        result["no_outliers_measurements"] = self.no_outliers_measurements
+        result['perf_quantile'] = self.perf_quantile
+        result['perf_runs'] = self.perf_runs
+        result['perf_samples'] = self.perf_samples
+        result['enemy_counters'] = None if self.enemy_counters is None else \
+            {str(core): self.enemy_counters[core] for core in self.enemy_counters}
+        result['enemy_pressure'] = None if self.enemy_pressure is None else \
+            {str(core): self.enemy_pressure[core] for core in self.enemy_pressure}
+        result["no_outliers_measurements"] = \
+            None if self.no_outliers_measurements is None else self.no_outliers_measurements.tolist()
         result["temps"] = self.temps
         result["stable_q"] = self.stable_q
         result["q_value"] = self.q_value
@@ -280,6 +611,26 @@ class MappingResult:
         result["mapping"] = str(self.mapping)
         result["voluntary_switches"] = self.voluntary_switches
         result["invluntary_switches"] = self.involuntary_switches
+        result["cache_reset_time"] = self.cache_reset_time
+        result["raced_out"] = self.raced_out
+
+        return result
+
+    @classmethod
+    def from_dict(cls, result_dict):
+        """
+        Rebuild a result from the dict it was logged as
+        :param result_dict: A dict made by get_dict
+        :return: A MappingResult object
+        """
+        result = cls(result_dict["mapping"])
+        for key in result_dict:
+            if key == "measurements" or key == "no_outliers_measurements":
+                setattr(result, key, None if result_dict[key] is None else np.array(result_dict[key]))
+            elif key == "invluntary_switches":
+                result.involuntary_switches = result_dict[key]
+            elif key != "mapping":
+                setattr(result, key, result_dict[key])
 
         return result
 
@@ -311,6 +662,17 @@ def get_event(data,field):
     return value
 
 
+def get_events(data, field):
+    """
+    From data, read the numbers of every occurrence of a field
+    :param data: The output to process
+    :param field: The field to search for
+    :return: List of floats, in the order they appear
+    """
+    data = re.sub(' +', ' ', str(data))
+    return [float(value) for value in re.findall(re.escape(field) + "(\d+(?:\.\d+)?)", data)]
+
+
 
 
 def remove_outliers(times, scale=3):
@@ -322,35 +684,252 @@ def remove_outliers(times, scale=3):
     """
 
     assert isinstance(times, list)
-    median_value = median(times)
+    values = np.asarray(times, dtype=float)
+    median_value = np.median(values)
+
+    scaled_mad = IncrementalStats.mad_constant * np.median(np.abs(values - median_value))
+    mask = (median_value - scale * scaled_mad <= values) & (values <= median_value + scale * scaled_mad)
 
-    c = -1 / (sqrt(2) * erfcinv(3 / 2))
-    temp = [abs(x-median_value) for x in times]
-    scaled_mad = c * median(temp)
+    return values[mask].tolist()
 
-    new_values = [x for x in times if median_value - scale * scaled_mad <= x <= median_value + scale * scaled_mad]
 
-    return new_values
+# A counter of "perf stat -x,", value,unit,event,...
+_perf_csv_pattern = re.compile(rb"^(\d+(?:\.\d+)?),[^,\n]*,([^,\n]+)", re.MULTILINE)
+
+# Compiled human readable perf patterns, by separator
+_perf_patterns = dict()
 
 
 def get_perf_event(data, separator="      "):
     """
     From data, Read the numbers provided by perf
+    Both the CSV output of "perf stat -x," and the human readable one are read in one pass.
     :param data: The output to process
     :param separator: In perf, it is usally number+<separator>+descriptor>
     :return: A dict of all the values found by perf
     """
+    if isinstance(data, str):
+        data = data.encode()
 
-    data = str(data)
-    result = dict()
+    counters = _perf_csv_pattern.findall(data)
+    if counters:
+        return {name.decode(): float(value) if b'.' in value else int(value) for value, name in counters}
+
+    if separator not in _perf_patterns:
+        _perf_patterns[separator] = re.compile(rb"(\d+(?:,\d+)*)" + re.escape(separator.encode()) + rb"(\S+)")
+
+    return {name.decode(): int(value.replace(b',', b'')) for value, name in _perf_patterns[separator].findall(data)}
+
+
+class CacheReset:
+    """
+    Reset the page cache before a SUT run
+    "none" leaves it as it is, "drop" writes drop_caches directly, "fadvise" only evicts
+    the SUT binary and its input files and "sync_drop" syncs all file systems first.
+    """
+
+    strategies = ["none", "drop", "fadvise", "sync_drop"]
+    drop_caches_file = "/proc/sys/vm/drop_caches"
+
+    def __init__(self, strategy, files=()):
+        """
+        :param strategy: One of the strategies
+        :param files: The files evicted by "fadvise"
+        """
+        assert strategy in self.strategies, "Unknown cache reset " + strategy
+        self._strategy = strategy
+        self._files = list(files)
+
+        # Overhead of the resets
+        self.resets = 0
+        self.total_time = 0.0
 
-    line = re.findall("\d+(?:,\d+)*" + separator + "(?:[^\s]+)", data)
-    for counter in line:
-        value = re.findall("\d+(?:,\d+)*", counter)[0]
-        name = re.findall("\d+(?:,\d+)*" + separator + "([^\s]+)", counter)[0]
-        result[name] = int(value.replace(',', ''))
+    def _drop_caches(self):
+        """
+        Free the clean page cache of the whole system
+        """
+        try:
+            with open(self.drop_caches_file, 'w') as f:
+                f.write("1")
+        except OSError as e:
+            print("Unable to write " + self.drop_caches_file + ": " + str(e))
+            sys.exit(1)
 
-    return result
+    def _fadvise(self):
+        """
+        Evict the pages of the given files only
+        """
+        for path in self._files:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                print("\n\tWARNING: Unable to open " + path + " to evict it from the cache\n")
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+    def reset(self):
+        """
+        Reset the cache with the chosen strategy
+        :return: The time it took in seconds
+        """
+        start = time.perf_counter()
+
+        if self._strategy == "drop":
+            self._drop_caches()
+        elif self._strategy == "fadvise":
+            self._fadvise()
+        elif self._strategy == "sync_drop":
+            os.sync()
+            self._drop_caches()
+
+        elapsed = time.perf_counter() - start
+        self.resets += 1
+        self.total_time += elapsed
+        return elapsed
+
+    def get_dict(self):
+        """
+        :return: The strategy and its overhead so far
+        """
+        result = dict()
+        result["strategy"] = self._strategy
+        result["resets"] = self.resets
+        result["total_time"] = self.total_time
+        result["mean_time"] = self.total_time / self.resets if self.resets else None
+
+        return result
+
+
+class ThermalSampler:
+    """
+    Read the temperature of the system from sysfs
+    The thermal zone is found once and its file is kept open. Optionally a background
+    thread samples it periodically and keeps the most recent readings with their time.
+    """
+
+    thermal_glob = "/sys/class/thermal/thermal_zone*/temp"
+
+    def __init__(self, buffer_size=4096):
+        """
+        :param buffer_size: The number of background readings kept
+        """
+        self._fd = None
+        self._readings = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _parse(raw):
+        """
+        :param raw: The content of a thermal zone file
+        :return: The temperature in degrees
+        """
+        value = float(raw)
+        if value > 1000:
+            value = value / 1000
+        return value
+
+    def _discover(self):
+        """
+        Open the first thermal zone that gives a realistic temperature
+        """
+        for path in sorted(glob.glob(self.thermal_glob)):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                value = self._parse(os.pread(fd, 32, 0))
+            except (OSError, ValueError):
+                continue
+
+            # A realistic value would be between 20 (room temperature) and 100 (this is the usual limit in the BIOS)
+            if 20 < value < 100:
+                self._fd = fd
+                return
+            os.close(fd)
+
+    def read(self):
+        """
+        :return: The system temperature, 0 if there is no usable thermal zone
+        """
+        # Until a zone is found, keep looking as a cold system might not look realistic
+        if self._fd is None:
+            self._discover()
+            if self._fd is None:
+                return 0
+
+        try:
+            return self._parse(os.pread(self._fd, 32, 0))
+        except ValueError:
+            print("\n\tWARNING: Unable to find temperature for this system\n")
+            return None
+
+    def _sample(self, interval):
+        """
+        Body of the sampling thread
+        :param interval: Time between readings in seconds
+        """
+        while not self._stop.wait(interval):
+            temp = self.read()
+            with self._lock:
+                self._readings.append((time.monotonic(), temp))
+
+    def start(self, interval):
+        """
+        Sample the temperature in a background thread
+        :param interval: Time between readings in seconds
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background sampling
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def get_readings(self, since=None):
+        """
+        :param since: Only return the readings taken after this time.monotonic() value
+        :return: List of (time, temperature) from the background sampling
+        """
+        with self._lock:
+            return [r for r in self._readings if since is None or r[0] >= since]
+
+    def get_peak(self, since):
+        """
+        The highest temperature since a given time, it reads the temperature now as well
+        so it works without the background sampling too.
+        :param since: A time.monotonic() value
+        :return: The peak temperature
+        """
+        temps = [temp for (t, temp) in self.get_readings(since) if temp is not None]
+        temp = self.read()
+        if temp is None:
+            return max(temps) if temps else None
+        return max(temps + [temp])
+
+    def close(self):
+        """
+        Stop sampling and close the thermal zone
+        """
+        self.stop()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# Shared by all the callers of get_temp
+_thermal_sampler = None
 
 
 def get_temp():
@@ -358,31 +937,167 @@ def get_temp():
     Get the temperature
     :return: The system temperature
     """
-    c = ProcessManagement()
+    global _thermal_sampler
+    if _thermal_sampler is None:
+        _thermal_sampler = ThermalSampler()
 
-    # Try to get the time from multiple thermal zones
-    cmd = "cat /sys/class/thermal/thermal_zone*/temp"
-    command_output = c.system_call(cmd, True)[0].decode('ascii')
+    return _thermal_sampler.read()
 
-    try:
-        temperatures = command_output.splitlines()
-        # print("Got the following temperatures", str(command_output))
-        # Check which of the values look realistic
-        temperature = 0
-        for temp in temperatures:
-            if float(temp)>1000:
-                value = float(temp) / 1000
-            else:
-                value = float(temp)
-            # A realistic value would be between 20 (room temperature) and 100 (this is the usual limit in the BIOS)
-            if 20 < value < 100:
-                temperature = value
-                break
 
-        return temperature
-    except ValueError:
-        print("\n\tWARNING: Unable to find temperature for this system\n")
-        return None
+class PlatformState:
+    """
+    The frequency scaling settings of the platform during an experiment
+    The governor, and optionally the frequency limits, are applied once when the experiment
+    starts and restored when it ends. Between measurements they are only read back.
+    """
+
+    cpufreq_glob = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/"
+
+    def __init__(self, governor, min_frequency=None, max_frequency=None):
+        """
+        :param governor: The governor to use on all the cores
+        :param min_frequency: The minimum frequency in kHz, None to keep it
+        :param max_frequency: The maximum frequency in kHz, None to keep it
+        """
+        # Settings by sysfs file name
+        self._settings = [("scaling_governor", governor)]
+        if max_frequency is not None:
+            self._settings.append(("scaling_max_freq", str(max_frequency)))
+        if min_frequency is not None:
+            self._settings.append(("scaling_min_freq", str(min_frequency)))
+
+        # Open sysfs files and the value to restore, by path
+        self._files = dict()
+        self._original = dict()
+        self._applied = False
+
+    @staticmethod
+    def _read(fd):
+        """
+        :param fd: An open sysfs file
+        :return: Its current value
+        """
+        return os.pread(fd, 64, 0).decode('ascii').strip()
+
+    @staticmethod
+    def _write(path, value):
+        """
+        Write a sysfs file, through sudo if the harness is not privileged
+        :param path: The sysfs file
+        :param value: The value to write
+        """
+        try:
+            with open(path, 'w') as f:
+                f.write(value)
+        except PermissionError:
+            ProcessManagement.system_call("echo " + value + " | sudo tee " + path)
+        except OSError as e:
+            # Such as a minimum above the maximum, the other settings are still written
+            print("\n\tWARNING: Unable to set " + path + " to " + value + ": " + e.strerror + "\n")
+
+    def _write_all(self, paths):
+        """
+        Write the sysfs files that differ, the frequency limits in an order the kernel accepts
+        Raising the minimum above the old maximum needs the new maximum first and lowering the
+        maximum below the old minimum needs the new minimum first, so a maximum that goes up is
+        written before the minimums and one that goes down after them.
+        :param paths: The opened sysfs files with the value to write
+        """
+        def order(item):
+            (path, value) = item
+            if os.path.basename(path) != "scaling_max_freq":
+                return 1
+            return 0 if int(value) > int(self._read(self._files[path])) else 2
+
+        for path, value in sorted(paths, key=order):
+            if self._read(self._files[path]) != value:
+                self._write(path, value)
+
+    def _get_paths(self):
+        """
+        :return: The sysfs files to set, in the order they are written
+        """
+        paths = []
+        cpufreq_dirs = sorted(glob.glob(self.cpufreq_glob))
+        for name, value in self._settings:
+            for cpufreq_dir in cpufreq_dirs:
+                if os.path.exists(cpufreq_dir + name):
+                    paths.append((cpufreq_dir + name, value))
+        return paths
+
+    def apply(self):
+        """
+        Save the current settings and apply the ones of the experiment
+        They are restored when the harness exits, if restore was not called before.
+        """
+        if self._applied:
+            return
+
+        paths = self._get_paths()
+        if not paths:
+            print("\n\tWARNING: Unable to find cpufreq for this system\n")
+
+        for path, value in paths:
+            self._files[path] = os.open(path, os.O_RDONLY)
+            self._original[path] = self._read(self._files[path])
+
+        # The governor first, then the frequency limits
+        for path, value in paths:
+            if os.path.basename(path) == "scaling_governor":
+                self._write(path, value)
+        self._write_all([(path, value) for path, value in paths if os.path.basename(path) != "scaling_governor"])
+
+        self._applied = True
+        atexit.register(self.restore)
+
+    def check(self):
+        """
+        Read the settings back and apply them again if something changed them
+        :return: True if the settings were still in place
+        """
+        if not self._applied:
+            self.apply()
+            return True
+
+        changed = [(path, value) for path, value in self._get_expected() if self._read(self._files[path]) != value]
+        for path, value in changed:
+            print("\n\tWARNING: " + path + " changed, setting it back to " + value + "\n")
+        self._write_all(changed)
+
+        return not changed
+
+    def _get_expected(self):
+        """
+        :return: The opened sysfs files with the value they should have
+        """
+        values = dict(self._settings)
+        return [(path, values[os.path.basename(path)]) for path in self._files]
+
+    def restore(self):
+        """
+        Put back the settings found before the experiment
+        """
+        if not self._applied:
+            return
+
+        # The frequency limits are undone before the governor
+        self._write_all([(path, value) for path, value in self._original.items()
+                         if os.path.basename(path) != "scaling_governor"])
+        for path in self._files:
+            if os.path.basename(path) == "scaling_governor" and self._read(self._files[path]) != self._original[path]:
+                self._write(path, self._original[path])
+            os.close(self._files[path])
+
+        self._files = dict()
+        self._original = dict()
+        self._applied = False
+        atexit.unregister(self.restore)
+
+    def get_dict(self):
+        """
+        :return: The settings applied for the experiment
+        """
+        return dict(self._settings)
 
 
 class ProcessManagement:
@@ -390,14 +1105,14 @@ class ProcessManagement:
     This class is designed to manage background classes and foreground processes
     and to be able to kill them efficiantly when necessary.
     """
-    def __init__(self, sleep_startup=0.01, sleep_shutdown=0.01):
+    def __init__(self, sleep_startup=0.01, kill_timeout=1.0):
         """
         :param sleep_startup:  Delay between starting tasks
-        :param sleep_shutdown: Delay between killing tasks
+        :param kill_timeout: Time given to the background tasks to terminate before they are killed
         """
         self._background_procs = []
         self._sleep_startup = sleep_startup
-        self._sleep_shutdown = sleep_shutdown
+        self._kill_timeout = kill_timeout
 
     @staticmethod
     def system_call(command, silent=False):
@@ -415,6 +1130,87 @@ class ProcessManagement:
         # return p.stdout.read(),p.stderr.read()
         return p.communicate()
 
+    @staticmethod
+    def launch(argv, core=None, niceness=None, new_session=False, before_exec=None, env=None, **kwargs):
+        """
+        Start a binary pinned to a core and reniced, without running Python in the child
+        The harness has threads, and a preexec_fn can deadlock the child before exec. The child is
+        a shell that stops itself instead. Its affinity and priority are set from here, then it
+        executes the binary, which inherits them.
+        :param argv: The binary and its arguments
+        :param core: Core to run on
+        :param niceness: Nice value to run with
+        :param new_session: Start a new session, so the child leads its process group
+        :param before_exec: Function of the pid, called before the binary is executed
+        :param env: Variables added to the environment of the binary
+        :param kwargs: Other arguments of subprocess.Popen, like stdout
+        :return: The Popen object
+        """
+        # Like Popen, fail here rather than in the child
+        if shutil.which(argv[0]) is None:
+            raise FileNotFoundError(errno.ENOENT, "No such executable", argv[0])
+
+        if env:
+            env = dict(os.environ, **env)
+
+        process = subprocess.Popen(["/bin/sh", "-c", 'kill -STOP $$; exec "$@"', "sh"] + list(argv),
+                                   start_new_session=new_session, env=env, **kwargs)
+        try:
+            (_, status) = os.waitpid(process.pid, os.WUNTRACED)
+            if not os.WIFSTOPPED(status):
+                process.returncode = os.waitstatus_to_exitcode(status)
+                raise RuntimeError("Unable to start " + " ".join(argv))
+
+            if core is not None:
+                os.sched_setaffinity(process.pid, {int(core)})
+            if niceness is not None:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, process.pid, niceness)
+                except OSError:
+                    # Like nice, keep going without the privileges for a negative value
+                    pass
+            if before_exec is not None:
+                before_exec(process.pid)
+        except BaseException:
+            if process.returncode is None:
+                os.kill(process.pid, signal.SIGKILL)
+                process.wait()
+            raise
+
+        os.kill(process.pid, signal.SIGCONT)
+        return process
+
+    @staticmethod
+    def run_argv(argv, core=None, niceness=None, silent=False, env=None):
+        """
+        Run a binary directly, without a shell, and wait for it to terminate
+        :param argv: The binary and its arguments
+        :param core: Core to run on
+        :param niceness: Nice value to run with
+        :param silent: Surpress verbose
+        :param env: Variables added to the environment of the binary
+        :return: Call output and error
+        """
+        if not silent:
+            print("executing command: " + " ".join(argv))
+
+        p = ProcessManagement.launch(argv, core=core, niceness=niceness, env=env,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+
+        return p.communicate()
+
+    def run_argv_background(self, argv, core=None):
+        """
+        Run a binary directly, without a shell, and leave it in the background
+        :param argv: The binary and its arguments
+        :param core: Core to run on
+        """
+        print("executing command: " + " ".join(argv) + " in the background")
+        self._track(self.launch(argv, core=core, new_session=True,
+                                stdout=subprocess.PIPE))
+        time.sleep(self._sleep_startup)
+
     def system_call_background(self, command):
         """
         Call a background system command and leave it in the background
@@ -422,36 +1218,85 @@ class ProcessManagement:
         """
 
         print("executing command: " + command + " in the background")
-        self._background_procs.append(subprocess.Popen(command,
-                                                       stdout=subprocess.PIPE,
-                                                       shell=True,
-                                                       preexec_fn=os.setsid))
+        self._track(subprocess.Popen(command,
+                                     stdout=subprocess.PIPE,
+                                     shell=True,
+                                     start_new_session=True))
         time.sleep(self._sleep_startup)
 
-    def kill_stress(self):
+    def _track(self, process):
         """
-        Kill all the background stress commands
+        Remember a background process, it leads its own process group
+        :param process: The Popen object of the process
         """
+        self._background_procs.append((process, self.open_pidfd(process.pid)))
 
-        for p in self._background_procs:
-            os.killpg(os.getpgid(p.pid), signal.SIGTERM)
-            time.sleep(self._sleep_shutdown)
-
-        self._background_procs = []
+    @staticmethod
+    def open_pidfd(pid):
+        """
+        :param pid: A child process
+        :return: A pidfd of the process, or None if the platform does not support them
+        """
+        try:
+            return os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            return None
 
-        # To make sure nothing is left, I suspect the previous step does not always work
-        p = subprocess.Popen(['ps', '-A'], stdout=subprocess.PIPE)
-        out, err = p.communicate()
+    @staticmethod
+    def signal_group(pgid, sig):
+        """
+        Send a signal to a process group, if anything is left in it
+        :param pgid: The process group
+        :param sig: The signal
+        """
+        try:
+            os.killpg(pgid, sig)
+        except OSError:
+            pass
 
-        for line in out.splitlines():
-            if b'_enemy' in line:
-                pid = int(line.split(None, 1)[0])
+    @staticmethod
+    def wait_groups(procs, timeout):
+        """
+        Wait for signalled process group leaders to exit and reap them
+        Leaders that are still running after the timeout are killed. Whatever they
+        left behind in their group is killed before the leader is reaped, while the
+        group id can not be reused yet.
+        :param procs: List of (Popen object, pidfd or None) of group leaders
+        :param timeout: Time in seconds given to all of them together
+        """
+        deadline = time.monotonic() + timeout
+
+        for process, pidfd in procs:
+            remaining = max(deadline - time.monotonic(), 0)
+            if pidfd is not None:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                if not poller.poll(remaining * 1000):
+                    ProcessManagement.signal_group(process.pid, signal.SIGKILL)
+            else:
+                # Without pidfd the leader is reaped as soon as it exits
                 try:
-                    os.kill(pid, signal.SIGKILL)
-                except OSError:
+                    process.wait(remaining)
+                except subprocess.TimeoutExpired:
                     pass
 
-        time.sleep(self._sleep_shutdown)
+            ProcessManagement.signal_group(process.pid, signal.SIGKILL)
+            process.wait()
+
+            if pidfd is not None:
+                os.close(pidfd)
+            if process.stdout is not None:
+                process.stdout.close()
+
+    def kill_stress(self):
+        """
+        Kill all the background stress commands
+        """
+        for process, pidfd in self._background_procs:
+            self.signal_group(process.pid, signal.SIGTERM)
+
+        self.wait_groups(self._background_procs, self._kill_timeout)
+        self._background_procs = []
 
     def __del__(self):
         """
@@ -462,6 +1307,295 @@ class ProcessManagement:
         # self.kill_stress()
 
 
+class EnemyWorker:
+    """
+    A long lived enemy process pinned to a core
+    Between measurements the worker is paused instead of killed. Runtime parameterised
+    enemies are reconfigured in place, the others are kept as long as their binary is the same.
+    """
+
+    def __init__(self, command, core, sleep_startup=0.01):
+        """
+        Start the worker
+        :param command: The enemy binary, optionally followed by its runtime parameters
+        :param core: Core to start on
+        :param sleep_startup: Delay after starting the worker
+        """
+        self._binary, self._arguments = self.split_command(command)
+        self._identity = self._get_identity(self._binary)
+        self._paused = False
+
+        # The last reconfiguration sent, and the one the worker acknowledged
+        self._sequence = 0
+        self._acknowledged = 0
+        self._output = b""
+
+        argv = ["./" + self._binary]
+        if self._arguments:
+            argv += ["--listen"] + self._arguments.split()
+
+        print("executing command: " + " ".join(argv) + " as a worker on core " + str(core))
+        self._process = ProcessManagement.launch(argv, core=core, new_session=True,
+                                                 stdin=subprocess.PIPE,
+                                                 stdout=subprocess.PIPE)
+        self._pidfd = ProcessManagement.open_pidfd(self._process.pid)
+        time.sleep(sleep_startup)
+
+    @staticmethod
+    def split_command(command):
+        """
+        :param command: The enemy binary, optionally followed by its runtime parameters
+        :return: The binary and the string of parameters
+        """
+        parts = command.split(None, 1)
+        return parts[0], parts[1] if len(parts) > 1 else ""
+
+    @staticmethod
+    def _get_identity(binary):
+        """
+        :return: Something that changes when the binary is rebuilt
+        """
+        stat = os.stat(binary)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def reconfigure(self, command):
+        """
+        Switch the worker to a new command without restarting it, if possible
+        :param command: The enemy binary, optionally followed by its runtime parameters
+        :return: True if the worker now runs command, False if it has to be replaced
+        """
+        binary, arguments = self.split_command(command)
+
+        if self._process.poll() is not None or binary != self._binary:
+            return False
+        if self._get_identity(binary) != self._identity:
+            return False
+
+        if arguments != self._arguments:
+            # Only the runtime parameterised enemies listen for new parameters
+            if not arguments or not self._arguments:
+                return False
+            self._sequence += 1
+            self._process.stdin.write(("SEQ=" + str(self._sequence) + " " + arguments + "\n").encode())
+            self._process.stdin.flush()
+            # Delivered when the worker is resumed, if it is paused
+            os.kill(self._process.pid, signal.SIGUSR1)
+            self._arguments = arguments
+
+        return True
+
+    def wait_configured(self, timeout=5.0):
+        """
+        Wait until the resumed worker runs with the parameters of the last reconfiguration
+        The template only reads them at its next outer iteration, and acknowledges with "ACK n".
+        :param timeout: Seconds to wait for the acknowledgement
+        :return: True once acknowledged, False if the worker has to be replaced
+        """
+        t_end = time.time() + timeout
+        stdout = self._process.stdout.fileno()
+
+        while self._acknowledged < self._sequence:
+            remaining = t_end - time.time()
+            if remaining <= 0 or not select.select([stdout], [], [], remaining)[0]:
+                return False
+
+            data = os.read(stdout, 4096)
+            if not data:
+                return False
+            self._output += data
+
+            lines = self._output.split(b"\n")
+            self._output = lines.pop()
+            for line in lines:
+                if line.startswith(b"ACK "):
+                    self._acknowledged = max(self._acknowledged, int(line.split()[1]))
+
+        return True
+
+    def pause(self):
+        """
+        Stop the worker from using the core
+        """
+        if not self._paused:
+            os.killpg(self._process.pid, signal.SIGSTOP)
+            self._paused = True
+
+    def resume(self):
+        """
+        Let the worker run again
+        """
+        if self._paused:
+            os.killpg(self._process.pid, signal.SIGCONT)
+            self._paused = False
+
+    def stop(self, kill_timeout=1.0):
+        """
+        Terminate the worker
+        :param kill_timeout: Time given to the worker to terminate before it is killed
+        """
+        ProcessManagement.signal_group(self._process.pid, signal.SIGTERM)
+        ProcessManagement.signal_group(self._process.pid, signal.SIGCONT)
+        ProcessManagement.wait_groups([(self._process, self._pidfd)], kill_timeout)
+        self._process.stdin.close()
+        self._process.stdout.close()
+
+
+class BinaryCache:
+    """
+    A persistent cache of compiled enemy processes
+    Binaries are stored under a hash of everything that goes into the compilation,
+    so the same template and defines are only compiled once, even across runs.
+    """
+
+    def __init__(self, cache_dir, max_entries=512):
+        """
+        Create a BinaryCache object, create the folder if needed
+        :param cache_dir: The folder where the binaries are stored
+        :param max_entries: The maximum number of binaries kept, least recently used are evicted
+        """
+        self._cache_dir = cache_dir
+        self._max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        # Which key each output file currently holds, and the file it was, so it is not copied again
+        self._installed = dict()
+
+        # Enemies are compiled concurrently
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+    @staticmethod
+    def get_key(source_files, defines, compiler_cmd):
+        """
+        Hash the compilation inputs
+        :param source_files: A list of files whose content determines the binary
+        :param defines: A list of -D flags
+        :param compiler_cmd: The compiler and all the flags that are not defines
+        :return: The hex digest used as key
+        """
+        h = hashlib.sha256()
+        for source_file in source_files:
+            with open(source_file, 'rb') as f:
+                h.update(f.read())
+        for define in sorted(defines):
+            h.update(define.encode() + b'\0')
+        h.update(compiler_cmd.encode())
+
+        return h.hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self._cache_dir, key + "_enemy")
+
+    @staticmethod
+    def _get_identity(path):
+        """
+        :return: Something that changes when the file is written or replaced, None if it is missing
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def install(source, destination, keep_time=False):
+        """
+        Copy a binary into place without writing to the file at destination
+        A paused persistent enemy may still be executing the old file, which can not be opened for
+        writing. The copy is renamed over it instead, so the binary also gets a new inode.
+        :param source: The binary
+        :param destination: Where it is needed
+        :param keep_time: Keep the modification time of source, like shutil.copy2
+        """
+        temp_path = os.path.join(os.path.dirname(os.path.abspath(destination)),
+                                 "." + os.path.basename(destination) + "." + str(os.getpid()) + "_" +
+                                 str(threading.get_ident()))
+        if keep_time:
+            shutil.copy2(source, temp_path)
+        else:
+            shutil.copy(source, temp_path)
+        os.replace(temp_path, destination)
+
+    def fetch(self, key, output_file):
+        """
+        Copy the cached binary to output_file, if present
+        :param key: The key returned by get_key
+        :param output_file: Where the binary is needed
+        :return: True on a hit, False on a miss
+        """
+        with self._lock:
+            path = self._get_path(key)
+
+            # Anything else written there since, like a copy of another core's binary, is a new file
+            if self._installed.get(output_file) == (key, self._get_identity(output_file)):
+                # Still a use of the entry, if it was not evicted meanwhile
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self.hits += 1
+                return True
+
+            if not os.path.isfile(path):
+                self.misses += 1
+                return False
+
+            # The modification time is used to keep track of the least recently used
+            os.utime(path)
+            self.install(path, output_file)
+            self._installed[output_file] = (key, self._get_identity(output_file))
+            self.hits += 1
+            return True
+
+    def store(self, key, binary_file):
+        """
+        Add a freshly compiled binary to the cache
+        :param key: The key returned by get_key
+        :param binary_file: The compiled binary
+        """
+        path = self._get_path(key)
+
+        # Copy and rename, so other harness instances never see a partial binary
+        temp_path = path + "." + str(os.getpid()) + "_" + str(threading.get_ident())
+        shutil.copy(binary_file, temp_path)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._installed[binary_file] = (key, self._get_identity(binary_file))
+            self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used binaries above max_entries
+        """
+        entries = [os.path.join(self._cache_dir, f) for f in os.listdir(self._cache_dir) if f.endswith("_enemy")]
+        if len(entries) <= self._max_entries:
+            return
+
+        entries.sort(key=lambda f: os.stat(f).st_mtime)
+        for entry in entries[:len(entries) - self._max_entries]:
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+
+    def get_dict(self):
+        """
+        :return: A dict with the cache counters
+        """
+        result = dict()
+        result["cache_dir"] = self._cache_dir
+        result["max_entries"] = self._max_entries
+        result["hits"] = self.hits
+        result["misses"] = self.misses
+
+        return result
+
+
 class DataLog:
     """
     A class used for storing and logging all data.
@@ -494,6 +1628,15 @@ class DataLog:
         self._data[experiment_name] = experiment_info.get_dict()
         self._data[self._experiment_name]["it"] = dict()
 
+    def log_stats(self, name, stats):
+        """
+        Logs statistics that cover the whole experiment rather than one iteration
+        :param name: The key under which the statistics are stored
+        :param stats: A dict of values
+        :return:
+        """
+        self._data[self._experiment_name][name] = stats
+
     def __del__(self):
         """
         Remove temp files and temp dir
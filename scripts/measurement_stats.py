@@ -0,0 +1,459 @@
+################################################################################
+ # Copyright (c) 2017 Dan Iorga, Tyler Sorenson, Alastair Donaldson
+
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+
+ # The above copyright notice and this permission notice shall be included in all
+ #copies or substantial portions of the Software.
+
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ # IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ # FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ # AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ # SOFTWARE.
+################################################################################
+
+
+import os
+from array import array
+from bisect import insort, bisect_left, bisect_right
+from math import sqrt
+
+import numpy as np
+from scipy.special import erfcinv
+from scipy.stats import binom
+
+
+def order_statistic_bounds(n, quantiles, confidence_interval):
+    """
+    Find the order statistics bounding a quantile with a given confidence
+    The interval around round(q * (n + 1)) is widened one step at a time on both sides
+    until the binomial probability it covers reaches the confidence. All the quantiles
+    are done in one vectorized pass.
+    :param n: The number of samples
+    :param quantiles: The quantiles
+    :param confidence_interval: The confidence interval
+    :return: Arrays of the lower and upper index in the sorted samples, by quantile
+    """
+    q = np.asarray(quantiles, dtype=float)
+    middle = np.rint(q * (n + 1)).astype(int)[:, None]
+
+    # After n + 1 steps both ends have been reached whatever the middle is
+    steps = np.arange(1, n + 2)[None, :]
+    ui = np.maximum(middle, np.minimum(middle + steps, n - 1))
+    li = np.minimum(middle, np.maximum(middle - steps, 0))
+
+    # cdf[:, k + 1] is the probability of at most k samples below the quantile
+    cdf = binom.cdf(np.arange(-1, n + 1)[None, :], n, q[:, None])
+    confidence = np.take_along_axis(cdf, ui, axis=1) - np.take_along_axis(cdf, li, axis=1)
+
+    done = (confidence >= confidence_interval) | ((ui >= n - 1) & (li <= 0))
+    step = np.argmax(done, axis=1)[:, None]
+    ui = np.take_along_axis(ui, step, axis=1)[:, 0]
+    li = np.take_along_axis(li, step, axis=1)[:, 0]
+
+    ui = np.minimum(ui, n - 1)
+    li = np.where((li <= 0) | (li > ui), 0, li)
+
+    return li, ui
+
+
+def upper_order_statistic(n, quantile, confidence_interval):
+    """
+    Find the order statistic above a quantile with a given one-sided confidence
+    The k-th smallest sample is above the quantile when at most k - 1 samples are below it,
+    so the index is the smallest whose binomial probability reaches the confidence.
+    :param n: The number of samples
+    :param quantile: The quantile
+    :param confidence_interval: The one-sided confidence
+    :return: The index in the sorted samples, None if even the maximum is not enough
+    """
+    cdf = binom.cdf(np.arange(n), n, quantile)
+    if cdf[-1] < confidence_interval:
+        return None
+
+    return int(np.argmax(cdf >= confidence_interval))
+
+
+class OrderStatisticTable:
+    """
+    Memoised order statistic bounds for one confidence interval
+    The bounds only depend on the number of samples and the quantile, so each one is
+    calculated once per experiment. The table can be kept in a file across experiments.
+    """
+
+    def __init__(self, confidence_interval, table_file=None):
+        """
+        :param confidence_interval: The confidence interval of all the bounds
+        :param table_file: Optional .npz file the table is loaded from and saved to
+        """
+        self.confidence_interval = confidence_interval
+
+        # numpy adds the extension when saving, so it is needed to find the file again
+        if table_file and not table_file.endswith(".npz"):
+            table_file += ".npz"
+        self._table_file = table_file
+
+        # (lower index, upper index) by (number of samples, quantile)
+        self._bounds = dict()
+        self._changed = False
+
+        if table_file and os.path.exists(table_file):
+            self._load()
+
+    def _load(self):
+        """
+        Read the bounds saved in the table file, if they are for the same confidence interval
+        """
+        data = np.load(self._table_file)
+        if float(data["confidence_interval"]) != self.confidence_interval:
+            print("\n\tWARNING: " + self._table_file + " is for another confidence interval, ignoring it\n")
+            return
+
+        for n, q, li, ui in zip(data["n"], data["quantile"], data["li"], data["ui"]):
+            self._bounds[(int(n), float(q))] = (int(li), int(ui))
+
+    def save(self):
+        """
+        Write the table file, if there is one and new bounds were calculated
+        """
+        if not self._table_file or not self._changed:
+            return
+
+        keys = list(self._bounds)
+        np.savez(self._table_file,
+                 confidence_interval=self.confidence_interval,
+                 n=np.array([k[0] for k in keys], dtype=int),
+                 quantile=np.array([k[1] for k in keys], dtype=float),
+                 li=np.array([self._bounds[k][0] for k in keys], dtype=int),
+                 ui=np.array([self._bounds[k][1] for k in keys], dtype=int))
+        self._changed = False
+
+    def get_bounds(self, n, quantiles):
+        """
+        Look the bounds up, the missing ones are calculated together
+        :param n: The number of samples
+        :param quantiles: The quantiles
+        :return: Arrays of the lower and upper index in the sorted samples, by quantile
+        """
+        quantiles = [float(q) for q in quantiles]
+        missing = [q for q in quantiles if (n, q) not in self._bounds]
+        if missing:
+            li, ui = order_statistic_bounds(n, missing, self.confidence_interval)
+            for q, l, u in zip(missing, li, ui):
+                self._bounds[(n, q)] = (int(l), int(u))
+            self._changed = True
+
+        bounds = np.array([self._bounds[(n, q)] for q in quantiles], dtype=int).reshape(-1, 2)
+        return bounds[:, 0], bounds[:, 1]
+
+    def precompute(self, max_samples, quantiles):
+        """
+        Calculate the bounds of every number of samples up to a maximum
+        :param max_samples: The largest number of samples
+        :param quantiles: The quantiles
+        """
+        for n in range(1, max_samples + 1):
+            self.get_bounds(n, quantiles)
+
+
+def sorted_quantiles(sorted_values, quantiles):
+    """
+    The same quantiles as scipy.stats.mstats.mquantiles, for values already sorted
+    :param sorted_values: Sorted array of values
+    :param quantiles: The quantiles
+    :return: Array of the values of the quantiles
+    """
+    p = np.asarray(quantiles, dtype=float)
+    n = len(sorted_values)
+    if n == 1:
+        return np.resize(sorted_values, p.shape)
+
+    # The default plotting positions of mquantiles
+    alphap, betap = 0.4, 0.4
+    aleph = n * p + (alphap + p * (1. - alphap - betap))
+    k = np.floor(np.clip(aleph, 1, n - 1)).astype(int)
+    gamma = np.clip(aleph - k, 0, 1)
+
+    return (1. - gamma) * sorted_values[k - 1] + gamma * sorted_values[k]
+
+
+class IncrementalStats:
+    """
+    Keep measured samples sorted as they arrive
+    The median, the MAD outlier filter, the quantiles and their confidence intervals are
+    worked out from the sorted samples, without sorting or filtering them again. The samples
+    are stored as doubles, both in the order they arrived and sorted.
+    """
+
+    # Scale of the MAD for normally distributed samples
+    mad_constant = -1 / (sqrt(2) * erfcinv(3 / 2))
+
+    def __init__(self, scale=3, bounds_table=None):
+        """
+        :param scale: Samples further than scale scaled MADs from the median are outliers
+        :param bounds_table: Optional OrderStatisticTable the confidence bounds are looked up in
+        """
+        self._scale = scale
+        self._bounds_table = bounds_table
+        self._samples = array('d')
+        self._sorted = array('d')
+
+        # Outlier limits and filtered samples, worked out again only after new samples
+        self._limits = None
+        self._filtered = None
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def add(self, values):
+        """
+        Add new samples
+        :param values: A list of samples
+        """
+        self._samples.extend(values)
+        for value in values:
+            insort(self._sorted, value)
+        if values:
+            self._limits = None
+            self._filtered = None
+
+    def get_samples(self):
+        """
+        :return: Array of all the samples, in the order they arrived
+        """
+        return np.frombuffer(self._samples.tobytes(), dtype=float)
+
+    def get_median(self):
+        """
+        :return: The median of all the samples
+        """
+        n = len(self._sorted)
+        if n % 2:
+            return self._sorted[n // 2]
+        return (self._sorted[n // 2 - 1] + self._sorted[n // 2]) / 2
+
+    def _get_deviation(self, median_value, split, k):
+        """
+        The k-th smallest absolute deviation from the median
+        The deviations below and above the median are both sorted already, so this is
+        a selection in two sorted sequences.
+        :param median_value: The median
+        :param split: The number of samples not above the median
+        :param k: The rank of the deviation, from 0
+        :return: The deviation
+        """
+        below = lambda i: median_value - self._sorted[split - 1 - i]
+        above = lambda j: self._sorted[split + j] - median_value
+
+        lo = max(0, k + 1 - (len(self._sorted) - split))
+        hi = min(k + 1, split)
+        while lo < hi:
+            i = (lo + hi) // 2
+            if below(i) < above(k - i):
+                lo = i + 1
+            else:
+                hi = i
+
+        candidates = []
+        if lo > 0:
+            candidates.append(below(lo - 1))
+        if k + 1 - lo > 0:
+            candidates.append(above(k - lo))
+        return max(candidates)
+
+    def get_mad(self):
+        """
+        :return: The median absolute deviation from the median
+        """
+        n = len(self._sorted)
+        median_value = self.get_median()
+        split = bisect_right(self._sorted, median_value)
+
+        if n % 2:
+            return self._get_deviation(median_value, split, n // 2)
+        return (self._get_deviation(median_value, split, n // 2 - 1) +
+                self._get_deviation(median_value, split, n // 2)) / 2
+
+    def get_limits(self):
+        """
+        :return: The lowest and highest values that are not outliers
+        """
+        if self._limits is None:
+            median_value = self.get_median()
+            scaled_mad = self.mad_constant * self.get_mad()
+            self._limits = (median_value - self._scale * scaled_mad, median_value + self._scale * scaled_mad)
+
+        return self._limits
+
+    def get_filtered(self):
+        """
+        :return: Sorted array of the samples that are not outliers
+        """
+        if self._filtered is None:
+            (low_limit, high_limit) = self.get_limits()
+            low = bisect_left(self._sorted, low_limit)
+            high = bisect_right(self._sorted, high_limit)
+            self._filtered = np.frombuffer(self._sorted[low:high].tobytes(), dtype=float)
+
+        return self._filtered
+
+    def get_inlier_mask(self):
+        """
+        :return: Boolean array, in the order the samples arrived, of the ones that are not outliers
+        """
+        (low_limit, high_limit) = self.get_limits()
+        samples = self.get_samples()
+        return (low_limit <= samples) & (samples <= high_limit)
+
+    def quantiles(self, quantiles):
+        """
+        :param quantiles: The quantiles
+        :return: Array of their values, without the outliers
+        """
+        return sorted_quantiles(self.get_filtered(), quantiles)
+
+    def confidence_variations(self, quantiles, confidence_interval):
+        """
+        Calculate the confidence interval of several quantiles at once
+        :param quantiles: The quantiles
+        :param confidence_interval: The confidence interval
+        :return: Arrays of confidence_variation, lower confidence, upper confidence
+        """
+        assert 0.5 < confidence_interval < 1, "Desired confidence interval should be between 0.5 and 1"
+        filtered = self.get_filtered()
+        assert len(filtered), "No samples to calculate the confidence interval"
+
+        if self._bounds_table is not None and self._bounds_table.confidence_interval == confidence_interval:
+            li, ui = self._bounds_table.get_bounds(len(filtered), quantiles)
+        else:
+            li, ui = order_statistic_bounds(len(filtered), quantiles, confidence_interval)
+        lower_range = filtered[li]
+        upper_range = filtered[ui]
+
+        return (upper_range - lower_range) / self.quantiles(quantiles) * 100, lower_range, upper_range
+
+    def upper_confidence_bound(self, quantile, confidence_interval):
+        """
+        Calculate a one-sided upper confidence bound of a quantile
+        Unlike the upper end of the interval, it is not clamped to the maximum of too few samples.
+        :param quantile: The quantile
+        :param confidence_interval: The confidence that the quantile is below the bound
+        :return: The bound, None if there are not enough samples for that confidence
+        """
+        filtered = self.get_filtered()
+        ui = upper_order_statistic(len(filtered), quantile, confidence_interval)
+        if ui is None:
+            return None
+
+        return filtered[ui]
+
+    def confidence_variation(self, quantile, confidence_interval):
+        """
+        Calculate the confidence interval of a quantile
+        :param quantile: The quantile
+        :param confidence_interval: The confidence interval
+        :return: confidence_variation, lower confidence, upper confidence
+        """
+        (conf_var, lower_range, upper_range) = self.confidence_variations([quantile], confidence_interval)
+        return conf_var[0], lower_range[0], upper_range[0]
+
+
+class CounterMatrix:
+    """
+    Performance counters of every SUT run, as a runs x events matrix
+    Counters missing from a run are NaN. The matrix is preallocated and only grows
+    when there are more runs or events than expected.
+    """
+
+    def __init__(self, max_runs=200, max_events=16):
+        """
+        :param max_runs: The number of runs expected
+        :param max_events: The number of events expected
+        """
+        self._events = []
+        self._columns = dict()
+        self._matrix = np.full((max(max_runs, 1), max(max_events, 1)), np.nan)
+        self._runs = 0
+
+    def __len__(self):
+        return self._runs
+
+    def _grow(self, runs, events):
+        """
+        Make room for at least that many runs and events
+        """
+        (rows, columns) = self._matrix.shape
+        if runs <= rows and events <= columns:
+            return
+
+        matrix = np.full((max(runs, 2 * rows if runs > rows else rows),
+                          max(events, 2 * columns if events > columns else columns)), np.nan)
+        matrix[:rows, :columns] = self._matrix
+        self._matrix = matrix
+
+    def add(self, counters):
+        """
+        Add the counters of a run
+        :param counters: A dict of counter values by event name
+        """
+        for event in counters:
+            if event not in self._columns:
+                self._columns[event] = len(self._events)
+                self._events.append(event)
+
+        self._grow(self._runs + 1, len(self._events))
+        row = self._matrix[self._runs]
+        for event, value in counters.items():
+            row[self._columns[event]] = value
+        self._runs += 1
+
+    def get_events(self):
+        """
+        :return: The event names, in the order of the columns
+        """
+        return list(self._events)
+
+    def get_matrix(self):
+        """
+        :return: The runs x events matrix
+        """
+        return self._matrix[:self._runs, :len(self._events)]
+
+    def get_means(self):
+        """
+        :return: A dict of the mean of every event, a missing counter counts as 0
+        """
+        if not self._runs:
+            return dict()
+        sums = np.nansum(self.get_matrix(), axis=0)
+        return {event: sums[i] / self._runs for i, event in enumerate(self._events)}
+
+    def get_quantiles(self, quantile):
+        """
+        :param quantile: The quantile
+        :return: A dict of the quantile of every event, over the runs that counted it
+        """
+        if not self._runs:
+            return dict()
+        matrix = self.get_matrix()
+        result = dict()
+        for i, event in enumerate(self._events):
+            values = np.sort(matrix[~np.isnan(matrix[:, i]), i])
+            result[event] = sorted_quantiles(values, [quantile])[0] if len(values) else None
+        return result
+
+    def get_runs(self):
+        """
+        :return: A dict of the list of values of every event, by run, None where it is missing
+        """
+        matrix = self.get_matrix()
+        return {event: [None if np.isnan(v) else v.item() for v in matrix[:, i]]
+                for i, event in enumerate(self._events)}
@@ -0,0 +1,385 @@
+################################################################################
+ # Copyright (c) 2017 Dan Iorga, Tyler Sorenson, Alastair Donaldson
+
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+
+ # The above copyright notice and this permission notice shall be included in all
+ #copies or substantial portions of the Software.
+
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ # IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ # FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ # AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ # SOFTWARE.
+################################################################################
+
+
+import os
+import errno
+import time
+import ctypes
+import struct
+import platform
+import threading
+import subprocess
+from fcntl import ioctl
+
+# perf_event_open(2) system call numbers
+_SYSCALLS = {"x86_64": 298, "i386": 336, "i686": 336, "aarch64": 241, "armv7l": 364, "armv6l": 364}
+
+# Event types
+PERF_TYPE_HARDWARE = 0
+PERF_TYPE_SOFTWARE = 1
+PERF_TYPE_HW_CACHE = 3
+
+# Read format of a group, time enabled and running scale multiplexed counters
+PERF_FORMAT_TOTAL_TIME_ENABLED = 1 << 0
+PERF_FORMAT_TOTAL_TIME_RUNNING = 1 << 1
+PERF_FORMAT_GROUP = 1 << 3
+
+# Flags of the attribute bit field
+_FLAG_DISABLED = 1 << 0
+_FLAG_INHERIT = 1 << 1
+_FLAG_EXCLUDE_HV = 1 << 6
+_FLAG_ENABLE_ON_EXEC = 1 << 12
+
+# ioctl requests, applied to the whole group
+PERF_EVENT_IOC_ENABLE = 0x2400
+PERF_EVENT_IOC_DISABLE = 0x2401
+PERF_EVENT_IOC_RESET = 0x2403
+PERF_IOC_FLAG_GROUP = 1
+
+# Size of perf_event_attr up to sample_max_stack (PERF_ATTR_SIZE_VER5)
+_ATTR_SIZE = 112
+
+# Event names as perf stat knows them, with their (type, config)
+_HARDWARE_EVENTS = {"cycles": 0, "instructions": 1, "cache-references": 2, "cache-misses": 3,
+                    "branches": 4, "branch-misses": 5, "bus-cycles": 6, "ref-cycles": 9}
+_SOFTWARE_EVENTS = {"cpu-clock": 0, "task-clock": 1, "page-faults": 2, "context-switches": 3,
+                    "cpu-migrations": 4, "minor-faults": 5, "major-faults": 6}
+_CACHES = {"L1-dcache": 0, "L1-icache": 1, "LLC": 2, "dTLB": 3, "iTLB": 4, "branch": 5}
+_CACHE_OPS = {"load": 0, "store": 1, "prefetch": 2}
+
+# Counted on the enemy cores when no events are given
+PRESSURE_EVENTS = ["cycles", "instructions", "cache-references", "cache-misses", "task-clock"]
+
+
+def get_event_config(name):
+    """
+    Translate a perf event name, such as cycles or LLC-load-misses, to its type and config
+    :param name: The event name
+    :return: (type, config)
+    """
+    if name in _HARDWARE_EVENTS:
+        return PERF_TYPE_HARDWARE, _HARDWARE_EVENTS[name]
+    if name in _SOFTWARE_EVENTS:
+        return PERF_TYPE_SOFTWARE, _SOFTWARE_EVENTS[name]
+
+    # Cache events are <cache>-<op>s or <cache>-<op>-misses
+    for cache in _CACHES:
+        if name.startswith(cache + "-"):
+            rest = name[len(cache) + 1:]
+            miss = rest.endswith("-misses")
+            op = rest[:-len("-misses")] if miss else rest[:-1]
+            if op in _CACHE_OPS and (miss or rest.endswith("s")):
+                return PERF_TYPE_HW_CACHE, _CACHES[cache] | (_CACHE_OPS[op] << 8) | (int(miss) << 16)
+
+    raise ValueError("Unknown perf event " + name)
+
+
+class PerfCounters:
+    """
+    A group of counters opened with perf_event_open
+    The counters follow either a process (pid) or everything running on a core (cpu). Those of
+    a core are read together, in a single read of the group leader. Those of a process also count
+    the processes it starts, as perf stat does for a SUT script, and are read one by one since the
+    kernel only sums the children of a counter in its own read.
+    """
+
+    _libc = None
+
+    # Events already reported as not supported, warned about once
+    _unsupported = set()
+
+    def __init__(self, events, pid=-1, cpu=-1, enable_on_exec=False):
+        """
+        Open the counters, disabled
+        :param events: The event names
+        :param pid: The process to count, -1 for any process on the cpu
+        :param cpu: The core to count on, -1 for any core the process runs on
+        :param enable_on_exec: Start counting when the process calls exec
+        """
+        assert pid != -1 or cpu != -1, "Counters need a process or a core"
+        self.events = list(events)
+        self._fds = []
+        self._inherit = pid != -1
+
+        if PerfCounters._libc is None:
+            PerfCounters._libc = ctypes.CDLL(None, use_errno=True)
+
+        try:
+            self._syscall = _SYSCALLS[platform.machine()]
+        except KeyError:
+            raise OSError("perf_event_open is not known on " + platform.machine())
+
+        member_flags = _FLAG_EXCLUDE_HV
+        if self._inherit:
+            member_flags |= _FLAG_INHERIT
+        flags = member_flags | _FLAG_DISABLED
+        if enable_on_exec:
+            flags |= _FLAG_ENABLE_ON_EXEC
+
+        opened = []
+        for event in self.events:
+            leader = self._fds[0] if self._fds else -1
+            try:
+                # Only the leader is disabled, the others follow it
+                self._fds.append(self._open(event, pid, cpu, leader, flags if leader == -1 else member_flags))
+                opened.append(event)
+            except OSError as e:
+                # The event does not exist on this core, count the others
+                if e.errno not in (errno.ENOENT, errno.EOPNOTSUPP, errno.EINVAL):
+                    self.close()
+                    raise
+                if event not in PerfCounters._unsupported:
+                    PerfCounters._unsupported.add(event)
+                    print("Skipping perf event " + event + ": " + e.strerror)
+
+        if not opened:
+            raise OSError(errno.ENOENT, "None of the perf events " + str(self.events) + " can be counted")
+        self.events = opened
+
+    def _open(self, event, pid, cpu, group_fd, flags):
+        """
+        Open one counter of the group
+        :return: Its file descriptor
+        """
+        (event_type, config) = get_event_config(event)
+        attr = ctypes.create_string_buffer(_ATTR_SIZE)
+        read_format = PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING
+        if not self._inherit:
+            read_format |= PERF_FORMAT_GROUP
+        struct.pack_into("IIQQQQQ", attr, 0, event_type, _ATTR_SIZE, config, 0, 0, read_format, flags)
+
+        fd = self._libc.syscall(self._syscall, attr, pid, cpu, group_fd, 0)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return fd
+
+    def _ioctl(self, request):
+        ioctl(self._fds[0], request, PERF_IOC_FLAG_GROUP)
+
+    def enable(self):
+        self._ioctl(PERF_EVENT_IOC_ENABLE)
+
+    def disable(self):
+        self._ioctl(PERF_EVENT_IOC_DISABLE)
+
+    def reset(self):
+        self._ioctl(PERF_EVENT_IOC_RESET)
+
+    def read(self):
+        """
+        Read the whole group at once, or every counter when they count the children
+        Counters that were multiplexed are scaled to the time they were enabled.
+        :return: A dict of the counter values by event name
+        """
+        if self._inherit:
+            values = dict()
+            for event, fd in zip(self.events, self._fds):
+                (value, time_enabled, time_running) = struct.unpack("QQQ", os.read(fd, 24))
+                scale = time_enabled / time_running if time_running else 0
+                values[event] = int(round(value * scale))
+            return values
+
+        size = 8 * (3 + len(self.events))
+        data = os.read(self._fds[0], size)
+        values = struct.unpack("Q" * (len(data) // 8), data)
+        (nr, time_enabled, time_running) = values[:3]
+
+        scale = time_enabled / time_running if time_running else 0
+        return {event: int(round(values[3 + i] * scale)) for i, event in enumerate(self.events[:nr])}
+
+    def close(self):
+        """
+        Close the counters, the members before the leader
+        """
+        for fd in reversed(self._fds):
+            os.close(fd)
+        self._fds = []
+
+
+class CoreCounters:
+    """
+    The same counters on several cores, counting whatever runs there
+    They only count between start and stop, so the deltas line up with one SUT run,
+    and the deltas of every run are kept.
+    """
+
+    def __init__(self, events, cores):
+        """
+        :param events: The event names
+        :param cores: The cores to count on
+        """
+        self.cores = [int(core) for core in cores]
+        self._counters = dict()
+        self._start = None
+
+        # The counter dicts of every accepted run by core, and how long each run was counted
+        self.runs = {core: [] for core in self.cores}
+        self.windows = []
+        self._last = None
+
+        try:
+            for core in self.cores:
+                self._counters[core] = PerfCounters(events, cpu=core)
+        except OSError:
+            self.close()
+            raise
+
+    def start(self):
+        """
+        Clear the counters of all the cores and start them
+        """
+        for core in self.cores:
+            self._counters[core].reset()
+            self._counters[core].enable()
+        self._start = time.monotonic()
+
+    def stop(self):
+        """
+        Stop the counters of all the cores, the run is only kept once accepted
+        :return: A dict of counter dicts by core
+        """
+        window = time.monotonic() - self._start
+        for core in self.cores:
+            self._counters[core].disable()
+
+        values = {core: self._counters[core].read() for core in self.cores}
+        self._last = (window, values)
+        return values
+
+    def accept(self, fraction=1.0):
+        """
+        Keep the last run, when its SUT samples are kept
+        :param fraction: The part of the samples of the run that are kept, the counts and the
+                         window are scaled by it
+        """
+        (window, values) = self._last
+        self._last = None
+
+        self.windows.append(window * fraction)
+        for core in self.cores:
+            self.runs[core].append({event: value * fraction for event, value in values[core].items()})
+
+    def close(self):
+        for core in self._counters:
+            self._counters[core].close()
+        self._counters = dict()
+
+
+def get_pressure(values, seconds):
+    """
+    Summarise how hard a core was pushed while it was counted
+    Every event gives a rate per second, and the usual ratios are added when their events are there.
+    :param values: A dict of counter values by event name
+    :param seconds: The time they were counted for
+    :return: A dict of pressure metrics
+    """
+    result = dict()
+    if not seconds:
+        return result
+
+    for event in values:
+        result[event + "/s"] = values[event] / seconds
+
+    if values.get("cycles") and "instructions" in values:
+        result["ipc"] = values["instructions"] / values["cycles"]
+    if values.get("cache-references") and "cache-misses" in values:
+        result["cache_miss_ratio"] = values["cache-misses"] / values["cache-references"]
+    if values.get("LLC-loads") and "LLC-load-misses" in values:
+        result["llc_load_miss_ratio"] = values["LLC-load-misses"] / values["LLC-loads"]
+    if "task-clock" in values:
+        # Nanoseconds the core spent running something
+        result["utilisation"] = values["task-clock"] / (seconds * 1e9)
+
+    return result
+
+
+class PerfSampler:
+    """
+    Read a group of counters periodically in a background thread
+    """
+
+    def __init__(self, counters, interval):
+        """
+        :param counters: An enabled PerfCounters object
+        :param interval: Time between readings in seconds
+        """
+        self._counters = counters
+        self._interval = interval
+        self._stop = threading.Event()
+        self.samples = []
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        start = time.monotonic()
+        while not self._stop.wait(self._interval):
+            self.samples.append((time.monotonic() - start, self._counters.read()))
+
+    def stop(self):
+        """
+        Stop sampling
+        :return: List of (seconds since the start, counter dict)
+        """
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def run_counted(argv, events, core=None, niceness=None, env=None, sample_interval=None):
+    """
+    Run a binary with hardware counters attached to its process, without perf stat
+    The counters are opened on the child before it executes the binary, and only start
+    counting with that exec. They also count the processes it starts, so a SUT script is
+    counted with what it runs. They stop counting when it exits and are read then.
+    :param argv: The binary and its arguments
+    :param events: The event names
+    :param core: Core to run on
+    :param niceness: Nice value to run with
+    :param env: Variables added to the environment of the binary
+    :param sample_interval: Also read the counters every that many seconds while it runs
+    :return: Output, error, counter dict and the periodic samples (None if not sampled)
+    """
+    # common imports this module for get_pressure
+    from common import ProcessManagement
+
+    opened = []
+
+    def open_counters(pid):
+        opened.append(PerfCounters(events, pid=pid, enable_on_exec=True))
+
+    process = ProcessManagement.launch(argv, core=core, niceness=niceness, env=env, before_exec=open_counters,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    counters = opened[0]
+
+    sampler = PerfSampler(counters, sample_interval) if sample_interval else None
+    (out, err) = process.communicate()
+    samples = sampler.stop() if sampler else None
+    values = counters.read()
+    counters.close()
+
+    # The shell reports a binary it could not execute with these codes
+    if process.returncode in (126, 127) and err.startswith(b"sh:"):
+        raise RuntimeError("Unable to execute " + argv[0] + "\n" + err.decode())
+
+    return out, err, values, samples
@@ -1,2 +1,2 @@
 #!/usr/bin/env bash
-perf stat -ecycles -einstructions -ecache-references -ecache-misses -ebranches -ebranch-misses -ebus-cycles -eL1-dcache-loads -eL1-dcache-load-misses -eL1-dcache-stores -eL1-dcache-store-misses -eL1-dcache-prefetches -eL1-dcache-prefetch-misses -eL1-icache-loads -eL1-icache-load-misses -eL1-icache-prefetches -eL1-icache-prefetch-misses  -eLLC-loads -eLLC-stores -eLLC-load-misses -eLLC-store-misses -eLLC-prefetch-misses -edTLB-loads -edTLB-load-misses -edTLB-stores -edTLB-store-misses -edTLB-prefetches -edTLB-prefetch-misses -eiTLB-loads -eiTLB-load-misses -ebranch-loads -ebranch-load-misses "${@:1}"
+perf stat -x, -ecycles -einstructions -ecache-references -ecache-misses -ebranches -ebranch-misses -ebus-cycles -eL1-dcache-loads -eL1-dcache-load-misses -eL1-dcache-stores -eL1-dcache-store-misses -eL1-dcache-prefetches -eL1-dcache-prefetch-misses -eL1-icache-loads -eL1-icache-load-misses -eL1-icache-prefetches -eL1-icache-prefetch-misses  -eLLC-loads -eLLC-stores -eLLC-load-misses -eLLC-store-misses -eLLC-prefetch-misses -edTLB-loads -edTLB-load-misses -edTLB-stores -edTLB-store-misses -edTLB-prefetches -edTLB-prefetch-misses -eiTLB-loads -eiTLB-load-misses -ebranch-loads -ebranch-load-misses "${@:1}"
@@ -1,2 +1,2 @@
 #!/usr/bin/env bash
-perf stat -ebus-cycles -eLLC-loads -eLLC-stores -eLLC-load-misses -eLLC-store-misses  "${@:1}"
\ No newline at end of file
+perf stat -x, -ebus-cycles -eLLC-loads -eLLC-stores -eLLC-load-misses -eLLC-store-misses  "${@:1}"
\ No newline at end of file
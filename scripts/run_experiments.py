@@ -27,7 +27,7 @@ A python script that reads and runs the experiments described in the JSON file
 import json
 import sys
 import itertools
-from common import DataLog, ExperimentInfo
+from common import DataLog, ExperimentInfo, PlatformState
 
 from run_sut_stress import SutStress
 
@@ -81,36 +81,50 @@ class Experiment(object):
 
             log.experiment_info(self._experiment_info)
 
-            if self._mapping:
-                s = SutStress(self._experiment_info.instrument_cmd)
+            # Applied once for the experiment, and restored even if it fails
+            platform_state = PlatformState(governor=self._experiment_info.governor,
+                                           min_frequency=self._experiment_info.min_frequency,
+                                           max_frequency=self._experiment_info.max_frequency)
+            platform_state.apply()
 
-                result_baseline = s.run_mapping(self._experiment_info, mapping=dict())
-                result_enemy = s.run_mapping(self._experiment_info, mapping=self._mapping)
+            try:
+                if self._mapping:
+                    s = SutStress(self._experiment_info.instrument_cmd,
+                                  persistent_enemies=self._experiment_info.persistent_enemies,
+                                  platform_state=platform_state)
 
-                log.log_data_mapping(result_baseline, "baseline")
-                log.log_data_mapping(result_enemy, "enemy")
+                    result_baseline = s.run_mapping(self._experiment_info, mapping=dict())
+                    result_enemy = s.run_mapping(self._experiment_info, mapping=self._mapping)
+                    s.close()
 
-                log.file_dump()
+                    log.log_data_mapping(result_baseline, "baseline")
+                    log.log_data_mapping(result_enemy, "enemy")
 
-            elif self._ranked_list:
-                s = SutStress()
+                    log.file_dump()
 
-                total_cores = self._experiment_info.cores
-                c = [p for p in itertools.product(self._ranked_list, repeat=total_cores)]
+                elif self._ranked_list:
+                    s = SutStress(persistent_enemies=self._experiment_info.persistent_enemies,
+                                  platform_state=platform_state)
 
-                i = 0
-                for conf in c:
-                    conf_mapping = dict()
-                    for core in range(1, total_cores + 1):
-                        conf_mapping[core] = conf[core - 1]
+                    total_cores = self._experiment_info.cores
+                    c = [p for p in itertools.product(self._ranked_list, repeat=total_cores)]
 
-                    result_enemy = s.run_mapping(self._experiment_info, mapping=conf_mapping)
+                    i = 0
+                    for conf in c:
+                        conf_mapping = dict()
+                        for core in range(1, total_cores + 1):
+                            conf_mapping[core] = conf[core - 1]
 
-                    config_name = "config_" + str(i)
-                    i += 1
-                    log.log_data_mapping(result_enemy, config_name)
+                        result_enemy = s.run_mapping(self._experiment_info, mapping=conf_mapping)
 
-                log.file_dump()
+                        config_name = "config_" + str(i)
+                        i += 1
+                        log.log_data_mapping(result_enemy, config_name)
+
+                    s.close()
+                    log.file_dump()
+            finally:
+                platform_state.restore()
 
         log.merge_docs(output_file)
 
@@ -25,10 +25,14 @@ Runs individual tests.
 """
 
 import sys
-from common import ProcessManagement, ExperimentInfo, get_event, get_perf_event, get_temp, MappingResult, remove_outliers
-from scipy.stats.mstats import mquantiles
-from scipy.stats import binom
-from time import sleep
+import re
+import json
+import shlex
+from common import ProcessManagement, ExperimentInfo, get_event, get_perf_event, get_temp, PlatformState, ThermalSampler, CacheReset, MappingResult, \
+    EnemyWorker
+from measurement_stats import IncrementalStats, OrderStatisticTable, CounterMatrix
+from perf_counters import CoreCounters, PRESSURE_EVENTS, run_counted
+from time import sleep, monotonic
 
 
 def confidence_variation(times, quantile, confidence_interval):
@@ -44,47 +48,10 @@ def confidence_variation(times, quantile, confidence_interval):
     assert 0 < quantile < 1, "Quantile value is " + str(quantile) + "which should be between 0 and 1"
     assert 0.5 < confidence_interval < 1, "Desired confidence interval should be between 0.5 and 1"
 
-    sorted_times = sorted(remove_outliers(times))
-    q = mquantiles(sorted_times, quantile)[0]
-    n = len(sorted_times)
-
-    # This should not happen, just for debugging purposes
-    if not n:
-        print(times)
-
-    confidence = 0
-    middle = round(quantile * (n+1))
-    ui = middle
-    li = middle
-    while confidence < confidence_interval:
-        if ui < n-1:
-            ui = ui + 1
-        if li > 0:
-            li = li-1
-        confidence = binom.cdf(ui-1, n, quantile) - binom.cdf(li-1, n, quantile)
-
-        if ui >= n-1 and li <= 0:
-            break
-
-    if ui >= n-1:
-        ui = n-1
-    if li <= 0 or li > ui:
-        li = 0
-
-    try:
-        lower_range = sorted_times[li]
-        upper_range = sorted_times[ui]
-    except IndexError:
-        # This should not happen. Just for debugging purposes
-        print("Lower range", li)
-        print("Upper range", ui)
-        print("List length", len(sorted_times))
-        sys.exit(1)
-        pass
-
-    confidence_range = upper_range - lower_range
-
-    return (confidence_range/q)*100, lower_range, upper_range
+    stats = IncrementalStats()
+    stats.add(times)
+
+    return stats.confidence_variation(quantile, confidence_interval)
 
 
 class SutStress:
@@ -94,21 +61,44 @@ class SutStress:
     """
     # Profiling tools options for the SUT
 
-    def __init__(self, instrument_cmd=""):
+    def __init__(self, instrument_cmd="", persistent_enemies=False, platform_state=None):
         """
         Create a stressed SUT object
         :param instrument_cmd: Script to run code instrumentation
+        :param persistent_enemies: Pause and reuse the enemy processes instead of restarting them
+        :param platform_state: A PlatformState applied and restored by the caller for the whole experiment
         """
         self._processes = ProcessManagement()
         self._instrument_cmd = instrument_cmd
 
+        # Governor and frequencies, without a platform_state set by the first mapping and restored by close
+        self._platform_state = platform_state
+        self._owns_platform_state = platform_state is None
+
+        # Temperature of the system, sampled in the background if the experiment asks for it
+        self._thermal = ThermalSampler()
+
+        # Confidence bounds already calculated, shared by all the mappings
+        self._bounds_table = None
+
+        # The enemy workers, by core
+        self._persistent_enemies = persistent_enemies
+        self._workers = dict()
+
+        # Counters of the last SUT run, when read through perf_event_open
+        self.perf_counters = None
+        self.perf_samples = None
+
     @staticmethod
-    def _get_taskset_cmd(core):
+    def _get_argv(command):
         """
-        Start a command on a aspecific core
-        :param core: Core to start on
+        Split a binary, relative to the current folder, and its arguments
+        :param command: The binary followed by its arguments
+        :return: The argv list
         """
-        return "taskset -c " + str(core) + " "
+        argv = shlex.split(command)
+        argv[0] = "./" + argv[0]
+        return argv
 
     def start_stress(self, stress, core):
         """
@@ -118,22 +108,135 @@ class SutStress:
         :return: Output and error
         """
         assert(core != 0)
-        cmd = self._get_taskset_cmd(core) + " " + "./" + stress
-        self._processes.system_call_background(cmd)
+        self._processes.run_argv_background(self._get_argv(stress), core=core)
+
+    def start_mapping(self, mapping):
+        """
+        Start the enemy processes of a mapping
+        With persistent enemies, the workers already on the cores are reconfigured and resumed
+        :param mapping: A dict of core mappings
+        """
+        if not self._persistent_enemies:
+            for core in mapping:
+                self.start_stress(mapping[core], core)
+            return
+
+        for core in self._workers:
+            if core not in mapping:
+                self._workers[core].pause()
+
+        for core in mapping:
+            assert(core != 0)
+            worker = self._workers.get(core)
+            if worker is not None and worker.reconfigure(mapping[core]):
+                worker.resume()
+            else:
+                if worker is not None:
+                    worker.stop()
+                self._workers[core] = EnemyWorker(mapping[core], core)
+
+        # Measuring starts once every reconfigured worker dropped its old parameters
+        for core in mapping:
+            if not self._workers[core].wait_configured():
+                print("The enemy on core " + str(core) + " did not take its new parameters, restarting it")
+                self._workers[core].stop()
+                self._workers[core] = EnemyWorker(mapping[core], core)
+
+    def stop_mapping(self):
+        """
+        Stop the enemy processes, persistent workers are only paused
+        """
+        if self._persistent_enemies:
+            for core in self._workers:
+                self._workers[core].pause()
+        else:
+            self._processes.kill_stress()
+
+    def stop_workers(self):
+        """
+        Terminate all the persistent enemy workers
+        """
+        for core in self._workers:
+            self._workers[core].stop()
+        self._workers = dict()
+
+    def set_platform(self, experiment_info):
+        """
+        Apply the platform settings of an experiment, or check they are still in place
+        :param experiment_info: An ExperimentInfo object
+        """
+        if self._platform_state is None:
+            self._platform_state = PlatformState(governor=experiment_info.governor,
+                                                 min_frequency=experiment_info.min_frequency,
+                                                 max_frequency=experiment_info.max_frequency)
+            self._platform_state.apply()
+        else:
+            self._platform_state.check()
+
+    def get_bounds_table(self, experiment_info):
+        """
+        :param experiment_info: An ExperimentInfo object
+        :return: The OrderStatisticTable for the confidence interval of the experiment
+        """
+        if self._bounds_table is None or \
+                self._bounds_table.confidence_interval != experiment_info.confidence_interval:
+            if self._bounds_table is not None:
+                self._bounds_table.save()
+            self._bounds_table = OrderStatisticTable(experiment_info.confidence_interval,
+                                                     experiment_info.bounds_table_file)
+
+        return self._bounds_table
 
-    def run_program_single(self, sut, core):
+    def close(self):
+        """
+        Terminate the enemy workers and restore the platform settings
+        """
+        self.stop_workers()
+        self._thermal.close()
+        if self._bounds_table is not None:
+            self._bounds_table.save()
+        if self._platform_state is not None and self._owns_platform_state:
+            self._platform_state.restore()
+            self._platform_state = None
+
+    def run_program_single(self, sut, core, env=None, perf_events=None, perf_sample_interval=None):
         """
         Start the SUT with perf to gather more info
+        With perf_events, the counters are opened directly on the SUT instead of running it
+        under instrument_cmd, and are left in perf_counters and perf_samples
         :param sut: System under stress
         :param core: Core to start on
+        :param env: Variables added to the environment of the SUT
+        :param perf_events: Names of the counters to read with perf_event_open
+        :param perf_sample_interval: Also read the counters every that many seconds
         :return: Output and error
         """
-        cmd = self._get_taskset_cmd(core) + " " + "nice -n -20 " + \
-              self._instrument_cmd + " " + "./" + sut
-        #cmd = self._get_taskset_cmd(core) +  self._instrument_cmd + " " + "./" + sut
-        s_out,s_err = self._processes.system_call(cmd)
+        if perf_events:
+            argv = self._get_argv(sut)
+            print("executing command: " + " ".join(argv) + " with counters " + ",".join(perf_events))
+            (s_out, s_err, self.perf_counters, self.perf_samples) = \
+                run_counted(argv, perf_events, core=core, niceness=-20, env=env,
+                            sample_interval=perf_sample_interval)
+            return s_out, s_err
+
+        argv = shlex.split(self._instrument_cmd) + self._get_argv(sut)
+        s_out,s_err = self._processes.run_argv(argv, core=core, niceness=-20, env=env)
         return s_out, s_err
 
+    @staticmethod
+    def open_enemy_counters(experiment_info, mapping):
+        """
+        Open counters on every core of a mapping, counting whatever runs there
+        :param experiment_info: An ExperimentInfo object
+        :param mapping: A dict of core mappings
+        :return: A CoreCounters object, None if the experiment does not ask for them
+        """
+        if not experiment_info.perf_enemy_cores or not mapping:
+            return None
+
+        events = experiment_info.enemy_perf_events or experiment_info.perf_events or PRESSURE_EVENTS
+        return CoreCounters(events, mapping.keys())
+
     @staticmethod
     def _check_error(s_err):
         """
@@ -155,15 +258,15 @@ class SutStress:
         :return: If it was forced to kill stress
         """
         killed_stress = False
-        temp = get_temp()
+        temp = self._thermal.read()
         if temp:
             while temp > temp_threshold:
                 print("Temperature " + str(temp) + " is too high! Cooling down")
                 if stress_present:
-                    self._processes.kill_stress()
+                    self.stop_mapping()
                     killed_stress = True
                 sleep(10)
-                temp = get_temp()
+                temp = self._thermal.read()
             print("Temperature " + str(temp) + " is ok. Running experiment")
         else:
             print("\n\tWARNING: Using default cooldown time of 30 s\n")
@@ -171,75 +274,208 @@ class SutStress:
 
         return killed_stress
 
-    @staticmethod
-    def get_metric(s_out):
+    # Machine readable result line of a SUT, see print_mcth_result in src/common/common.h
+    mcth_pattern = re.compile(rb"^MCTH (\{.*\})[ \t\r]*$", re.MULTILINE)
+
+    # The fields a SUT can report its time in, by priority, when it has no MCTH line
+    metric_fields = ["total time(us): ", "Total time (secs): ", "Max: ", "time(ns)=",
+                     "time(secs)= ", "average = ", "average "]
+
+    # Compiled (float, int, any number) patterns by field
+    _field_patterns = dict()
+
+    @classmethod
+    def get_mcth(cls, s_out):
+        """
+        Read the machine readable result lines in one pass over the output
+        :param s_out: The output of the SUT
+        :return: List of the results, one dict for each run
+        """
+        if isinstance(s_out, str):
+            s_out = s_out.encode()
+        return [json.loads(record) for record in cls.mcth_pattern.findall(s_out)]
+
+    @classmethod
+    def _get_patterns(cls, field):
+        """
+        :param field: The field to search for, its spaces match any number of spaces
+        :return: The compiled float, int and any number patterns of the field
+        """
+        if field not in cls._field_patterns:
+            prefix = b" +".join(re.escape(part.encode()) for part in field.split(" "))
+            cls._field_patterns[field] = (re.compile(prefix + rb"(\d+\.\d+)"),
+                                          re.compile(prefix + rb"(\d+)"),
+                                          re.compile(prefix + rb"(\d+(?:\.\d+)?)"))
+
+        return cls._field_patterns[field]
+
+    @classmethod
+    def _get_field(cls, s_out, field):
+        """
+        Read a field from the human readable output, the same value as get_event
+        :param s_out: The output of the SUT
+        :param field: The field to search for
+        :return: The first float or else the last integer of the field, None if it is missing
+        """
+        if isinstance(s_out, str):
+            s_out = s_out.encode()
+
+        (float_pattern, int_pattern, _) = cls._get_patterns(field)
+        match = float_pattern.search(s_out)
+        if match:
+            return float(match.group(1))
+
+        values = int_pattern.findall(s_out)
+        return float(values[-1]) if values else None
+
+    @classmethod
+    def _get_fields(cls, s_out, field):
+        """
+        Read every occurrence of a field from the human readable output
+        :param s_out: The output of the SUT
+        :param field: The field to search for
+        :return: List of the values, in the order they were printed
+        """
+        if isinstance(s_out, str):
+            s_out = s_out.encode()
+
+        (_, _, number_pattern) = cls._get_patterns(field)
+        return [float(value) for value in number_pattern.findall(s_out)]
+
+    @classmethod
+    def get_metric(cls, s_out):
         """
         Get the time from the output string
         :param s_out: The string to be processed
         :return: The numerical metric
         """
-        if get_event(s_out, "total time(us): "):
-            metric = get_event(s_out, "total time(us): ")
-        elif get_event(s_out, "Total time (secs): "):
-            metric = get_event(s_out, "Total time (secs): ")
-        elif get_event(s_out, "Max: "):
-            metric = get_event(s_out, "Max: ")
-        elif get_event(s_out, "time(ns)="):
-            metric = get_event(s_out, "time(ns)=")
-        elif get_event(s_out, "time(secs)= "):
-            metric = get_event(s_out, "time(secs)= ")
-        elif get_event(s_out, "average = "):
-            metric = get_event(s_out, "average = ")
-        elif get_event(s_out, "average "):
-            metric = get_event(s_out, "average ")
+        records = cls.get_mcth(s_out)
+        if records:
+            return float(records[-1]["metric"])
 
-        else:
-            print("Unable find execution time or maximum latency")
-            sys.exit(0)
+        for field in cls.metric_fields:
+            metric = cls._get_field(s_out, field)
+            if metric:
+                return metric
+
+        print("Unable find execution time or maximum latency")
+        sys.exit(0)
+
+    @classmethod
+    def get_metrics(cls, s_out):
+        """
+        Get the time of every run from the output of a batched SUT
+        :param s_out: The string to be processed
+        :return: List of the numerical metrics, in the order of the runs
+        """
+        records = cls.get_mcth(s_out)
+        if records:
+            return [float(record["metric"]) for record in records]
 
-        return metric
+        for field in cls.metric_fields:
+            if cls._get_field(s_out, field):
+                return cls._get_fields(s_out, field)
+
+        print("Unable find execution time or maximum latency")
+        sys.exit(0)
 
     @staticmethod
-    def get_switches(s_out):
+    def get_sut_env(experiment_info):
         """
-        Get the time from the output string
+        :param experiment_info: An ExperimentInfo object
+        :return: The environment asking a batched SUT for its runs, None for a single run
+        """
+        runs = experiment_info.sut_warmup + experiment_info.sut_repetitions
+        if runs == 1:
+            return None
+        return {"SUT_REPETITIONS": str(runs)}
+
+    def get_batch(self, s_out, experiment_info):
+        """
+        Get the measured times of one SUT process, without the warm-up runs
         :param s_out: The string to be processed
-        :return: The numerical metric
+        :param experiment_info: An ExperimentInfo object
+        :return: List of the numerical metrics
         """
-        if get_event(s_out, "Voluntary_switches ") is not None:
-            voluntary = int(get_event(s_out, "Voluntary_switches "))
-        else:
+        if self.get_sut_env(experiment_info) is None:
+            return [self.get_metric(s_out)]
+
+        metrics = self.get_metrics(s_out)
+
+        # A SUT that does not support batching only reports one run, keep it
+        if len(metrics) == experiment_info.sut_warmup + experiment_info.sut_repetitions:
+            metrics = metrics[experiment_info.sut_warmup:]
+
+        return metrics
+
+    @classmethod
+    def get_switches(cls, s_out):
+        """
+        Get the context switches from the output string
+        :param s_out: The string to be processed
+        :return: The voluntary and involuntary switches of the SUT process, or None
+        """
+        records = [r for r in cls.get_mcth(s_out) if "vol_sw" in r and "invol_sw" in r]
+        if records:
+            return sum(int(r["vol_sw"]) for r in records), sum(int(r["invol_sw"]) for r in records)
+
+        voluntary = cls._get_field(s_out, "Voluntary_switches ")
+        if voluntary is None:
             print("Unable find voluntary switches")
             return None
 
-        if get_event(s_out, "Involuntary_switches ") is not None:
-            involuntary = int(get_event(s_out, "Involuntary_switches "))
-        else:
+        involuntary = cls._get_field(s_out, "Involuntary_switches ")
+        if involuntary is None:
             print("Unable find involuntary switches")
             return None
 
-        return voluntary, involuntary
+        return int(voluntary), int(involuntary)
 
-    def run_mapping(self, experiment_info, mapping, iteration_name=None):
+    def get_batch_switches(self, s_out, experiment_info, samples):
+        """
+        Get the context switches of every sample of one SUT process, lined up with get_batch
+        A SUT that only reports the switches of the whole process has them shared evenly
+        between its samples.
+        :param s_out: The string to be processed
+        :param experiment_info: An ExperimentInfo object
+        :param samples: The number of samples get_batch returned
+        :return: List of (voluntary, involuntary), one for each sample, or None
+        """
+        records = [r for r in self.get_mcth(s_out) if "vol_sw" in r and "invol_sw" in r]
+        if len(records) == experiment_info.sut_warmup + experiment_info.sut_repetitions:
+            records = records[experiment_info.sut_warmup:]
+        if records and len(records) == samples:
+            return [(int(r["vol_sw"]), int(r["invol_sw"])) for r in records]
+
+        switches = self.get_switches(s_out)
+        if switches is None or not samples:
+            return None
+        if samples == 1:
+            return [switches]
+        return [(switches[0] / samples, switches[1] / samples)] * samples
+
+    def run_mapping(self, experiment_info, mapping, iteration_name=None, race_bound=None):
         """
         Run a mapping described by a mapping object
         :param experiment_info: An ExperimentInfo object
         :param mapping: A dict of core mappings
         :param iteration_name: For tuning, we can store the exact param
+        :param race_bound: For racing, the lower confidence bound of the best mapping so far. The
+                           mapping is dropped as soon as its upper bound is below it
         :return:
         """
 
         assert isinstance(experiment_info, ExperimentInfo)
 
         # Make sure the governor is correctly
-        cmd = "echo " + experiment_info.governor + \
-              " | sudo tee /sys/devices/system/cpu/cpu*/cpufreq/scaling_governor"
-        self._processes.system_call(cmd)
+        self.set_platform(experiment_info)
+
+        if experiment_info.temperature_sampling_interval:
+            self._thermal.start(experiment_info.temperature_sampling_interval)
 
         delta_temp = 5
-        total_times = []
         total_temps = []
-        perf_results = dict()
+        perf_results = CounterMatrix(max_runs=experiment_info.measurement_iterations_max)
         voluntary_switches = []
         involuntary_switches = []
 
@@ -250,44 +486,72 @@ class SutStress:
             iteration_name = mapping
         result = MappingResult(iteration_name)
 
-        # Initialise a perf result list
-        if self._instrument_cmd:
-            perf_results = []
+        # The SUT binary is always evicted by "fadvise", together with its inputs
+        sut_files = [shlex.split(experiment_info.sut)[0]] + experiment_info.cache_reset_files
+        cache_reset = CacheReset(experiment_info.cache_reset, sut_files)
+        sut_env = self.get_sut_env(experiment_info)
+
+        # The samples kept sorted for the stopping rules
+        stats = IncrementalStats(bounds_table=self.get_bounds_table(experiment_info))
+
+        # Counters of the enemy cores, only running together with the SUT
+        enemy_counters = self.open_enemy_counters(experiment_info, mapping)
+        perf_samples = []
+
+        # A raced mapping starts with a batch just big enough for an upper bound of its quantile
+        step = experiment_info.measurement_iterations_step
+        if race_bound is not None:
+            step = min(experiment_info.racing_initial_samples, experiment_info.measurement_iterations_max)
 
         while len(total_temps) < experiment_info.measurement_iterations_max:
             it = 0
 
             # start up the stress in accordance with the mapping
-            for core in mapping:
-                self.start_stress(mapping[core], core)
+            self.start_mapping(mapping)
 
-            while it < experiment_info.measurement_iterations_step:
+            while it < step:
                 if self.cool_down(experiment_info.max_temperature - delta_temp, mapping):
-                    for core in mapping:
-                        self.start_stress(mapping[core], core)
+                    self.start_mapping(mapping)
 
                 # Clear the cache first
-                cmd = "sync; echo 1 > /proc/sys/vm/drop_caches"
-                s_out, s_err = self._processes.system_call(cmd)
-                self._check_error(s_err)
+                cache_reset.reset()
 
                 # For perf, I need to think if we need to log all values, take an average...
                 # For the moment, an average should be fine
                 # Run the program on core 0
-                s_out,s_err = self.run_program_single(experiment_info.sut, 0)
-                if self._instrument_cmd:
-                    perf_results.append(get_perf_event(s_err))
-
-                if self.get_switches(s_out) is not None:
-                    (voluntary, involuntary) = self.get_switches(s_out)
-                    voluntary_switches.append(voluntary)
-                    involuntary_switches.append(involuntary)
-
-                final_temp = get_temp()
+                run_start = monotonic()
+                if enemy_counters is not None:
+                    enemy_counters.start()
+                s_out,s_err = self.run_program_single(experiment_info.sut, 0, sut_env,
+                                                      perf_events=experiment_info.perf_events,
+                                                      perf_sample_interval=experiment_info.perf_sample_interval)
+                if enemy_counters is not None:
+                    enemy_counters.stop()
+
+                if experiment_info.perf_events:
+                    perf_results.add(self.perf_counters)
+                    if self.perf_samples:
+                        perf_samples.append(self.perf_samples)
+                elif self._instrument_cmd:
+                    perf_results.add(get_perf_event(s_err))
+
+                # The peak during the run, when sampling in the background
+                final_temp = self._thermal.get_peak(run_start)
                 if final_temp < experiment_info.max_temperature:
-                    total_times.append(self.get_metric(s_out))
-                    total_temps.append(final_temp)
-                    it = it + 1
+                    # A batched SUT gives several samples, only take what the step still needs
+                    metrics = self.get_batch(s_out, experiment_info)
+                    produced = len(metrics)
+                    metrics = metrics[:step - it]
+                    if enemy_counters is not None and produced:
+                        enemy_counters.accept(len(metrics) / produced)
+                    switches = self.get_batch_switches(s_out, experiment_info, produced)
+                    if switches is not None:
+                        for voluntary, involuntary in switches[:len(metrics)]:
+                            voluntary_switches.append(voluntary)
+                            involuntary_switches.append(involuntary)
+                    stats.add(metrics)
+                    total_temps.extend([final_temp] * len(metrics))
+                    it = it + len(metrics)
 
                 else:
                     print("The final temperature was to high, redoing experiment")
@@ -297,19 +561,44 @@ class SutStress:
                         exit(1)
 
             if len(mapping) > 0:
-                self._processes.kill_stress()
+                self.stop_mapping()
+            # Later batches are full steps, without going over the maximum after a smaller first one
+            step = min(experiment_info.measurement_iterations_step,
+                       experiment_info.measurement_iterations_max - len(total_temps))
+
+            # Only with enough samples for the upper bound to reach the confidence
+            upper_bound = None
+            if race_bound is not None:
+                upper_bound = stats.upper_confidence_bound(quantile=experiment_info.quantile,
+                                                           confidence_interval=experiment_info.confidence_interval)
+            if upper_bound is not None and upper_bound < race_bound:
+                (conf_var, conf_min, conf_max) = \
+                    stats.confidence_variation(quantile=experiment_info.quantile,
+                                               confidence_interval=experiment_info.confidence_interval)
+                print("The upper bound", upper_bound, "is below the best lower bound", race_bound, "dropping")
+                result.log_result(perf_results=perf_results,
+                                  total_times=stats,
+                                  total_temps=total_temps,
+                                  quantile=experiment_info.quantile,
+                                  conf_min=conf_min,
+                                  conf_max=conf_max,
+                                  voluntary_switches=voluntary_switches,
+                                  involuntary_switches=involuntary_switches,
+                                  success=False)
+                result.raced_out = True
+                return self._finish_mapping(result, cache_reset, enemy_counters, perf_samples)
+
 
             # This part runs if we have variable iterations based on confidence interval
             # and can stop early
             if experiment_info.stopping == "no_decrease" or experiment_info.stopping == "optimistic":
                 (conf_var, conf_min, conf_max) = \
-                    confidence_variation(times=total_times,
-                                         quantile=experiment_info.quantile,
-                                         confidence_interval=experiment_info.confidence_interval)
+                    stats.confidence_variation(quantile=experiment_info.quantile,
+                                               confidence_interval=experiment_info.confidence_interval)
                 print("The confidence variation is ", conf_var)
                 if conf_var < experiment_info.max_confidence_variation:
                     result.log_result(perf_results=perf_results,
-                                      total_times=total_times,
+                                      total_times=stats,
                                       total_temps=total_temps,
                                       quantile=experiment_info.quantile,
                                       conf_min=conf_min,
@@ -317,18 +606,16 @@ class SutStress:
                                       voluntary_switches=voluntary_switches,
                                       involuntary_switches=involuntary_switches,
                                       success=True)
-                    print("The q value is", result.q_value)
-                    self._processes.kill_stress()
-                    return result
+                    return self._finish_mapping(result, cache_reset, enemy_counters, perf_samples)
             elif experiment_info.stopping == "pessimistic":
-                for q in candidate_quantiles:
-                    (conf_var, conf_min, conf_max) = \
-                        confidence_variation(times=total_times,
-                                             quantile=q,
-                                             confidence_interval=experiment_info.confidence_interval)
+                # All the candidates in one pass
+                (conf_vars, conf_mins, conf_maxs) = \
+                    stats.confidence_variations(quantiles=candidate_quantiles,
+                                                confidence_interval=experiment_info.confidence_interval)
+                for (q, conf_var, conf_min, conf_max) in zip(candidate_quantiles, conf_vars, conf_mins, conf_maxs):
                     if conf_var < experiment_info.max_confidence_variation:
                         result.log_result(perf_results=perf_results,
-                                          total_times=total_times,
+                                          total_times=stats,
                                           total_temps=total_temps,
                                           quantile=q,
                                           conf_min=conf_min,
@@ -336,20 +623,17 @@ class SutStress:
                                           voluntary_switches=voluntary_switches,
                                           involuntary_switches=involuntary_switches,
                                           success=True)
-                        print("The q value is", result.q_value)
-                        self._processes.kill_stress()
-                        return result
+                        return self._finish_mapping(result, cache_reset, enemy_counters, perf_samples)
 
         # At this point we know that we have hit max iterations
         if experiment_info.stopping == "optimistic":
-            for q in candidate_quantiles:
-                (conf_var, conf_min, conf_max) = \
-                    confidence_variation(times=total_times,
-                                         quantile=q,
-                                         confidence_interval=experiment_info.confidence_interval)
+            (conf_vars, conf_mins, conf_maxs) = \
+                stats.confidence_variations(quantiles=candidate_quantiles,
+                                            confidence_interval=experiment_info.confidence_interval)
+            for (q, conf_var, conf_min, conf_max) in zip(candidate_quantiles, conf_vars, conf_mins, conf_maxs):
                 if conf_var < experiment_info.max_confidence_variation:
                     result.log_result(perf_results=perf_results,
-                                      total_times=total_times,
+                                      total_times=stats,
                                       total_temps=total_temps,
                                       quantile=q,
                                       conf_min=conf_min,
@@ -357,18 +641,15 @@ class SutStress:
                                       voluntary_switches=voluntary_switches,
                                       involuntary_switches=involuntary_switches,
                                       success=True)
-                    print("The q value is", result.q_value)
-                    self._processes.kill_stress()
-                    return result
+                    return self._finish_mapping(result, cache_reset, enemy_counters, perf_samples)
 
         # If we hit this and we did not intend to (not using "fixed"), we failed
         # to get a stable quantile basically
         (conf_var, conf_min, conf_max) = \
-            confidence_variation(times=total_times,
-                                 quantile=experiment_info.quantile,
-                                 confidence_interval=experiment_info.confidence_interval)
+            stats.confidence_variation(quantile=experiment_info.quantile,
+                                       confidence_interval=experiment_info.confidence_interval)
         result.log_result(perf_results=perf_results,
-                          total_times=total_times,
+                          total_times=stats,
                           total_temps=total_temps,
                           quantile=experiment_info.quantile,
                           conf_min=conf_min,
@@ -376,8 +657,25 @@ class SutStress:
                           voluntary_switches=voluntary_switches,
                           involuntary_switches=involuntary_switches,
                           success=True if conf_var < experiment_info.max_confidence_variation else False)
+        return self._finish_mapping(result, cache_reset, enemy_counters, perf_samples)
+
+    def _finish_mapping(self, result, cache_reset, enemy_counters, perf_samples):
+        """
+        Complete the result of a mapping and stop its enemies
+        :param result: The MappingResult already logged
+        :param cache_reset: The CacheReset used before the runs
+        :param enemy_counters: The CoreCounters of the enemy cores, or None
+        :param perf_samples: The periodic counter readings of every run
+        :return: The result
+        """
+        result.cache_reset_time = cache_reset.total_time
+        if perf_samples:
+            result.perf_samples = perf_samples
+        if enemy_counters is not None:
+            result.log_enemy_counters(enemy_counters)
+            enemy_counters.close()
         print("The q value is", result.q_value)
-        self._processes.kill_stress()
+        self.stop_mapping()
         return result
 
     def run_sut_stress(self, sut, stress, cores):
@@ -27,23 +27,30 @@ A python for tuning based on fuzzing and Bayesian Optimisation
 import json
 import sys
 import os
+import re
 import math
-import socket
-import pickle
+import shutil
+import hashlib
+import subprocess
+import tempfile
 
 from termcolor import colored
 from time import time
-from random import randrange, uniform, choice, random, shuffle, seed
+from random import randrange, uniform, choice, random, shuffle, seed, getstate, setstate
 from collections import OrderedDict
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 # optimization packages
-from bayes_opt import BayesianOptimization
 from simanneal import Annealer
 
 # my packages
 from run_sut_stress import SutStress
-from common import ExperimentInfo, DataLog
+from common import ExperimentInfo, DataLog, BinaryCache, MappingResult, PlatformState
+from tuning_farm import FarmCoordinator, serve, DEFAULT_PORT, DEFAULT_JOB_TIMEOUT
+from batch_bo import BatchBayesianOptimization
 
 
 class ConfigurableEnemy:
@@ -51,6 +58,11 @@ class ConfigurableEnemy:
     Object that hold all information about an enemy
     """
 
+    # How the templates are compiled
+    compiler = "gcc"
+    cflags = "-std=gnu11 -Wall -Wno-unused-variable"
+    ldflags = "-lm"
+
     def __init__(self, template=None, data_file=None):
         """
         Initialise an enemy with template file and template data
@@ -60,6 +72,10 @@ class ConfigurableEnemy:
         self._t_file = template
         self._d_file = data_file
 
+        # The defines the template can read at startup instead
+        self._runtime_params = []
+        self._build_mode = "compile"
+
         self._read_range_data()
 
         self._define_range = None
@@ -109,6 +125,14 @@ class ConfigurableEnemy:
 
         return data_range
 
+    def get_define_specs(self):
+        """
+        Return the type and the range of every define, the way the surrogate wants it
+        :return: A dictionary with param as keyword and a tuple with (type, min, max)
+        """
+        return {str(param): (self._define_range[param]["type"],) + tuple(self._define_range[param]["range"])
+                for param in self._define_range}
+
     def _read_range_data(self):
         """
         Read the template JSON data from the d_file and store in in defines
@@ -127,6 +151,21 @@ class ConfigurableEnemy:
         except KeyError:
             print("Unable to find DEFINES in JSON")
 
+        try:
+            self._runtime_params = template_object["RUNTIME"]
+        except KeyError:
+            # The template can only be built with all the defines
+            self._runtime_params = []
+
+    def set_build_mode(self, build_mode):
+        """
+        Set how the enemy binary is created
+        :param build_mode: "compile" builds a binary for each set of defines,
+                           "runtime" builds the template once and passes the parameters at launch
+        :return:
+        """
+        self._build_mode = build_mode
+
     def set_defines(self, defines):
         """
         :return:
@@ -136,7 +175,7 @@ class ConfigurableEnemy:
         # Make sure that the parameters are of the correct type
         # Workaround to force BO to generate int when needed
         for key in defines:
-            if self._define_range[key]["type"] == "int":
+            if self._define_range[key]["type"] in ("int", "categorical"):
                 def_param[key] = int(defines[key])
             elif self._define_range[key]["type"] == "float":
                 def_param[key] = float(defines[key])
@@ -161,7 +200,7 @@ class ConfigurableEnemy:
         for param in self._define_range:
             min_val = self._define_range[param]["range"][0]
             max_val = self._define_range[param]["range"][1]
-            if self._define_range[param]["type"] == "int":
+            if self._define_range[param]["type"] in ("int", "categorical"):
                 self._defines[param] = randrange(min_val, max_val)
             elif self._define_range[param]["type"] == "float":
                 self._defines[param] = uniform(min_val, max_val)
@@ -178,7 +217,7 @@ class ConfigurableEnemy:
         min_val = self._define_range[random_key]["range"][0]
         max_val = self._define_range[random_key]["range"][1]
 
-        if self._define_range[random_key]["type"] == "int":
+        if self._define_range[random_key]["type"] in ("int", "categorical"):
             temp = deepcopy(self)
             temp._defines[random_key] = randrange(min_val, max_val)
             return temp
@@ -190,17 +229,105 @@ class ConfigurableEnemy:
             print("Unknown data type for param " + str(random_key))
             sys.exit(1)
 
-    def create_bin(self, output_file):
+    def _get_sources(self):
+        """
+        :return: The template file and the local headers it includes
+        """
+        sources = [self._t_file]
+        with open(self._t_file) as template_file:
+            headers = re.findall(r'#include\s+"([^"]+)"', template_file.read())
+        for header in headers:
+            header = os.path.join(os.path.dirname(self._t_file), header)
+            # Some templates use quotes for system headers too
+            if os.path.isfile(header):
+                sources.append(header)
+
+        return sources
+
+    def get_build(self):
+        """
+        Split the defines between the compiler and the launch of the binary
+        :return: A list of -D flags and the string of arguments
+        """
+        if self._build_mode == "runtime" and self._runtime_params:
+            defines = ["-DRUNTIME_PARAMS"] + ["-D" + d + "=" + str(self._defines[d]) for d in self._defines
+                                              if d not in self._runtime_params]
+            arguments = " ".join([d + "=" + str(self._defines[d]) for d in self._defines
+                                  if d in self._runtime_params])
+        else:
+            defines = ["-D" + d + "=" + str(self._defines[d]) for d in self._defines]
+            arguments = ""
+
+        return defines, arguments
+
+    def get_build_id(self):
+        """
+        :return: A hashable id, equal for enemies that compile to the same binary
+        """
+        defines = self.get_build()[0]
+        return self._t_file, tuple(sorted(defines))
+
+    def get_config_id(self):
+        """
+        :return: A hashable id, equal for enemies with the same template and defines
+        """
+        return self._t_file, tuple(sorted((str(d), repr(self._defines[d])) for d in self._defines))
+
+    def get_spec(self):
+        """
+        :return: A JSON serialisable dict, enough to build the same enemy elsewhere
+        """
+        return {"template": self._t_file, "data_file": self._d_file,
+                "build_mode": self._build_mode, "defines": self._defines}
+
+    def set_spec(self, spec):
+        """
+        Set the template, defines and build mode from a spec
+        :param spec: A dict made by get_spec
+        """
+        self._t_file = spec["template"]
+        self._d_file = spec["data_file"]
+        self._read_range_data()
+        self.set_build_mode(spec["build_mode"])
+        self.set_defines(spec["defines"])
+
+    def create_bin(self, output_file, binary_cache=None, core=None, niceness=None):
         """
         :param output_file: The name of the file that will be outputted
-        :return:
+        :param binary_cache: A BinaryCache object, to avoid compiling the same enemy twice
+        :param core: Core the compiler is pinned to
+        :param niceness: Nice value of the compiler
+        :return: The arguments the binary needs to be launched with
         """
 
-        defines = ["-D" + d + "=" + str(self._defines[d]) for d in self._defines]
-        cmd = "gcc -std=gnu11 -Wall -Wno-unused-variable " + " ".join(defines) + " " \
-              + self._t_file + " -lm" + " -o " + output_file
+        defines, arguments = self.get_build()
+
+        cmd = self.compiler + " " + self.cflags + " " + " ".join(defines) + " " \
+              + self._t_file + " " + self.ldflags + " -o " + output_file
+
+        if binary_cache is not None:
+            key = binary_cache.get_key(source_files=self._get_sources(),
+                                       defines=defines,
+                                       compiler_cmd=self.compiler + " " + self.cflags + " " + self.ldflags)
+            if binary_cache.fetch(key, output_file):
+                print("Cached:", cmd)
+                return arguments
+
+        # Set up by the shell rather than in the child, compilations also run from a background thread
+        if core is not None:
+            cmd = "taskset -c " + str(core) + " " + cmd
+        if niceness is not None:
+            cmd = "nice -n " + str(niceness) + " " + cmd
+
         print("Compiling:", cmd)
-        os.system(cmd)
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        if process.returncode != 0:
+            raise RuntimeError("Unable to compile " + output_file + "\n" + process.stderr.decode())
+
+        if binary_cache is not None:
+            binary_cache.store(key, output_file)
+
+        return arguments
 
 
 class EnemyConfiguration:
@@ -250,6 +377,31 @@ class EnemyConfiguration:
         string += "\n"
         return string
 
+    def get_config_id(self):
+        """
+        :return: A canonical hash of the templates and defines, in the order of the cores they map to
+        """
+        config = [enemy.get_config_id() for enemy in self.enemies]
+        return hashlib.sha1(repr(config).encode()).hexdigest()
+
+    def get_spec(self):
+        """
+        :return: A JSON serialisable list with the spec of every enemy, by core
+        """
+        return [enemy.get_spec() for enemy in self.enemies]
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        :param spec: A list made by get_spec
+        :return: An EnemyConfiguration object with the same enemies
+        """
+        config = cls(len(spec))
+        for enemy, enemy_spec in zip(config.enemies, spec):
+            enemy.set_spec(enemy_spec)
+
+        return config
+
     def set_fixed_template(self, fix_template):
         """
         Set weather it is the same template across all enemies
@@ -258,6 +410,15 @@ class EnemyConfiguration:
         """
         self.fixed_template = fix_template
 
+    def set_build_mode(self, build_mode):
+        """
+        Set how the binaries of all enemies are created
+        :param build_mode: "compile" or "runtime"
+        :return:
+        """
+        for enemy in self.enemies:
+            enemy.set_build_mode(build_mode)
+
     def set_same_defines(self, same_defines):
         """
         Set weather all enemies have the same defines
@@ -375,34 +536,509 @@ class EnemyConfiguration:
 
         return defines
 
-    def get_file_mapping(self, prefix="", output_folder=""):
+    @staticmethod
+    def _copy_bin(source, destination):
+        """
+        Copy an enemy binary, unless the destination is already the same copy
+        """
+        if os.path.isfile(destination):
+            src_stat = os.stat(source)
+            dst_stat = os.stat(destination)
+            if src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+                return
+        BinaryCache.install(source, destination, keep_time=True)
+
+    def get_file_mapping(self, prefix="", output_folder="", binary_cache=None, max_workers=None):
         """
         Generated enemy files
+        The distinct enemies are compiled concurrently, identical ones are compiled once and copied.
         :param prefix: The prefix added to the filename
         :param output_folder: The output folder of the enemies
-        :return: A dict representing a mapping of enemy files to cores
+        :param binary_cache: A BinaryCache object used when compiling
+        :param max_workers: The maximum number of concurrent compilations, by default the number of CPUs
+        :return: A dict representing a mapping of enemy files, and their arguments, to cores
         """
         enemy_mapping = dict()
+        filenames = [output_folder + prefix + str(i+1) + "_enemy" for i in range(self.enemy_cores)]
 
+        builds = OrderedDict()
         for i in range(self.enemy_cores):
-            filename = output_folder + prefix + str(i+1) + "_enemy"
-            self.enemies[i].create_bin(filename)
-            # Start mapping the enemies from core 1
-            enemy_mapping[i + 1] = filename
+            builds.setdefault(self.enemies[i].get_build_id(), []).append(i)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            compilations = [pool.submit(self.enemies[cores[0]].create_bin, filenames[cores[0]], binary_cache)
+                            for cores in builds.values()]
+
+        for cores, compilation in zip(builds.values(), compilations):
+            # Raises the compilation error, if there was one
+            compilation.result()
+            for i in cores:
+                if i != cores[0]:
+                    self._copy_bin(filenames[cores[0]], filenames[i])
+                arguments = self.enemies[i].get_build()[1]
+                # Start mapping the enemies from core 1
+                enemy_mapping[i + 1] = filenames[i] + " " + arguments if arguments else filenames[i]
 
         return enemy_mapping
 
 
+class LocalEvaluator:
+    """
+    Build and measure enemy configurations on this board
+    """
+
+    def __init__(self, experiment_info, platform_state=None):
+        """
+        :param experiment_info: An experiment info object
+        :param platform_state: The PlatformState of the experiment, None to set it up here
+        """
+        assert isinstance(experiment_info, ExperimentInfo)
+        self._experiment_info = experiment_info
+
+        # Keep the created file names for cleanup
+        self._enemy_mapping = None
+        # The enemies are built in a folder of this evaluator, the farm workers of a machine share the cwd
+        self._output_dir = tempfile.mkdtemp(prefix="enemies_")
+
+        # Kept across evaluations, so persistent enemies survive between them
+        self._sut_stress = SutStress(persistent_enemies=experiment_info.persistent_enemies,
+                                     platform_state=platform_state)
+
+        # The experiment of every fidelity level measured so far
+        self._fidelities = dict()
+
+        # Reuse the binaries of configurations compiled before
+        self.binary_cache = None
+        if experiment_info.bin_cache_dir:
+            self.binary_cache = BinaryCache(cache_dir=experiment_info.bin_cache_dir,
+                                            max_entries=experiment_info.bin_cache_size)
+
+        # Configurations compiled ahead, in the background, while another one is measured
+        self._pipeline = None
+        self._pipeline_dir = None
+        self._prefetched = dict()
+        self.pipeline_stats = {"compiled": 0, "compile_time": 0.0, "hidden_time": 0.0, "wait_time": 0.0}
+
+        # A core the SUT and the enemies do not use, if there is one
+        self._pipeline_core = experiment_info.pipeline_core
+        if self._pipeline_core is None and experiment_info.cores is not None and \
+                (os.cpu_count() or 1) > experiment_info.cores + 1:
+            self._pipeline_core = os.cpu_count() - 1
+
+        # A compiler next to the enemies and the SUT would change the interference being measured
+        self.pipeline_depth = experiment_info.pipeline_depth
+        if self.pipeline_depth and self._pipeline_core is None:
+            print("No spare core to compile on while measuring, pipeline_depth is ignored "
+                  "unless pipeline_core is set")
+            self.pipeline_depth = 0
+
+        if self.pipeline_depth:
+            self._pipeline = ThreadPoolExecutor(max_workers=1)
+            self._pipeline_dir = tempfile.mkdtemp(prefix="pipeline_")
+
+            # The binaries are handed over through the cache, a temporary one without bin_cache_dir
+            if self.binary_cache is None:
+                self.binary_cache = BinaryCache(cache_dir=os.path.join(self._pipeline_dir, "cache"),
+                                                max_entries=experiment_info.bin_cache_size)
+
+    def _precompile(self, enemy_config, name):
+        """
+        Compile the enemies of a configuration into the binary cache, at the lowest priority
+        :param enemy_config: An EnemyConfiguration object
+        :param name: Prefix of the temporary binaries
+        :return: The seconds it took
+        """
+        t_start = time()
+        builds = OrderedDict()
+        for enemy in enemy_config.enemies:
+            builds.setdefault(enemy.get_build_id(), enemy)
+
+        for i, enemy in enumerate(builds.values()):
+            output_file = os.path.join(self._pipeline_dir, name + "_" + str(i))
+            enemy.create_bin(output_file, self.binary_cache, core=self._pipeline_core, niceness=19)
+            os.remove(output_file)
+
+        return time() - t_start
+
+    def prefetch(self, enemy_configs):
+        """
+        Start compiling the configurations that will be measured next
+        :param enemy_configs: A list of EnemyConfiguration objects, in the order they will be measured
+        """
+        if self._pipeline is None:
+            return
+
+        for enemy_config in enemy_configs:
+            config_id = enemy_config.get_config_id()
+            if config_id not in self._prefetched:
+                self._prefetched[config_id] = self._pipeline.submit(self._precompile, deepcopy(enemy_config),
+                                                                    str(len(self._prefetched)) + "_" + config_id[:8])
+
+    def _collect(self, enemy_config):
+        """
+        Wait for the compilation started ahead of a configuration, if there was one
+        :param enemy_config: An EnemyConfiguration object
+        """
+        compilation = self._prefetched.pop(enemy_config.get_config_id(), None)
+        if compilation is None:
+            return
+
+        t_wait = time()
+        try:
+            compile_time = compilation.result()
+        except RuntimeError:
+            # Compiled again, and the error raised, in the foreground
+            return
+        wait_time = time() - t_wait
+
+        self.pipeline_stats["compiled"] += 1
+        self.pipeline_stats["compile_time"] += compile_time
+        self.pipeline_stats["wait_time"] += wait_time
+        self.pipeline_stats["hidden_time"] += max(compile_time - wait_time, 0)
+
+    def measure(self, enemy_config, race_bound=None, fidelity=None):
+        """
+        :param enemy_config: An EnemyConfiguration object
+        :param race_bound: The lower bound of the best configuration when racing
+        :param fidelity: The fidelity level to measure at, None for the full experiment
+        :return: The MappingResult
+        """
+        if fidelity not in self._fidelities:
+            self._fidelities[fidelity] = self._experiment_info.get_fidelity(fidelity)
+
+        self._collect(enemy_config)
+        self._enemy_mapping = enemy_config.get_file_mapping(output_folder=self._output_dir + "/",
+                                                            binary_cache=self.binary_cache,
+                                                            max_workers=self._experiment_info.compile_workers)
+
+        return self._sut_stress.run_mapping(experiment_info=self._fidelities[fidelity],
+                                            mapping=self._enemy_mapping,
+                                            iteration_name=str(enemy_config),
+                                            race_bound=race_bound)
+
+    def __call__(self, job):
+        """
+        Evaluate a job sent by a farm coordinator
+        :param job: A dict with the configuration spec, the race bound and the fidelity level
+        :return: The MappingResult dict
+        """
+        return self.measure(EnemyConfiguration.from_spec(job["config"]), job["race_bound"],
+                            job.get("fidelity")).get_dict()
+
+    def close(self):
+        """
+        Clean all generated files
+        """
+        if self._pipeline is not None:
+            for compilation in self._prefetched.values():
+                compilation.cancel()
+            self._pipeline.shutdown()
+            self._pipeline = None
+            shutil.rmtree(self._pipeline_dir, ignore_errors=True)
+
+        self._sut_stress.close()
+
+        if self._output_dir is not None:
+            print("Deleting:", self._output_dir)
+            shutil.rmtree(self._output_dir, ignore_errors=True)
+            self._output_dir = None
+            self._enemy_mapping = None
+
+    @staticmethod
+    def from_start(start):
+        """
+        Create the evaluator of a farm worker
+        :param start: The START message of the coordinator
+        :return: A LocalEvaluator for its experiment
+        """
+        experiment_info = ExperimentInfo(start["experiment_name"])
+        experiment_info.read_json_object(start["experiment"])
+        return LocalEvaluator(experiment_info)
+
+
+class FitnessMemo:
+    """
+    The results of the configurations already measured
+    A configuration is measured again after it was returned max_hits times from memory,
+    or once its result is older than ttl, since the platform drifts over time.
+    """
+
+    def __init__(self, max_hits=3, ttl=None):
+        """
+        :param max_hits: Times a result is reused before measuring again, 0 disables the memo
+        :param ttl: Seconds a result stays valid, None to keep it
+        """
+        self._max_hits = max_hits
+        self._ttl = ttl
+
+        # Result, time it was measured and times it was reused, by configuration id
+        self._entries = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.remeasured = 0
+        self.hit_log = []
+
+    def get(self, config_id, iteration):
+        """
+        :param config_id: The id of the configuration
+        :param iteration: The iteration asking for it, logged with the hit
+        :return: The stored MappingResult, None if it has to be measured
+        """
+        entry = self._entries.get(config_id)
+        if entry is None or not self._max_hits:
+            self.misses += 1
+            return None
+
+        age = time() - entry["time"]
+        if entry["hits"] >= self._max_hits or (self._ttl is not None and age > self._ttl):
+            self.remeasured += 1
+            del self._entries[config_id]
+            return None
+
+        entry["hits"] += 1
+        self.hits += 1
+        self.hit_log.append({"iteration": iteration, "config": config_id,
+                             "age": age, "q_value": entry["result"].q_value})
+        return entry["result"]
+
+    def store(self, config_id, result):
+        """
+        :param config_id: The id of the configuration
+        :param result: The MappingResult it was measured with
+        """
+        if self._max_hits:
+            self._entries[config_id] = {"result": result, "time": time(), "hits": 0}
+
+    def get_dict(self):
+        """
+        :return: A dict with the hit statistics and every hit
+        """
+        return {"hits": self.hits, "misses": self.misses, "remeasured": self.remeasured,
+                "entries": len(self._entries), "max_hits": self._max_hits, "ttl": self._ttl,
+                "hit_log": self.hit_log}
+
+
+class TuningCheckpoint:
+    """
+    A durable record of a tune, to continue it after a crash or a reboot
+    Every evaluation is journaled with its result, together with the random state the tune
+    started from. Resuming restores that state and replays the journal: the optimisers propose
+    the same configurations again and get the journaled results instead of measuring them, so
+    the annealer, the BO observations and the incumbents end up where they were.
+    The journal is appended, one JSON line per evaluation, to the file_name.journal file next to
+    the checkpoint, so a write does not grow with the length of the tune.
+    """
+
+    def __init__(self, file_name, experiment_name, interval=0, resume=False):
+        """
+        :param file_name: The JSON file the checkpoint is kept in
+        :param experiment_name: The name of the experiment being tuned
+        :param interval: Minimum seconds between two writes of the file
+        :param resume: Continue from the file, if there is one
+        """
+        self._file_name = file_name
+        self._journal_name = file_name + ".journal"
+        self._interval = interval
+        self._last_save = 0
+
+        self._data = None
+        # The journal entries, and where every one starts in the journal file
+        self._journal = []
+        self._offsets = []
+        resume = resume and os.path.isfile(file_name)
+        if resume:
+            with open(file_name) as checkpoint_file:
+                self._data = json.load(checkpoint_file)
+            assert self._data["experiment"] == experiment_name, \
+                file_name + " is the checkpoint of " + self._data["experiment"]
+            self._read_journal()
+            setstate((self._data["random_state"][0], tuple(self._data["random_state"][1]),
+                             self._data["random_state"][2]))
+            numpy_state = self._data["numpy_state"]
+            np.random.set_state((numpy_state[0], np.array(numpy_state[1], dtype=np.uint32),
+                                 numpy_state[2], numpy_state[3], numpy_state[4]))
+        else:
+            numpy_state = np.random.get_state()
+            self._data = {"experiment": experiment_name,
+                          "random_state": getstate(),
+                          "numpy_state": [numpy_state[0], numpy_state[1].tolist()] + list(numpy_state[2:]),
+                          "elapsed": 0,
+                          "incumbent": None,
+                          "optimizer": dict(),
+                          "finished": False}
+
+        if self._offsets:
+            # Continue the journal file that was read
+            self._journal_file = open(self._journal_name, 'r+')
+            self._journal_file.seek(0, os.SEEK_END)
+            self._data.pop("journal", None)
+        else:
+            self._journal_file = open(self._journal_name, 'w')
+            # The entries of a checkpoint from before the journal file are moved to it
+            for entry in self._data.pop("journal", []):
+                self._offsets.append(self._journal_file.tell())
+                self._journal.append(entry)
+                self._append(entry)
+
+        if resume:
+            print("Resuming", experiment_name, "with", len(self._journal), "evaluations")
+
+        # The journal is replayed up to this entry, then new evaluations are appended
+        self._replayed = 0
+        self.resumed_elapsed = self._data["elapsed"]
+        # A finished tune is not measured again when resumed
+        self.finished = self._data["finished"]
+        self._t_start = time()
+
+    def _read_journal(self):
+        """
+        Read the entries of the journal file, a line cut by a crash and what follows it are dropped
+        """
+        if not os.path.isfile(self._journal_name):
+            return
+
+        with open(self._journal_name, 'rb') as journal_file:
+            offset = 0
+            for line in journal_file:
+                try:
+                    entry = json.loads(line.decode())
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self._journal.append(entry)
+                self._offsets.append(offset)
+                offset += len(line)
+
+        os.truncate(self._journal_name, offset)
+        # Where the next entry starts
+        self._offsets.append(offset)
+
+    def _append(self, entry):
+        """
+        Append an entry to the journal file, it is flushed by the next save
+        :param entry: The journal entry
+        """
+        self._journal_file.write(json.dumps(entry) + "\n")
+
+    def replay(self, config_id):
+        """
+        :param config_id: The id of the configuration the tuner evaluates next
+        :return: Its journal entry, None once the whole journal was replayed
+        """
+        journal = self._journal
+        if self._replayed >= len(journal):
+            return None
+
+        entry = journal[self._replayed]
+        if entry["config"] != config_id:
+            # The tune went a different way, the rest of the journal is of no use
+            print("The tune does not follow the checkpoint after", self._replayed, "evaluations")
+            del journal[self._replayed:]
+            self._journal_file.truncate(self._offsets[self._replayed])
+            self._journal_file.seek(0, os.SEEK_END)
+            return None
+
+        self._replayed += 1
+        return entry
+
+    def record(self, config_id, q_value, result=None):
+        """
+        Journal an evaluation
+        :param config_id: The id of the configuration
+        :param q_value: The value returned to the tuner
+        :param result: The MappingResult when it was measured, None when it came from the memo
+        """
+        entry = {"config": config_id,
+                 "q_value": q_value,
+                 "result": None if result is None else result.get_dict()}
+        self._journal.append(entry)
+        self._append(entry)
+        self._replayed = len(self._journal)
+        self.save()
+
+    def set_incumbent(self, score, config):
+        """
+        :param score: The best score so far
+        :param config: The configuration that got it
+        """
+        self._data["incumbent"] = {"score": score, "config": str(config)}
+
+    def get_incumbent(self):
+        """
+        :return: A dict with the best score and the configuration that got it, None before the first one
+        """
+        return self._data["incumbent"]
+
+    def set_state(self, optimizer, state):
+        """
+        Keep the latest state of an optimiser, to follow the tune from the file
+        :param optimizer: The name of the optimiser
+        :param state: A dict of its state
+        """
+        self._data["optimizer"][optimizer] = state
+
+    def save(self, force=False):
+        """
+        Write the checkpoint, at most once per interval unless forced
+        The journal is synced first, then the file is replaced at once, so a crash while writing
+        keeps the previous one. Both are on the disk when this returns.
+        :param force: Write it even if the interval has not passed
+        """
+        if not force and time() - self._last_save < self._interval:
+            return
+
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+
+        self._data["elapsed"] = self.resumed_elapsed + time() - self._t_start
+        temp_file = self._file_name + ".tmp"
+        with open(temp_file, 'w') as checkpoint_file:
+            json.dump(self._data, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_file, self._file_name)
+
+        # The rename, and a new journal file, are only durable once the directory is synced
+        directory = os.open(os.path.dirname(os.path.abspath(self._file_name)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self._last_save = time()
+
+    def finish(self):
+        """
+        Mark the tune as finished and write the checkpoint
+        """
+        self._data["finished"] = True
+        self.finished = True
+        self.save(force=True)
+        self.close()
+
+    def close(self):
+        """
+        Close the journal file
+        """
+        self._journal_file.close()
+
+
 class ObjectiveFunction:
     """
     Class to evaluate an enemy config
     """
 
-    def __init__(self, experiment_info, log, socket_connect=None):
+    def __init__(self, experiment_info, log, farm=None, checkpoint=None, fidelity=None, local=None,
+                 platform_state=None):
         """
         :param experiment_info: An experiment info object
         :param log: A data log object
-        :param socket_connect: Socket if the network approach is desired
+        :param farm: A FarmCoordinator object, to measure on other boards instead of this one
+        :param checkpoint: A TuningCheckpoint object, to journal and replay the evaluations
+        :param fidelity: The fidelity level the configurations are measured at, None for the full experiment
+        :param local: A LocalEvaluator shared with other objective functions, closed by its owner
+        :param platform_state: The PlatformState of the experiment
         """
 
         assert isinstance(experiment_info, ExperimentInfo)
@@ -411,72 +1047,155 @@ class ObjectiveFunction:
         assert isinstance(log, DataLog)
         self._log = log
 
-        # Keep the created file names for cleanup
-        self._enemy_mapping = None
+        self._checkpoint = checkpoint
+
+        # The same configuration is another point at each fidelity level
+        self._fidelity = fidelity
+        self._id_suffix = "" if fidelity is None else "@" + str(fidelity)
+
+        # Measure on the farm, or build and measure here
+        self._farm = farm
+        self._owns_local = farm is None and local is None
+        self._local = local
+        if local is None and farm is None:
+            self._local = LocalEvaluator(experiment_info, platform_state=platform_state)
+
+        # Configurations proposed again are not measured every time
+        self._memo = FitnessMemo(max_hits=experiment_info.memo_max_hits, ttl=experiment_info.memo_ttl)
 
         # Keep track of the best evaluation
         self.best_mapping = None
         self.best_score = None
+        self.best_result = None
+
+        # Candidates dropped early by racing
+        self.raced_out = 0
 
-        # Stored mapping, workaround for BO
-        self.stored_mapping = None
-        self.optimized_core = None
+        # How hard the enemy cores were pushed in the last evaluation, when they are counted
+        self.enemy_pressure = None
 
         # Logging information
         self.iteration = 0
-        self._t_start = time()
+        self._t_start = time() - (checkpoint.resumed_elapsed if checkpoint else 0)
         self._log.experiment_info(experiment_info)
 
-        # Network connection
-        self.socket = socket_connect
-
-    def bo_call(self, **kwargs):
+    def get_batch_size(self):
         """
-        Wrapper for __call__ so that is compatible with BO
-        :param kwargs: Parameters for the mapping
-        :return:
+        :return: How many configurations are measured at once
         """
+        if self._farm is not None:
+            return self._farm.get_size()
 
-        def_param = dict()
-        for key in kwargs:
-            def_param[key] = kwargs[key]
-
-        if self.stored_mapping.same_defines:
-            for i in range(self.stored_mapping.enemy_cores):
-                self.stored_mapping.enemies[i].set_defines(def_param)
-        else:
-            self.stored_mapping.enemies[self.optimized_core].set_defines(def_param)
-        return self.__call__(self.stored_mapping)
+        # The configurations after the first one are compiled while the ones before are measured
+        return 1 + self._local.pipeline_depth
 
     def __call__(self, enemy_config):
         """
         :param enemy_config: An EnemyConfiguration object
         :return: The quantile value
         """
+        return self.evaluate_batch([enemy_config])[0]
+
+    def evaluate_batch(self, enemy_configs):
+        """
+        Evaluate several configurations, measured at the same time on a farm
+        :param enemy_configs: A list of EnemyConfiguration objects
+        :return: The list of their quantile values
+        """
+        q_values = [None] * len(enemy_configs)
+        config_ids = [enemy_config.get_config_id() + self._id_suffix for enemy_config in enemy_configs]
+        to_measure = []
+        cached_values = dict()
+
+        for i, (config_id, enemy_config) in enumerate(zip(config_ids, enemy_configs)):
+            # Evaluated before the tune was interrupted
+            if self._checkpoint is not None:
+                entry = self._checkpoint.replay(config_id)
+                if entry is not None:
+                    if entry["result"] is None:
+                        self._memo.get(config_id, self.iteration)
+                        q_values[i] = entry["q_value"]
+                    else:
+                        q_values[i] = self._account(config_id, enemy_config,
+                                                    MappingResult.from_dict(entry["result"]))
+                    continue
+
+            cached = self._memo.get(config_id, self.iteration)
+            if cached is not None:
+                print("Configuration already measured, q value", cached.q_value)
+                self._log.log_stats("fitness_memo", self._memo.get_dict())
+                cached_values[i] = cached.q_value
+            else:
+                to_measure.append(i)
+
+        # Race against the lower bound of the best candidate
+        race_bound = None
+        if self._experiment_info.racing and self.best_result is not None:
+            race_bound = self.best_result.q_min
 
-        # if self.socket:
-            # Dissable the networking thing for the moment
-            # pickled_enemy_config = pickle.dumps(enemy_config)
+        if self._farm is not None and to_measure:
+            jobs = [{"config": enemy_configs[i].get_spec(), "race_bound": race_bound, "fidelity": self._fidelity}
+                    for i in to_measure]
+            results = [MappingResult.from_dict(result) for result in self._farm.evaluate(jobs)]
+        else:
+            results = []
+            depth = self._local.pipeline_depth
+            for n, i in enumerate(to_measure):
+                self._local.prefetch([enemy_configs[j] for j in to_measure[n + 1:n + 1 + depth]])
+                results.append(self._local.measure(enemy_configs[i], race_bound, self._fidelity))
+        results = dict(zip(to_measure, results))
+
+        # In the order they were proposed, which is the order they are replayed in
+        for i in range(len(enemy_configs)):
+            if i in cached_values:
+                q_values[i] = cached_values[i]
+                result = None
+            elif i in results:
+                result = results[i]
+                result.time = time() - self._t_start
+                q_values[i] = self._account(config_ids[i], enemy_configs[i], result)
+            else:
+                continue
 
-            # Then send actual enemy config + delim
-            # self.socket.sendall(pickled_enemy_config + b'data_end')
+            if self._checkpoint is not None:
+                self._checkpoint.record(config_ids[i], q_values[i], result)
 
-            # Receive the execution time
-            # pickled_ex_time = self.socket.recv(1024)
-            # times = pickle.loads(pickled_ex_time)
-        # else:
-        self._enemy_mapping = enemy_config.get_file_mapping()
-        s = SutStress()
+        return q_values
 
-        result = s.run_mapping(experiment_info= self._experiment_info,
-                               mapping=self._enemy_mapping,
-                               iteration_name=str(enemy_config))
-        if self.best_score is None or result.q_value > self.best_score:
+    def _account(self, config_id, enemy_config, result):
+        """
+        Keep track of a measured configuration and log it
+        :param config_id: The id of the configuration
+        :param enemy_config: An EnemyConfiguration object
+        :param result: The MappingResult it was measured with
+        :return: The quantile value
+        """
+        if result.raced_out:
+            self.raced_out += 1
+        elif self.best_score is None or result.q_value > self.best_score:
             self.best_score = result.q_value
             self.best_mapping = deepcopy(enemy_config)
-
-        result.time = time() - self._t_start
-        self._log.log_data_mapping(mapping_result=result, iteration=self.iteration)
+            self.best_result = result
+            # Only full measurements are comparable across the tune
+            if self._checkpoint is not None and self._fidelity is None:
+                self._checkpoint.set_incumbent(self.best_score, enemy_config)
+
+        self.enemy_pressure = result.enemy_pressure
+        # A raced out result only holds the samples taken before the race bound, not a measurement
+        if not result.raced_out:
+            self._memo.store(config_id, result)
+
+        iteration = self.iteration
+        if self._fidelity is not None:
+            iteration = "fidelity_" + str(self._fidelity) + "_" + str(self.iteration)
+        self._log.log_data_mapping(mapping_result=result, iteration=iteration)
+        if self._local is not None and self._local.binary_cache:
+            self._log.log_stats("binary_cache", self._local.binary_cache.get_dict())
+        if self._local is not None and self._local.pipeline_depth:
+            self._log.log_stats("pipeline", self._local.pipeline_stats)
+        self._log.log_stats("fitness_memo", self._memo.get_dict())
+        if self._experiment_info.racing:
+            self._log.log_stats("racing", {"raced_out": self.raced_out, "evaluated": self.iteration + 1})
         self.iteration += 1
 
         return result.q_value
@@ -486,25 +1205,24 @@ class ObjectiveFunction:
         Clean all generated files
         :return:
         """
-
-        if self._enemy_mapping:
-            for key in self._enemy_mapping:
-                cmd = "rm " + self._enemy_mapping[key]
-                print("Deleting:", cmd)
-                os.system(cmd)
+        if self._local is not None and self._owns_local:
+            self._local.close()
 
 
 class DefineAnneal(Annealer):
     """
     A wrapper class for the python annealer class
     """
-    def __init__(self, experiment_info, initial_state, exit_time, log=None, network_socket=None):
+    def __init__(self, experiment_info, initial_state, exit_time, log=None, farm=None, checkpoint=None,
+                 platform_state=None):
         """
         :param experiment_info: ExperimentInfo object
         :param initial_state: EnemyConfig object
         :param exit_time: Exit time
         :param log: A log object
-        :param network_socket: For future network connection
+        :param farm: A FarmCoordinator object, to measure on other boards
+        :param checkpoint: A TuningCheckpoint object
+        :param platform_state: The PlatformState of the experiment
         """
         assert isinstance(experiment_info, ExperimentInfo)
         self._experiment_info = experiment_info
@@ -517,12 +1235,24 @@ class DefineAnneal(Annealer):
 
         self.objective_function = ObjectiveFunction(experiment_info=experiment_info,
                                                     log=log,
-                                                    socket_connect=network_socket)
+                                                    farm=farm,
+                                                    checkpoint=checkpoint,
+                                                    platform_state=platform_state)
         self._exit_time = exit_time
+        self._checkpoint = checkpoint
 
     def move(self):
         self.state = self.state.neighbour_define()
 
+    def update(self, step, T, E, acceptance, improvement):
+        """
+        Keep the temperature of the anneal in the checkpoint, on top of the progress output
+        """
+        if self._checkpoint is not None:
+            self._checkpoint.set_state("anneal", {"step": step, "temperature": T, "energy": E,
+                                                  "state": str(self.state)})
+        Annealer.update(self, step, T, E, acceptance, improvement)
+
     def energy(self):
 
         q_value = self.objective_function(self.state)
@@ -538,12 +1268,14 @@ class Optimization:
     Class for Optimization
     """
 
-    def __init__(self, experiment_info, log, network_socket=None):
+    def __init__(self, experiment_info, log, farm=None, checkpoint=None, platform_state=None):
         """
         Create an Optimization object
         :param experiment_info: ExperimentInfo object
         :param log: A data log object
-        :param network_socket: In case we want to go for networking
+        :param farm: A FarmCoordinator object, to measure on other boards
+        :param checkpoint: A TuningCheckpoint object, the time it already tuned for is not given again
+        :param platform_state: The PlatformState of the experiment, shared by all the measurements
         """
 
         assert isinstance(experiment_info, ExperimentInfo)
@@ -552,10 +1284,14 @@ class Optimization:
         assert isinstance(log, DataLog)
         self._log = log
 
+        self._checkpoint = checkpoint
+        elapsed = checkpoint.resumed_elapsed if checkpoint else 0
+
         self._t_start = time()
-        self._t_end = time() + 60 * experiment_info.tuning_max_time
+        self._t_end = time() + 60 * experiment_info.tuning_max_time - elapsed
 
-        self._socket = network_socket
+        self._farm = farm
+        self._platform_state = platform_state
 
     @staticmethod
     def kirkpatrick_cooling(start_temp, alpha):
@@ -582,12 +1318,18 @@ class Optimization:
 
         objective_function = ObjectiveFunction(experiment_info=self._experiment_info,
                                                log=self._log,
-                                               socket_connect=self._socket)
+                                               farm=self._farm,
+                                               checkpoint=self._checkpoint,
+                                               platform_state=self._platform_state)
 
         while objective_function.iteration < self._experiment_info.tuning_max_iterations and \
                 time() < self._t_end:
-            enemy_config.random_set_all_defines()
-            objective_function(enemy_config)
+            # One configuration per board of the farm, or per stage of the compile pipeline
+            batch = []
+            for _ in range(objective_function.get_batch_size()):
+                enemy_config.random_set_all_defines()
+                batch.append(deepcopy(enemy_config))
+            objective_function.evaluate_batch(batch)
 
         best_mapping = objective_function.best_mapping
         best_score = objective_function.best_score
@@ -605,7 +1347,9 @@ class Optimization:
 
         objective_function = ObjectiveFunction(experiment_info=self._experiment_info,
                                                log=self._log,
-                                               socket_connect=self._socket)
+                                               farm=self._farm,
+                                               checkpoint=self._checkpoint,
+                                               platform_state=self._platform_state)
 
         current_config = enemy_config
         current_score = 0
@@ -613,13 +1357,14 @@ class Optimization:
         while objective_function.iteration < self._experiment_info.tuning_max_iterations and \
                 time() < self._t_end:
 
-            next_config = current_config.neighbour_define()
+            # One neighbour per board of the farm, the best one is the move
+            next_configs = [current_config.neighbour_define() for _ in range(objective_function.get_batch_size())]
+            q_values = objective_function.evaluate_batch(next_configs)
+            (q_value, best) = max(zip(q_values, range(len(q_values))))
 
             # see if this move is better than the current
-            q_value = objective_function(next_config)
-
             if q_value > current_score:
-                current_config = next_config
+                current_config = next_configs[best]
                 current_score = q_value
 
         best_mapping = objective_function.best_mapping
@@ -638,7 +1383,9 @@ class Optimization:
                                     experiment_info=self._experiment_info,
                                     exit_time=self._t_end,
                                     log= self._log,
-                                    network_socket=self._socket
+                                    farm=self._farm,
+                                    checkpoint=self._checkpoint,
+                                    platform_state=self._platform_state
                                     )
 
         inner_anneal.anneal()
@@ -657,52 +1404,188 @@ class Optimization:
 
         objective_function = ObjectiveFunction(experiment_info=self._experiment_info,
                                                log=self._log,
-                                               socket_connect=self._socket)
+                                               farm=self._farm,
+                                               checkpoint=self._checkpoint,
+                                               platform_state=self._platform_state)
         config = enemy_config
 
         # Devide the evaluations for each core
         init_pts = 5
-        if config.same_defines:
+
+        # Several configurations at a time when they are measured together
+        batch_size = self._experiment_info.bo_batch_size or objective_function.get_batch_size()
+
+        return self.batch_bo(config, objective_function, batch_size, init_pts, kappa_val)
+
+    def batch_bo(self, enemy_config, objective_function, batch_size, init_pts, kappa_val):
+        """
+        Use BO proposing batch_size configurations per round, evaluated together
+        With the same defines, one search space sets all the cores. With bo_joint, the defines of all
+        the cores are one search space, otherwise the cores are tuned one after the other.
+        :param enemy_config: An enemy mapping object
+        :param objective_function: The ObjectiveFunction the configurations are evaluated with
+        :param batch_size: The configurations per round
+        :param init_pts: Random configurations before the first round
+        :param kappa_val: Exploration weight of the upper confidence bound
+        :return: Best mapping and its corresponding result
+        """
+        config = enemy_config
+        spaces = self._get_bo_spaces(config, joint=self._experiment_info.bo_joint)
+
+        if len(spaces) == 1:
+            # One search space gets all the iterations, after its random configurations
             iterations = self._experiment_info.tuning_max_iterations
-            assert iterations > 0, "Bayesian optimization needs more iterations to work"
-            objective_function.stored_mapping = config
-            data_range = config.enemies[0].get_defines_range()
-            bo = BayesianOptimization(objective_function.bo_call, data_range, verbose=0)
-            bo.init(init_points=init_pts)
-            bo.maximize(n_iter=1, kappa=kappa_val)
-            it = 1
-            while it < iterations and time() < self._t_end:
-                bo.maximize(n_iter=1, kappa=kappa_val)
-                it += 1
-            for core in range(config.enemy_cores):
-                config.enemies[core].set_defines(bo.res['max']['max_params'])
         else:
-            iterations = int(self._experiment_info.tuning_max_iterations/config.enemy_cores - init_pts)
-            assert iterations > 0, "Bayesian optimization needs more iterations to work"
-
-            for core in range(config.enemy_cores):
-                objective_function.optimized_core = core
-                objective_function.stored_mapping = config
-                data_range = config.enemies[core].get_defines_range()
-
-                bo = BayesianOptimization(objective_function.bo_call, data_range, verbose=0)
-                bo.init(init_points=init_pts)
-                bo.maximize(n_iter=1, kappa=kappa_val)
-                it = 1
-                while it < iterations and time() < self._t_end:
-                    bo.maximize(n_iter=1, kappa=kappa_val)
-                    it += 1
-                config.enemies[core].set_defines(bo.res['max']['max_params'])
+            # The iterations are divided between the cores, random configurations included
+            iterations = int(self._experiment_info.tuning_max_iterations / len(spaces) - init_pts)
+        assert iterations > 0, "Bayesian optimization needs more iterations to work"
+
+        for space in spaces:
+            params = [config.enemies[cores[0]].get_define_specs()[define] for (cores, define) in space]
+            bo = BatchBayesianOptimization(params, kappa=kappa_val)
+
+            points = bo.random_points(init_pts)
+            bo.register(points, objective_function.evaluate_batch([self._instantiate(config, space, p)
+                                                                   for p in points]))
+            it = 0
+            while it < iterations and time() < self._t_end:
+                points = bo.suggest(min(batch_size, iterations - it))
+                bo.register(points, objective_function.evaluate_batch([self._instantiate(config, space, p)
+                                                                       for p in points]))
+                it += len(points)
+
+            config = self._instantiate(config, space, bo.get_max()[0])
 
         best_score = objective_function.best_score
 
         return config, best_score
 
+    @staticmethod
+    def _get_bo_spaces(config, joint=False):
+        """
+        Split the defines of a configuration into the search spaces of BO
+        With the same defines, one search space sets all the cores. With joint, the defines of all
+        the cores are one search space, otherwise there is a search space per core.
+        :param config: An enemy mapping object
+        :param joint: Search the defines of all the cores together
+        :return: A list of search spaces, each a list of (cores, define) it sets
+        """
+        if config.same_defines:
+            return [[(range(config.enemy_cores), define) for define in config.enemies[0].get_defines_range()]]
+        elif joint:
+            return [[([core], define) for core in range(config.enemy_cores)
+                     for define in config.enemies[core].get_defines_range()]]
+        else:
+            return [[([core], define) for define in config.enemies[core].get_defines_range()]
+                    for core in range(config.enemy_cores)]
+
+    @staticmethod
+    def _instantiate(config, space, point):
+        """
+        :param config: An enemy mapping object
+        :param space: A search space made by _get_bo_spaces
+        :param point: The values of the defines of the search space
+        :return: A copy of the configuration with these values
+        """
+        instance = deepcopy(config)
+        defines = {core: dict(instance.enemies[core].get_defines()) for core in range(config.enemy_cores)}
+        for (cores, define), value in zip(space, point):
+            for core in cores:
+                defines[core][define] = value
+        for core in range(config.enemy_cores):
+            instance.enemies[core].set_defines(defines[core])
+        return instance
+
+    def hyperband(self, enemy_config, model=False, kappa_val=6):
+        """
+        Use Hyperband to determine the best configuration, given the template
+        Each bracket measures many configurations at a cheap fidelity level and promotes the best
+        1/eta of them to the next level, up to the full experiment. The brackets start at every level,
+        from the cheapest to the full experiment only. With model, the new configurations are proposed
+        by BO on the highest level with enough measurements (BOHB), otherwise they are random.
+        :param enemy_config: An enemy mapping object
+        :param model: Propose the configurations with BO
+        :param kappa_val: Exploration weight of the upper confidence bound
+        :return: Best mapping and its corresponding result
+        """
+        assert isinstance(enemy_config, EnemyConfiguration)
+
+        config = enemy_config
+        eta = self._experiment_info.hyperband_eta
+        levels = self._experiment_info.get_fidelity_levels()
+        s_max = levels - 1
+
+        # The levels share the enemy files, so they are built and measured by the same evaluator
+        local = LocalEvaluator(self._experiment_info, self._platform_state) if self._farm is None else None
+
+        # The last level is the full experiment, the only one the tuning iterations are counted on
+        objective_functions = [ObjectiveFunction(experiment_info=self._experiment_info,
+                                                 log=self._log,
+                                                 farm=self._farm,
+                                                 checkpoint=self._checkpoint,
+                                                 fidelity=level if level < s_max else None,
+                                                 local=local)
+                               for level in range(levels)]
+        full = objective_functions[-1]
+
+        space = self._get_bo_spaces(config, joint=True)[0]
+        params = [config.enemies[cores[0]].get_define_specs()[define] for (cores, define) in space]
+        models = [BatchBayesianOptimization(params, kappa=kappa_val) for _ in range(levels)] if model else None
+
+        while full.iteration < self._experiment_info.tuning_max_iterations and time() < self._t_end:
+            for s in reversed(range(s_max + 1)):
+                count = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+
+                if model:
+                    fitted = [bo for bo in models if bo.get_size() > len(params)]
+                    points = fitted[-1].suggest(count) if fitted else models[0].random_points(count)
+                    candidates = [self._instantiate(config, space, p) for p in points]
+                else:
+                    points = [None] * count
+                    candidates = []
+                    for _ in range(count):
+                        config.random_set_all_defines()
+                        candidates.append(deepcopy(config))
+
+                # Successive halving, from level s_max - s to the full experiment
+                for level in range(s_max - s, levels):
+                    if level == s_max:
+                        remaining = self._experiment_info.tuning_max_iterations - full.iteration
+                        (candidates, points) = (candidates[:remaining], points[:remaining])
+
+                    q_values = []
+                    batch_size = objective_functions[level].get_batch_size()
+                    for i in range(0, len(candidates), batch_size):
+                        if time() >= self._t_end:
+                            break
+                        q_values += objective_functions[level].evaluate_batch(candidates[i:i + batch_size])
+
+                    if model:
+                        models[level].register(points[:len(q_values)], q_values)
+
+                    keep = sorted(range(len(q_values)), key=lambda c: q_values[c],
+                                  reverse=True)[:max(len(q_values) // eta, 1)]
+                    candidates = [candidates[c] for c in keep]
+                    points = [points[c] for c in keep]
+
+                if full.iteration >= self._experiment_info.tuning_max_iterations or time() >= self._t_end:
+                    break
+
+        if local is not None:
+            local.close()
+
+        best_mapping = full.best_mapping
+        best_score = full.best_score
+
+        return best_mapping, best_score
+
     def outer_random(self, enemy_config, inner_tune,  max_evaluations=100):
 
         objective_function = ObjectiveFunction(experiment_info=self._experiment_info,
                                                log=self._log,
-                                               socket_connect=self._socket)
+                                               farm=self._farm,
+                                               checkpoint=self._checkpoint,
+                                               platform_state=self._platform_state)
 
         current_config = enemy_config
         objective_function(enemy_config)
@@ -731,7 +1614,9 @@ class Optimization:
 
         objective_function = ObjectiveFunction(experiment_info=self._experiment_info,
                                                log=self._log,
-                                               socket_connect=self._socket)
+                                               farm=self._farm,
+                                               checkpoint=self._checkpoint,
+                                               platform_state=self._platform_state)
 
         # Initialise SA
         current_outer_config = enemy_config.random_set_all()
@@ -785,43 +1670,6 @@ class Optimization:
         return best_score, best_mapping
 
 
-class MySocket:
-    def __init__(self, sock=None):
-        if sock is None:
-            self.sock = socket.socket(
-                socket.AF_INET, socket.SOCK_STREAM)
-        else:
-            self.sock = sock
-
-    def connect(self, host, port):
-        self.sock.connect((host, port))
-
-    def mysend(self, msg, msglen):
-        totalsent = 0
-        while totalsent < msglen:
-            sent = self.sock.send(msg[totalsent:])
-            if sent == 0:
-                raise RuntimeError("socket connection broken")
-            totalsent = totalsent + sent
-
-    def myreceive(self, msglen):
-        chunks = []
-        bytes_recd = 0
-        while bytes_recd < msglen:
-            chunk = self.sock.recv(min(msglen - bytes_recd, 2048))
-            if chunk == '':
-                raise RuntimeError("socket connection broken")
-            chunks.append(chunk)
-            bytes_recd = bytes_recd + len(chunk)
-        return ''.join(chunks)
-
-
-class PackedStart:
-    def __init__(self, sut, temperature):
-        self.sut = sut
-        self.temperature = temperature
-
-
 class Tuning:
     """
     Run tuning based on random, SA or Bayesian Optimisation
@@ -839,14 +1687,20 @@ class Tuning:
         # Store the enemy config
         self._enemy_config = None
 
-        # For network connection
-        self._socket = None
+        # The boards measuring the configurations, this one if there is no farm
+        self._farm = None
+
+        # Continue the tunes from their checkpoints
+        self.resume = False
+        self._checkpoint = None
+
+        # Governor and frequencies of the experiment being tuned on this board
+        self._platform_state = None
 
     def cleanup(self):
-        if self._socket:
-            self._socket.send(pickle.dumps("Finished!") + b'data_end')
-            self._socket.close()
-            self._socket = None
+        if self._farm:
+            self._farm.close()
+            self._farm = None
 
     def read_json_object(self, json_object):
         """
@@ -856,6 +1710,7 @@ class Tuning:
         """
 
         self._enemy_config = EnemyConfiguration(self._experiment_info.cores)
+        self._enemy_config.set_build_mode(self._experiment_info.enemy_build)
 
         try:
             enemy_template = str(json_object["enemy_template"])
@@ -865,21 +1720,26 @@ class Tuning:
         except KeyError:
             pass
 
+        # The workers of the farm, on other boards or started here
+        try:
+            network = json_object["network"]
+            addresses = [network] if isinstance(network, str) else list(network)
+        except KeyError:
+            addresses = []
+
         try:
-            host = str(json_object["network"])
-            self._socket = socket.socket()
-            port = 12345  # Reserve a port for your service
-            print(host, port)
-            self._socket.connect((host, port))
-
-            pack = PackedStart(self._experiment_info.sut, self._experiment_info.sut)
-            pickle_pack = pickle.dumps(pack)
-            self._socket.send(pickle_pack)
-            pickle_sync = self._socket.recv(1024)      # Sync message
-            print(pickle.loads(pickle_sync))
+            local_workers = int(json_object["local_workers"])
+        except KeyError:
+            local_workers = 0
 
+        try:
+            job_timeout = float(json_object["farm_job_timeout"])
         except KeyError:
-            self._socket = None
+            job_timeout = DEFAULT_JOB_TIMEOUT
+
+        if addresses or local_workers:
+            self._farm = FarmCoordinator(addresses, self._experiment_info.experiment_name, json_object,
+                                         local_workers=local_workers, job_timeout=job_timeout)
 
     def bilevel_tune(self, outer_tune_method, inner_tune_method):
         """
@@ -893,7 +1753,9 @@ class Tuning:
 
         sa = Optimization(experiment_info=self._experiment_info,
                           log=self._log,
-                          network_socket=self._socket)
+                          farm=self._farm,
+                          checkpoint=self._checkpoint,
+                          platform_state=self._platform_state)
 
         if outer_tune_method == "ran":
             best_state, best_score = sa.outer_random(
@@ -923,7 +1785,9 @@ class Tuning:
 
         sa = Optimization(experiment_info=self._experiment_info,
                           log=self._log,
-                          network_socket=self._socket)
+                          farm=self._farm,
+                          checkpoint=self._checkpoint,
+                          platform_state=self._platform_state)
 
         if tune_method == "ran":
             best_state, best_score = sa.inner_random(self._enemy_config)
@@ -933,10 +1797,16 @@ class Tuning:
             best_state, best_score = sa.inner_anneal(self._enemy_config)
         elif tune_method == "bo":
             best_state, best_score = sa.inner_bo(self._enemy_config)
+        elif tune_method == "hb":
+            best_state, best_score = sa.hyperband(self._enemy_config)
+        elif tune_method == "bohb":
+            best_state, best_score = sa.hyperband(self._enemy_config, model=True)
         else:
             print("I do not know how to simple train that way")
             sys.exit(0)
 
+        # The tuned enemies have to run on their own, so they are always fully compiled
+        best_state.set_build_mode("compile")
         best_state.get_file_mapping(prefix=str(self._experiment_info.experiment_name) + "_",
                                     output_folder=self._experiment_info.output_binary)
 
@@ -958,59 +1828,100 @@ class Tuning:
         for experiment_name in tuning_object:
             self._experiment_info = ExperimentInfo(experiment_name)
             self._experiment_info.read_json_object(tuning_object[experiment_name])
+
+            # Before the random initial configuration, so a resumed tune starts from the same one
+            self._checkpoint = None
+            if self._experiment_info.checkpoint_file:
+                self._checkpoint = TuningCheckpoint(self._experiment_info.checkpoint_file, experiment_name,
+                                                    interval=self._experiment_info.checkpoint_interval,
+                                                    resume=self.resume)
+
+                if self._checkpoint.finished:
+                    # Only report what the tune found, its budget was spent
+                    incumbent = self._checkpoint.get_incumbent()
+                    print(experiment_name, "was already tuned, the best was", incumbent)
+                    self._checkpoint.close()
+                    self._log.experiment_info(self._experiment_info)
+                    self._log.log_stats("checkpoint", {"finished": True, "incumbent": incumbent})
+                    self._log.file_dump()
+                    continue
+
             self.read_json_object(tuning_object[experiment_name])
 
-            # To give each tuning a fair chance.
-            # We do not need this at this time
-            # seed(1000)
-
-            if self._experiment_info.method == "sa_ran":
-                print("Tuning by simulated annealing on the "
-                      "outer loop and random on the inner loop")
-                self.bilevel_tune("sa", "ran")
-            elif self._experiment_info.method == "sa_hc":
-                print("Tuning by simulated annealing on the "
-                      "outer loop and hill climbing on the inner loop")
-                self.bilevel_tune("sa", "hc")
-            elif self._experiment_info.method == "sa_sa":
-                print("Tuning by simulated annealing on the "
-                      "outer loop and simulated annealing on the inner loop")
-                self.bilevel_tune("sa", "sa")
-            elif self._experiment_info.method == "sa_bo":
-                print("Tuning by simulated annealing on the "
-                      "outer loop and bayesian optimization on the inner loop")
-                self.bilevel_tune("sa", "bo")
-            elif self._experiment_info.method == "ran_ran":
-                print("Tuning by randomising on the outer "
-                      "loop and random on the inner loop")
-                self.bilevel_tune("ran", "ran")
-            elif self._experiment_info.method == "ran_hc":
-                print("Tuning by randomising on the outer "
-                      "loop and hill climbing on the inner loop")
-                self.bilevel_tune("ran", "hc")
-            elif self._experiment_info.method == "ran_sa":
-                print("Tuning by randomising on the outer "
-                      "loop and simulated annealing on the inner loop")
-                self.bilevel_tune("ran", "sa")
-            elif self._experiment_info.method == "ran_bo":
-                print("Tuning by randomising on the outer "
-                      "loop and bayesian optimization on the inner loop")
-                self.bilevel_tune("ran", "bo")
-            elif self._experiment_info.method == "ran":
-                print(colored("Tuning by randomising with a fixed template", "blue"))
-                self.simple_tune("ran")
-            elif self._experiment_info.method == "hc":
-                print(colored("Tuning by hillclimbing with a fixed template", "blue"))
-                self.simple_tune("hc")
-            elif self._experiment_info.method == "sa":
-                print(colored("Tuning by simulated annealing with a fixed template", "blue"))
-                self.simple_tune("sa")
-            elif self._experiment_info.method == "bo":
-                print(colored("Tuning with bayesian optimization with a fixed template", "blue"))
-                self.simple_tune("bo")
-            else:
-                print("I do not know how to train that way")
-                sys.exit(0)
+            # Applied once for the experiment, and restored even if the tune fails
+            self._platform_state = None
+            if self._farm is None:
+                self._platform_state = PlatformState(governor=self._experiment_info.governor,
+                                                     min_frequency=self._experiment_info.min_frequency,
+                                                     max_frequency=self._experiment_info.max_frequency)
+                self._platform_state.apply()
+
+            try:
+                # To give each tuning a fair chance.
+                # We do not need this at this time
+                # seed(1000)
+
+                if self._experiment_info.method == "sa_ran":
+                    print("Tuning by simulated annealing on the "
+                          "outer loop and random on the inner loop")
+                    self.bilevel_tune("sa", "ran")
+                elif self._experiment_info.method == "sa_hc":
+                    print("Tuning by simulated annealing on the "
+                          "outer loop and hill climbing on the inner loop")
+                    self.bilevel_tune("sa", "hc")
+                elif self._experiment_info.method == "sa_sa":
+                    print("Tuning by simulated annealing on the "
+                          "outer loop and simulated annealing on the inner loop")
+                    self.bilevel_tune("sa", "sa")
+                elif self._experiment_info.method == "sa_bo":
+                    print("Tuning by simulated annealing on the "
+                          "outer loop and bayesian optimization on the inner loop")
+                    self.bilevel_tune("sa", "bo")
+                elif self._experiment_info.method == "ran_ran":
+                    print("Tuning by randomising on the outer "
+                          "loop and random on the inner loop")
+                    self.bilevel_tune("ran", "ran")
+                elif self._experiment_info.method == "ran_hc":
+                    print("Tuning by randomising on the outer "
+                          "loop and hill climbing on the inner loop")
+                    self.bilevel_tune("ran", "hc")
+                elif self._experiment_info.method == "ran_sa":
+                    print("Tuning by randomising on the outer "
+                          "loop and simulated annealing on the inner loop")
+                    self.bilevel_tune("ran", "sa")
+                elif self._experiment_info.method == "ran_bo":
+                    print("Tuning by randomising on the outer "
+                          "loop and bayesian optimization on the inner loop")
+                    self.bilevel_tune("ran", "bo")
+                elif self._experiment_info.method == "ran":
+                    print(colored("Tuning by randomising with a fixed template", "blue"))
+                    self.simple_tune("ran")
+                elif self._experiment_info.method == "hc":
+                    print(colored("Tuning by hillclimbing with a fixed template", "blue"))
+                    self.simple_tune("hc")
+                elif self._experiment_info.method == "sa":
+                    print(colored("Tuning by simulated annealing with a fixed template", "blue"))
+                    self.simple_tune("sa")
+                elif self._experiment_info.method == "bo":
+                    print(colored("Tuning with bayesian optimization with a fixed template", "blue"))
+                    self.simple_tune("bo")
+                elif self._experiment_info.method == "hb":
+                    print(colored("Tuning with Hyperband on the fidelity levels with a fixed template", "blue"))
+                    self.simple_tune("hb")
+                elif self._experiment_info.method == "bohb":
+                    print(colored("Tuning with Hyperband and bayesian optimization on the fidelity levels "
+                                  "with a fixed template", "blue"))
+                    self.simple_tune("bohb")
+                else:
+                    print("I do not know how to train that way")
+                    sys.exit(0)
+
+                if self._checkpoint is not None:
+                    self._checkpoint.finish()
+            finally:
+                if self._platform_state is not None:
+                    self._platform_state.restore()
+                    self._platform_state = None
 
             self._log.file_dump()
 
@@ -1020,10 +1931,18 @@ class Tuning:
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("usage: " + sys.argv[0] + " <tuning_file>.json <results>.json\n")
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        # A board of the farm, measuring for a coordinator
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT, LocalEvaluator.from_start)
+
+    resume = "--resume" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--resume"]
+    if len(args) != 2:
+        print("usage: " + sys.argv[0] + " [--resume] <tuning_file>.json <results>.json\n"
+              "       " + sys.argv[0] + " --worker [port]\n")
         exit(1)
 
     tr = Tuning()
+    tr.resume = resume
 
-    tr.run(sys.argv[1], sys.argv[2])
+    tr.run(args[0], args[1])
@@ -0,0 +1,291 @@
+################################################################################
+ # Copyright (c) 2017 Dan Iorga, Tyler Sorenson, Alastair Donaldson
+
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+
+ # The above copyright notice and this permission notice shall be included in all
+ #copies or substantial portions of the Software.
+
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ # IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ # FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ # AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ # SOFTWARE.
+################################################################################
+
+
+"""@package python_scripts
+A Gaussian process surrogate for the tuners
+The defines of the templates are encoded in [0, 1], the Gaussian process is updated one
+observation at a time and the acquisition is maximised over whole arrays of candidates.
+"""
+
+import numpy as np
+from scipy.linalg import solve_triangular
+
+# A categorical define is one-hot, scaled so that two choices are as far apart as the ends of a range
+_ONE_HOT = 1 / np.sqrt(2)
+
+
+class ParameterSpace:
+    """
+    The defines of a search space, encoded as points in [0, 1]
+    Float and int defines are one dimension each, ints cover [low, high) like randrange. A
+    categorical define, such as the INSTRn opcodes, has one dimension per choice so that no
+    choice is closer to another.
+    """
+
+    def __init__(self, params):
+        """
+        :param params: List of (type, low, high) of every define, "float", "int" or "categorical".
+                       The choices of a categorical define are range(low, high)
+        """
+        self._params = [(str(t), low, high) for (t, low, high) in params]
+        self._slices = []
+        dims = 0
+        for (param_type, low, high) in self._params:
+            width = (high - low) if param_type == "categorical" else 1
+            assert width > 0, "Empty range " + str((low, high))
+            self._slices.append(slice(dims, dims + width))
+            dims += width
+        self.dims = dims
+
+    def encode(self, points):
+        """
+        :param points: Lists of define values
+        :return: The encoded points, one by row
+        """
+        x = np.zeros((len(points), self.dims))
+        for i, point in enumerate(points):
+            for (param_type, low, high), dims, value in zip(self._params, self._slices, point):
+                if param_type == "categorical":
+                    x[i, dims.start + int(value) - low] = _ONE_HOT
+                elif param_type == "int":
+                    x[i, dims.start] = (int(value) - low + 0.5) / (high - low)
+                else:
+                    x[i, dims.start] = (value - low) / (high - low) if high > low else 0
+        return x
+
+    def decode(self, x):
+        """
+        :param x: Encoded points, one by row
+        :return: Lists of define values
+        """
+        x = np.atleast_2d(x)
+        columns = []
+        for (param_type, low, high), dims in zip(self._params, self._slices):
+            if param_type == "categorical":
+                columns.append((low + np.argmax(x[:, dims], axis=1)).tolist())
+            elif param_type == "int":
+                columns.append(np.clip(np.floor(low + x[:, dims.start] * (high - low)), low, high - 1)
+                               .astype(int).tolist())
+            else:
+                columns.append((low + x[:, dims.start] * (high - low)).tolist())
+        return [list(point) for point in zip(*columns)]
+
+    def sample(self, count):
+        """
+        :param count: The number of points
+        :return: Uniformly random encoded points, one by row
+        """
+        x = np.random.uniform(size=(count, self.dims))
+        for (param_type, low, high), dims in zip(self._params, self._slices):
+            if param_type == "categorical":
+                x[:, dims] = 0
+                x[np.arange(count), dims.start + np.random.randint(high - low, size=count)] = _ONE_HOT
+        return x
+
+    def perturb(self, x, scale):
+        """
+        :param x: Encoded points, one by row
+        :param scale: Standard deviation of the moves, and probability of changing a categorical choice
+        :return: Random neighbours of the points
+        """
+        x = np.array(x)
+        count = len(x)
+        for (param_type, low, high), dims in zip(self._params, self._slices):
+            if param_type == "categorical":
+                change = np.random.uniform(size=count) < scale
+                x[change, dims] = 0
+                x[np.flatnonzero(change), dims.start + np.random.randint(high - low, size=change.sum())] = _ONE_HOT
+            else:
+                x[:, dims.start] = np.clip(x[:, dims.start] + np.random.normal(scale=scale, size=count), 0, 1)
+        return x
+
+
+class GaussianProcess:
+    """
+    A Gaussian process with a Matern 5/2 kernel
+    The Cholesky factor of the covariance grows by one row per observation, which costs O(n^2)
+    instead of refactoring it in O(n^3). The length scale and the noise are chosen again, with a
+    full factorisation, when the observations grow by refit_growth times since the last time, and
+    at least by refit_every. The refits cost O(n^3) in total rather than O(n^4).
+    """
+
+    length_scales = [0.05, 0.1, 0.2, 0.4, 0.8]
+    noises = [1e-4, 1e-2, 1e-1]
+
+    def __init__(self, refit_every=10, refit_growth=1.25):
+        """
+        :param refit_every: Minimum observations added before the hyperparameters are chosen again
+        :param refit_growth: Factor the observations grow by before the hyperparameters are chosen again
+        """
+        self._refit_every = refit_every
+        self._refit_growth = refit_growth
+        self.length_scale = 0.2
+        self.noise = 1e-2
+
+        # Observations, the targets standardised with the mean and deviation of the last fit
+        self._x = np.zeros((0, 0))
+        self._y = np.zeros(0)
+        self._raw_y = np.zeros(0)
+        self._mean = 0
+        self._std = 1
+
+        self._chol = np.zeros((0, 0))
+        self._alpha = np.zeros(0)
+        # The number of observations the hyperparameters are chosen again at
+        self._next_fit = 0
+
+    def get_size(self):
+        """
+        :return: The number of observations
+        """
+        return len(self._y)
+
+    def _kernel(self, a, b):
+        """
+        :param a: Points, one by row
+        :param b: Points, one by row
+        :return: The Matern 5/2 covariance of every pair
+        """
+        sq = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2 * a.dot(b.T)
+        d = np.sqrt(5 * np.maximum(sq, 0)) / self.length_scale
+        return (1 + d + d ** 2 / 3) * np.exp(-d)
+
+    def _solve(self):
+        """
+        Update the weights of the observations from the Cholesky factor
+        """
+        self._alpha = solve_triangular(self._chol.T, solve_triangular(self._chol, self._y, lower=True), lower=False)
+
+    def _factor(self):
+        """
+        Factor the whole covariance
+        :return: The log marginal likelihood
+        """
+        k = self._kernel(self._x, self._x) + self.noise * np.eye(len(self._x))
+        self._chol = np.linalg.cholesky(k)
+        self._solve()
+        return -0.5 * self._y.dot(self._alpha) - np.log(np.diag(self._chol)).sum()
+
+    def fit(self, x, y):
+        """
+        Replace all the observations and choose the hyperparameters
+        :param x: The encoded points, one by row
+        :param y: Their values
+        """
+        self._x = np.array(x, dtype=float)
+        self._raw_y = np.array(y, dtype=float)
+        self._mean = self._raw_y.mean()
+        self._std = self._raw_y.std() if self._raw_y.std() > 0 else 1
+        self._y = (self._raw_y - self._mean) / self._std
+
+        best = None
+        for length_scale in self.length_scales:
+            for noise in self.noises:
+                (self.length_scale, self.noise) = (length_scale, noise)
+                likelihood = self._factor()
+                if best is None or likelihood > best[0]:
+                    best = (likelihood, length_scale, noise)
+        (self.length_scale, self.noise) = best[1:]
+        self._factor()
+
+        size = len(self._y)
+        self._next_fit = max(size + self._refit_every, int(np.ceil(size * self._refit_growth)))
+
+    def add(self, x, y, refit=True):
+        """
+        Add one observation, with a rank one update of the Cholesky factor
+        :param x: The encoded point
+        :param y: Its value
+        :param refit: Allow choosing the hyperparameters again
+        """
+        x = np.asarray(x, dtype=float)[None, :]
+        if not len(self._y) or (refit and len(self._y) + 1 >= self._next_fit):
+            self.fit(np.vstack([self._x, x]) if len(self._y) else x, np.append(self._raw_y, y))
+            return
+
+        k = self._kernel(self._x, x)[:, 0]
+        row = solve_triangular(self._chol, k, lower=True)
+        corner = np.sqrt(max(1 + self.noise - row.dot(row), 1e-12))
+
+        n = len(self._y)
+        chol = np.zeros((n + 1, n + 1))
+        chol[:n, :n] = self._chol
+        chol[n, :n] = row
+        chol[n, n] = corner
+        self._chol = chol
+
+        self._x = np.vstack([self._x, x])
+        self._raw_y = np.append(self._raw_y, y)
+        self._y = np.append(self._y, (y - self._mean) / self._std)
+        self._solve()
+
+    def truncate(self, size):
+        """
+        Forget the observations after the first size ones
+        The Cholesky factor of the leading observations is the leading block of the factor. The
+        next refit is still due at the same number of observations.
+        :param size: The number of observations kept
+        """
+        self._x = self._x[:size]
+        self._raw_y = self._raw_y[:size]
+        self._y = self._y[:size]
+        self._chol = self._chol[:size, :size]
+        self._solve()
+
+    def predict(self, x):
+        """
+        :param x: Encoded points, one by row
+        :return: The mean and standard deviation of the prediction at every point
+        """
+        k = self._kernel(np.asarray(x, dtype=float), self._x)
+        mean = k.dot(self._alpha)
+        v = solve_triangular(self._chol, k.T, lower=True)
+        variance = np.maximum(1 - (v ** 2).sum(axis=0), 1e-12)
+        return mean * self._std + self._mean, np.sqrt(variance) * self._std
+
+
+def maximize_acquisition(acquisition, space, best_x, candidates=2048, rounds=3, keep=32):
+    """
+    Maximise an acquisition function over arrays of candidates
+    Random candidates, and some around the best observation, are refined for a few rounds by
+    moving the best of them by shrinking steps. Every round is a single call of the acquisition.
+    :param acquisition: Function of an array of encoded points, one by row, returning their values
+    :param space: The ParameterSpace
+    :param best_x: The encoded best observation
+    :param candidates: The number of random candidates
+    :param rounds: The rounds of refinement
+    :param keep: The candidates refined at every round
+    :return: The encoded point with the highest acquisition found
+    """
+    x = np.vstack([space.sample(candidates), space.perturb(np.repeat(best_x[None, :], candidates // 8, axis=0), 0.05)])
+    values = acquisition(x)
+
+    scale = 0.1
+    for _ in range(rounds):
+        top = np.argsort(values)[-keep:]
+        moved = space.perturb(np.repeat(x[top], 16, axis=0), scale)
+        x = np.vstack([x[top], moved])
+        values = np.concatenate([values[top], acquisition(moved)])
+        scale /= 2
+
+    return x[int(np.argmax(values))]
@@ -0,0 +1,353 @@
+################################################################################
+ # Copyright (c) 2017 Dan Iorga, Tyler Sorenson, Alastair Donaldson
+
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+
+ # The above copyright notice and this permission notice shall be included in all
+ #copies or substantial portions of the Software.
+
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ # IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ # FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ # AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ # SOFTWARE.
+################################################################################
+
+
+"""@package python_scripts
+Evaluate enemy configurations on a farm of identical boards
+The tuning coordinator sends configurations to a worker agent on every board and gets
+back their MappingResult. Messages are JSON, framed by a versioned header with their length.
+"""
+
+import sys
+import json
+import time
+import socket
+import struct
+import selectors
+import subprocess
+from collections import deque
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 12345
+DEFAULT_JOB_TIMEOUT = 3600
+
+# Magic, protocol version, message type and payload length
+_HEADER = struct.Struct("!4sHBI")
+_MAGIC = b"MCTF"
+_MAX_PAYLOAD = 1 << 28
+
+# Message types
+MSG_HELLO = 0       # Worker to coordinator when it connects: protocol version and host
+MSG_START = 1       # Coordinator to worker: the experiment the configurations belong to
+MSG_EVALUATE = 2    # Coordinator to worker: a job, with its [batch, index] id, configuration and race bound
+MSG_RESULT = 3      # Worker to coordinator: the id of a job and its MappingResult dict
+MSG_ERROR = 4       # Worker to coordinator: the id of a job that failed and why
+MSG_STOP = 5        # Coordinator to worker: the experiment is over
+
+
+def send_message(sock, message_type, payload):
+    """
+    Send a framed message
+    :param sock: The connected socket
+    :param message_type: One of the MSG_ types
+    :param payload: A JSON serialisable object
+    """
+    data = json.dumps(payload).encode()
+    sock.sendall(_HEADER.pack(_MAGIC, PROTOCOL_VERSION, message_type, len(data)) + data)
+
+
+def _receive_exactly(sock, size):
+    """
+    :param sock: The connected socket
+    :param size: The number of bytes to read
+    :return: Exactly that many bytes
+    """
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed by the other end")
+        received += count
+
+    return bytes(data)
+
+
+def receive_message(sock):
+    """
+    Receive a framed message
+    :param sock: The connected socket
+    :return: The message type and its payload
+    """
+    (magic, version, message_type, length) = _HEADER.unpack(_receive_exactly(sock, _HEADER.size))
+    if magic != _MAGIC:
+        raise ValueError("Not a farm message")
+    if version != PROTOCOL_VERSION:
+        raise ValueError("Farm protocol version " + str(version) + ", expected " + str(PROTOCOL_VERSION))
+    if length > _MAX_PAYLOAD:
+        raise ValueError("Farm message of " + str(length) + " bytes")
+
+    return message_type, json.loads(_receive_exactly(sock, length).decode())
+
+
+def parse_address(address):
+    """
+    :param address: "host" or "host:port"
+    :return: (host, port)
+    """
+    (host, _, port) = str(address).partition(":")
+    return host, int(port) if port else DEFAULT_PORT
+
+
+class FarmCoordinator:
+    """
+    Keep the workers of a farm busy with the jobs of the tuners
+    A worker gets one job at a time, the next one as soon as it sends back its result. The jobs
+    of a worker that disconnects, or does not answer in time, go to the others.
+    """
+
+    def __init__(self, addresses, experiment_name, experiment_object, local_workers=0, connect_timeout=30,
+                 job_timeout=DEFAULT_JOB_TIMEOUT):
+        """
+        Connect to the workers and start the experiment on them
+        :param addresses: List of "host:port" of the workers
+        :param experiment_name: The name of the experiment
+        :param experiment_object: The JSON object of the experiment, every worker reads it
+        :param local_workers: Number of workers to start on this machine, for testing
+        :param connect_timeout: Seconds to wait for a worker to accept the connection
+        :param job_timeout: Seconds a worker has to send back the result of a job before it is dropped
+        """
+        self._job_timeout = job_timeout
+        # Job ids carry the batch they belong to, a late answer from an earlier batch is ignored
+        self._batch = 0
+
+        addresses = list(addresses)
+        self._local_processes = []
+        # Local workers build in folders of their own, but share the cores and the platform
+        # settings of this machine, so their measurements disturb each other
+        for _ in range(local_workers):
+            port = self._free_port()
+            self._local_processes.append(subprocess.Popen([sys.executable, "run_tuning.py", "--worker", str(port)]))
+            addresses.append("localhost:" + str(port))
+
+        self._workers = dict()
+        self._selector = selectors.DefaultSelector()
+        try:
+            for address in addresses:
+                sock = self._connect(parse_address(address), connect_timeout)
+                (message_type, hello) = receive_message(sock)
+                assert message_type == MSG_HELLO, "Worker " + address + " did not say hello"
+                print("Farm worker", address, "on", hello["host"])
+
+                send_message(sock, MSG_START, {"experiment_name": experiment_name,
+                                               "experiment": experiment_object})
+                self._workers[sock] = address
+                self._selector.register(sock, selectors.EVENT_READ)
+        except Exception:
+            self.close()
+            raise
+
+        assert self._workers, "No farm worker to evaluate on"
+
+    @staticmethod
+    def _free_port():
+        """
+        :return: A port nobody listens on at the moment
+        """
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            return sock.getsockname()[1]
+
+    @staticmethod
+    def _connect(address, timeout):
+        """
+        Connect to a worker, waiting for it to listen
+        :param address: (host, port)
+        :param timeout: Seconds to keep trying
+        :return: The connected socket
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                sock = socket.create_connection(address)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return sock
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def get_size(self):
+        """
+        :return: The number of workers, as many jobs are evaluated at once
+        """
+        return len(self._workers)
+
+    def _drop(self, sock):
+        """
+        Forget a worker that is gone
+        """
+        print("Farm worker", self._workers[sock], "is gone")
+        self._selector.unregister(sock)
+        sock.close()
+        del self._workers[sock]
+
+    def _receive(self, busy, pending, deadlines):
+        """
+        Wait for the next answers of the busy workers, or until the first deadline
+        Workers that are gone or late are dropped and their job is pending again.
+        :param busy: Dict of the job index by worker socket
+        :param pending: Deque of the job indexes to send, or None to forget the jobs of the dropped workers
+        :param deadlines: Dict of the time by which every busy worker has to answer
+        :return: List of (job index, message type, payload) of the answers of this batch
+        """
+        timeout = None
+        if deadlines:
+            timeout = max(0, min(deadlines.values()) - time.monotonic())
+
+        answers = []
+        for key, _ in self._selector.select(timeout):
+            sock = key.fileobj
+            try:
+                (message_type, payload) = receive_message(sock)
+            except (OSError, ValueError):
+                job = busy.pop(sock, None)
+                deadlines.pop(sock, None)
+                if job is not None and pending is not None:
+                    pending.appendleft(job)
+                self._drop(sock)
+                continue
+
+            (batch, job) = payload["id"]
+            if batch != self._batch or busy.get(sock) != job:
+                # Left over from a batch that was abandoned
+                continue
+
+            del busy[sock]
+            del deadlines[sock]
+            answers.append((job, message_type, payload))
+
+        now = time.monotonic()
+        for sock in [sock for sock, deadline in deadlines.items() if deadline <= now]:
+            print("Farm worker", self._workers[sock], "did not answer in", self._job_timeout, "s")
+            job = busy.pop(sock)
+            del deadlines[sock]
+            if pending is not None:
+                pending.appendleft(job)
+            self._drop(sock)
+
+        return answers
+
+    def evaluate(self, jobs):
+        """
+        Evaluate jobs on the workers
+        :param jobs: List of job dicts, with the configuration spec and the race bound
+        :return: The MappingResult dicts, in the order of the jobs
+        """
+        self._batch += 1
+        pending = deque(range(len(jobs)))
+        results = [None] * len(jobs)
+        busy = dict()
+        deadlines = dict()
+
+        while pending or busy:
+            # Every idle worker gets the next job
+            for sock in list(self._workers):
+                if not pending:
+                    break
+                if sock in busy:
+                    continue
+                job = pending.popleft()
+                try:
+                    send_message(sock, MSG_EVALUATE, dict(jobs[job], id=[self._batch, job]))
+                    busy[sock] = job
+                    if self._job_timeout is not None:
+                        deadlines[sock] = time.monotonic() + self._job_timeout
+                except OSError:
+                    pending.appendleft(job)
+                    self._drop(sock)
+
+            if not self._workers:
+                raise RuntimeError("No farm worker left")
+
+            for job, message_type, payload in self._receive(busy, pending, deadlines):
+                if message_type == MSG_RESULT:
+                    results[job] = payload["result"]
+                elif message_type == MSG_ERROR:
+                    # Let the other workers finish, so they are idle for the next batch
+                    while busy:
+                        self._receive(busy, None, deadlines)
+                    raise RuntimeError("Farm job " + str(job) + " failed: " + payload["error"])
+
+        return results
+
+    def close(self):
+        """
+        Stop the experiment on the workers, and the local workers
+        """
+        for sock in list(self._workers):
+            try:
+                send_message(sock, MSG_STOP, None)
+            except OSError:
+                pass
+            self._selector.unregister(sock)
+            sock.close()
+        self._workers = dict()
+
+        for process in self._local_processes:
+            process.terminate()
+            process.wait()
+        self._local_processes = []
+
+
+def serve(port, evaluator_factory):
+    """
+    Run a worker agent, evaluating the jobs of one coordinator after another
+    :param port: The port to listen on
+    :param evaluator_factory: Called with the START payload, returns a callable evaluating a job
+                              into a MappingResult dict, with a close method
+    """
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("", port))
+    server.listen(1)
+    print("Farm worker listening on port", port)
+
+    while True:
+        (sock, address) = server.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print("Coordinator", address[0], "connected")
+        evaluator = None
+        try:
+            send_message(sock, MSG_HELLO, {"protocol": PROTOCOL_VERSION, "host": socket.gethostname()})
+            while True:
+                (message_type, payload) = receive_message(sock)
+                if message_type == MSG_START:
+                    if evaluator is not None:
+                        evaluator.close()
+                    evaluator = evaluator_factory(payload)
+                elif message_type == MSG_EVALUATE:
+                    try:
+                        result = evaluator(payload)
+                    except Exception as e:
+                        send_message(sock, MSG_ERROR, {"id": payload["id"], "error": repr(e)})
+                        continue
+                    send_message(sock, MSG_RESULT, {"id": payload["id"], "result": result})
+                elif message_type == MSG_STOP:
+                    break
+        except (OSError, ValueError) as e:
+            print("Coordinator connection lost:", e)
+        finally:
+            if evaluator is not None:
+                evaluator.close()
+            sock.close()
@@ -97,6 +97,9 @@ int main(int argc, char *argv[]) {
 
     printf("Sum: %u\n", sum);
     printf("total time(us): %ld\n", end - begin);
+    print_mcth_result(end - begin, "us",
+                      usage_stop.ru_nvcsw - usage_start.ru_nvcsw,
+                      usage_stop.ru_nivcsw - usage_start.ru_nivcsw);
 
     free( (void *) my_array);
     return 0;
@@ -31,11 +31,18 @@
 
 #include <inttypes.h>
 #include <stdio.h>
+#include <stdlib.h>
 #include <time.h>
 
 /** Helper defines for measuring time */
 #define MICROSEC 1000000L
 
+/** Environment variable telling a batched SUT how many times to run its kernel */
+#define SUT_REPETITIONS_ENV "SUT_REPETITIONS"
+
+/** Prefix of the machine readable result line of a SUT */
+#define MCTH_PREFIX "MCTH "
+
 /** Macro used to asserts the exit code. If the exit code is diffeerent
  * than the expected one, it prints an error message and terminates execution
  */
@@ -60,3 +67,34 @@ long get_current_time_us (void) {
   clock_gettime(CLOCK_REALTIME, &spec);
   return spec.tv_sec * MICROSEC + spec.tv_nsec / 1000;
 }
+
+/**
+ * @brief Gets the number of repetitions of a batched SUT
+ * A batched SUT runs its kernel this many times in the same process and
+ * reports the time of each run on its own line.
+ * *return The number of repetitions, 1 if it is not set
+ */
+int get_sut_repetitions (void) {
+
+  const char *value = getenv(SUT_REPETITIONS_ENV);
+  int repetitions = value ? atoi(value) : 1;
+
+  return repetitions > 0 ? repetitions : 1;
+}
+
+/**
+ * @brief Prints the machine readable result of a SUT run
+ * The harness parses this line directly instead of scraping the human readable
+ * output. Negative context switch counts are left out.
+ * @param metric The measured execution time or latency
+ * @param unit The unit of the metric
+ * @param vol_sw Voluntary context switches during the run
+ * @param invol_sw Involuntary context switches during the run
+ */
+void print_mcth_result (double metric, const char *unit, long vol_sw, long invol_sw) {
+
+  printf(MCTH_PREFIX "{\"metric\": %.17g, \"unit\": \"%s\"", metric, unit);
+  if (vol_sw >= 0 && invol_sw >= 0)
+    printf(", \"vol_sw\": %ld, \"invol_sw\": %ld", vol_sw, invol_sw);
+  printf("}\n");
+}
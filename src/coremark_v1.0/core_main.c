@@ -288,10 +288,12 @@ MAIN_RETURN_TYPE main(int argc, char *argv[]) {
 	ee_printf("Total ticks      : %u\n",(ee_u32)total_time);
 #if HAS_FLOAT
 	ee_printf("Total time (secs): %f\n",time_in_secs(total_time));
+	ee_printf("MCTH {\"metric\": %f, \"unit\": \"s\"}\n",time_in_secs(total_time));
 	if (time_in_secs(total_time) > 0)
 		ee_printf("Iterations/Sec   : %f\n",default_num_contexts*results[0].iterations/time_in_secs(total_time));
 #else 
 	ee_printf("Total time (secs): %d\n",time_in_secs(total_time));
+	ee_printf("MCTH {\"metric\": %d, \"unit\": \"s\"}\n",time_in_secs(total_time));
 	if (time_in_secs(total_time) > 0)
 		ee_printf("Iterations/Sec   : %d\n",default_num_contexts*results[0].iterations/time_in_secs(total_time));
 #endif
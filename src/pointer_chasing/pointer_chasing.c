@@ -113,6 +113,8 @@ int launch()
 		benchmark_arm(mem_chunk);
 	#endif
 
+	free(mem_chunk);
+
 	return(EXIT_SUCCESS);
 
 }
@@ -121,15 +123,20 @@ int launch()
 int main(int argc, char *argv[]) {
 
 		long begin = 0, end = 0;
+		int r, repetitions = get_sut_repetitions();
 
     printf("We have %lu ELEMENTS\n", ELEMENTS);
     printf("The stride is %lu\n", STRIDE);
+
+    for (r = 0; r < repetitions; r++) {
 		begin = get_current_time_us();
 
     launch();
 
 		end = get_current_time_us();
 		printf("total time(us): %ld\n", end - begin);
+		print_mcth_result(end - begin, "us", -1, -1);
+    }
 
     return(EXIT_SUCCESS);
 }
@@ -1 +1,4 @@
-sudo ~/workspace/dstl_enemy_process/bin/sut/cyclictest -m -t1 -p 80 -n -i 500 -l 100000
+# The MCTH line gives the harness the worst latency over all the threads, in us
+sudo ~/workspace/dstl_enemy_process/bin/sut/cyclictest -m -t1 -p 80 -n -i 500 -l 100000 | \
+    awk '{ print } { for (i = 1; i < NF; i++) if ($i == "Max:" && $(i + 1) + 0 >= max) { max = $(i + 1) + 0; found = 1 } }
+         END { if (found) printf "MCTH {\"metric\": %d, \"unit\": \"us\"}\n", max }'
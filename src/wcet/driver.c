@@ -22,6 +22,7 @@
 
 #include <inttypes.h>
 #include <stdlib.h>
+#include <sys/resource.h>
 
 #include "../common/common.h"
 
@@ -101,26 +102,36 @@
 int main(int argc, char *argv[]){
 //  int iterations = 100000;
   int iterations = 1500;
-  int i;
+  int i, r;
+  int repetitions = get_sut_repetitions();
   long begin, end;
+  struct rusage usage_start, usage_stop;
   if (argc > 1) {
     iterations = atoi(argv[1]);
   }
 
-  begin = get_current_time_us();
+  printf("%d total-iterations\n", iterations);
+
+  for (r = 0; r < repetitions; r++) {
+    getrusage(RUSAGE_SELF, &usage_start);
+    begin = get_current_time_us();
 
 #if defined(INFINITE)
-  while(1) {
+    while(1) {
 #else
-  for (i = 0; i < iterations; i++) {
+    for (i = 0; i < iterations; i++) {
 #endif
-    captured_main();
-  }
+      captured_main();
+    }
 
-  end = get_current_time_us();
+    end = get_current_time_us();
+    getrusage(RUSAGE_SELF, &usage_stop);
 
-  printf("%d total-iterations\n", iterations);
-  printf("total time(us): %ld\n", end - begin);
+    printf("total time(us): %ld\n", end - begin);
+    print_mcth_result(end - begin, "us",
+                      usage_stop.ru_nvcsw - usage_start.ru_nvcsw,
+                      usage_stop.ru_nivcsw - usage_start.ru_nivcsw);
+  }
 
   return 0;
 }
@@ -31,6 +31,9 @@
 	* Parameters to randomise:
     *  SIZE_MB
     *  PAGE_SIZE_BYTES
+    *
+    * Compiled with -DRUNTIME_PARAMS, the parameters are read at startup
+    * instead (see template_params.h)
 	*/
 
 #include <stdio.h>
@@ -46,6 +49,15 @@
 /** The total memory the it will try to allocate and thrash */
 #define MEM_SIZE        SIZE_MB * (MB)
 
+#ifdef RUNTIME_PARAMS
+#include "../template_params.h"
+
+/** Tunnable parameters, read at startup */
+static long SIZE_MB;
+static long SIZE;
+static int INSTR[5];
+#else
+
 /** 1st tunnable parameter */
 #if SIZE == 1
 #define SIZE_A uint8_t
@@ -65,6 +77,8 @@
 #define SIZE_A int64_t
 #endif
 
+#endif
+
 /** location 1 to location 2 */
 #define MEM1_2_MEM2 for (SIZE_A i; i < MEM_SIZE/sizeof(SIZE_A); i++) mem2[i] = mem1[i]
 /** location 2 to location 1 */
@@ -76,6 +90,107 @@
 /** location 2 to CPU to location 1 */
 #define MEM2_2_CPU_2_MEM1 for (SIZE_A i; i < MEM_SIZE/sizeof(SIZE_A); i++) mem1[i] = mem2[i] + rand()
 
+#ifdef RUNTIME_PARAMS
+/** Runtime selection of the nth tunnable instruction */
+#define INSTR_V(n)                                      \
+    do {                                                \
+        switch (INSTR[n]) {                             \
+        case 1: MEM1_2_MEM2; break;                     \
+        case 2: MEM2_2_MEM1; break;                     \
+        case 3: MEM1_2_CPU_2_MEM1; break;               \
+        case 4: MEM1_2_CPU_2_MEM2; break;               \
+        case 5: MEM2_2_CPU_2_MEM1; break;               \
+        default: break;                                 \
+        }                                               \
+    } while (0)
+
+/** The thrashing loop, instantiated once for every element type.
+ * It returns when new parameters are waiting */
+#define BUS_LOOP(name)                                  \
+    void name(volatile SIZE_A *mem1, volatile SIZE_A *mem2) \
+    {                                                   \
+        while(!param_pending)                           \
+        {                                               \
+            INSTR_V(0);                                 \
+            INSTR_V(1);                                 \
+            INSTR_V(2);                                 \
+            INSTR_V(3);                                 \
+            INSTR_V(4);                                 \
+        }                                               \
+    }
+
+#define SIZE_A uint8_t
+BUS_LOOP(bus_loop_1)
+#undef SIZE_A
+#define SIZE_A int8_t
+BUS_LOOP(bus_loop_2)
+#undef SIZE_A
+#define SIZE_A uint16_t
+BUS_LOOP(bus_loop_3)
+#undef SIZE_A
+#define SIZE_A int16_t
+BUS_LOOP(bus_loop_4)
+#undef SIZE_A
+#define SIZE_A uint32_t
+BUS_LOOP(bus_loop_5)
+#undef SIZE_A
+#define SIZE_A int32_t
+BUS_LOOP(bus_loop_6)
+#undef SIZE_A
+#define SIZE_A uint64_t
+BUS_LOOP(bus_loop_7)
+#undef SIZE_A
+#define SIZE_A int64_t
+BUS_LOOP(bus_loop_8)
+#undef SIZE_A
+
+/**
+ @brief this main func, for the runtime parameters
+ @ return 0 on success
+ */
+int main (int argc, char *argv[])
+{
+    void *mem1 = NULL;
+    void *mem2 = NULL;
+
+    param_listen(argc, argv);
+    srand(time(NULL));
+
+    do {
+        SIZE_MB = param_long(argc, argv, "SIZE_MB");
+        SIZE = param_long(argc, argv, "SIZE");
+        param_instr(argc, argv, INSTR, 5);
+
+        free(mem1);
+        free(mem2);
+
+        mem1 = malloc(MEM_SIZE);
+        DIE ( mem1 == NULL, "Unable to allocate memory\n");
+        memset(mem1, rand(), MEM_SIZE);
+        mem2 = malloc(MEM_SIZE);
+        DIE ( mem2 == NULL, "Unable to allocate memory\n");
+        memset(mem2, rand(), MEM_SIZE);
+
+        switch (SIZE) {
+        case 1: bus_loop_1(mem1, mem2); break;
+        case 2: bus_loop_2(mem1, mem2); break;
+        case 3: bus_loop_3(mem1, mem2); break;
+        case 4: bus_loop_4(mem1, mem2); break;
+        case 5: bus_loop_5(mem1, mem2); break;
+        case 6: bus_loop_6(mem1, mem2); break;
+        case 7: bus_loop_7(mem1, mem2); break;
+        default: bus_loop_8(mem1, mem2); break;
+        }
+    } while (param_update(&argc, &argv));
+
+    free(mem1);
+    free(mem2);
+
+    return 0;
+}
+
+#else
+
 /** 1st tunnable parameter */
 #if INSTR1 == 1
 #define INSTR1_V MEM1_2_MEM2
@@ -182,3 +297,5 @@ int main ()
 
 	return 0;
 }
+
+#endif
@@ -35,7 +35,9 @@
   *  1 - STORE
   *  2 - LOAD
   *  3 - NOP
-
+  *
+  * Compiled with -DRUNTIME_PARAMS, the parameters are read at startup
+  * instead (see template_params.h)
   */
 
 
@@ -47,6 +49,38 @@
 /** Store instruction */
 #define MY_INSTR_STORE(array, index, value) array[index] = value
 
+#ifdef RUNTIME_PARAMS
+#include "../template_params.h"
+
+/** Tunnable parameters, read at startup */
+static long SIZE;
+static long STRIDE;
+static int INSTR[5];
+
+/**
+ @brief Read the tunnable parameters
+ */
+static void read_params(int argc, char *argv[]) {
+  SIZE = param_long(argc, argv, "SIZE");
+  STRIDE = param_long(argc, argv, "STRIDE");
+  param_instr(argc, argv, INSTR, 5);
+}
+
+/** Runtime selection of the nth tunnable instruction */
+#define INSTR_V(n, array, index, svalue, lvalue)                    \
+    do {                                                            \
+        if (INSTR[n] == 1) MY_INSTR_STORE(array, index, svalue);    \
+        else if (INSTR[n] == 2) MY_INSTR_LOAD(array, index, lvalue);\
+    } while (0)
+
+#define INSTR1_V(array, index, svalue, lvalue) INSTR_V(0, array, index, svalue, lvalue)
+#define INSTR2_V(array, index, svalue, lvalue) INSTR_V(1, array, index, svalue, lvalue)
+#define INSTR3_V(array, index, svalue, lvalue) INSTR_V(2, array, index, svalue, lvalue)
+#define INSTR4_V(array, index, svalue, lvalue) INSTR_V(3, array, index, svalue, lvalue)
+#define INSTR5_V(array, index, svalue, lvalue) INSTR_V(4, array, index, svalue, lvalue)
+
+#else
+
 /** 1st tunnable parameter */
 #if INSTR1 == 1
 #define INSTR1_V(array, index, svalue, lvalue) MY_INSTR_STORE(array, index, svalue)
@@ -92,6 +126,8 @@
 #define INSTR5_V(array, index, svalue, lvalue)
 #endif
 
+#endif
+
 /** Helper defines for memory allocation */
 #define KB              ((1) << 10)
 
@@ -103,8 +139,12 @@
  @brief this main func
  @ return 0 on success
  */
-int main() {
+int main(int argc, char *argv[]) {
 
+#ifdef RUNTIME_PARAMS
+  read_params(argc, argv);
+  param_listen(argc, argv);
+#endif
 
   volatile int * my_array_1 = (int *) malloc(CACHE_SIZE);
   register unsigned long total = 0;
@@ -112,6 +152,15 @@ int main() {
 
   while(1) {
 
+#ifdef RUNTIME_PARAMS
+    if (param_update(&argc, &argv)) {
+      read_params(argc, argv);
+      free( (void *) my_array_1);
+      my_array_1 = (int *) malloc(CACHE_SIZE);
+      max_elements = CACHE_SIZE/sizeof(int);
+    }
+#endif
+
     for (int i = 0; i < max_elements; i+=STRIDE) {
         INSTR1_V(my_array_1, i, i, total);
         INSTR2_V(my_array_1, i, i, total);
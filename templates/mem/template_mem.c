@@ -31,6 +31,9 @@
 	* Parameters to randomise:
   *  SIZE_MB
   *  PAGE_SIZE_BYTES
+  *
+  * Compiled with -DRUNTIME_PARAMS, the parameters are read at startup
+  * instead (see template_params.h)
 	*/
 
 #include <stdio.h>
@@ -54,6 +57,44 @@
 /** memset half */
 #define MEMSET_HALF memset((void *)mem + offset/2, rand(), page_size/2)
 
+#ifdef RUNTIME_PARAMS
+#include "../template_params.h"
+
+/** Tunnable parameters, read at startup */
+static long SIZE_MB;
+static long PAGE_SIZE_BYTES;
+static int INSTR[5];
+
+/**
+ @brief Read the tunnable parameters
+ */
+static void read_params(int argc, char *argv[])
+{
+	SIZE_MB = param_long(argc, argv, "SIZE_MB");
+	PAGE_SIZE_BYTES = param_long(argc, argv, "PAGE_SIZE_BYTES");
+	param_instr(argc, argv, INSTR, 5);
+}
+
+/** Runtime selection of the nth tunnable instruction */
+#define INSTR_V(n)                                      \
+    do {                                                \
+        switch (INSTR[n]) {                             \
+        case 1: MEMSET_NORMAL; break;                   \
+        case 2: MEMSET_HALF_PAGE; break;                \
+        case 3: MEMSET_HALF_OFFSET; break;              \
+        case 4: MEMSET_HALF; break;                     \
+        default: break;                                 \
+        }                                               \
+    } while (0)
+
+#define INSTR1_V INSTR_V(0)
+#define INSTR2_V INSTR_V(1)
+#define INSTR3_V INSTR_V(2)
+#define INSTR4_V INSTR_V(3)
+#define INSTR5_V INSTR_V(4)
+
+#else
+
 /** 1st tunnable parameter */
 #if INSTR1 == 1
 #define INSTR1_V MEMSET_NORMAL 
@@ -121,12 +162,19 @@
 #define INSTR5_V
 #endif
 
+#endif
+
 /**
  @brief this main func
  @ return 0 on success
  */
-int main ()
+int main (int argc, char *argv[])
 {
+#ifdef RUNTIME_PARAMS
+	read_params(argc, argv);
+	param_listen(argc, argv);
+#endif
+
 	int page_size = PAGE_SIZE_BYTES;
 	volatile void *mem = malloc(MEM_SIZE);
 
@@ -141,6 +189,19 @@ int main ()
 
 	while(1)
 	{
+#ifdef RUNTIME_PARAMS
+		if (param_update(&argc, &argv)) {
+			read_params(argc, argv);
+			page_size = PAGE_SIZE_BYTES;
+			free((void *) mem);
+			mem = malloc(MEM_SIZE);
+			if (mem == NULL) {
+				perror("Unable to allocate memory\n");
+				exit(EXIT_FAILURE);
+			}
+		}
+#endif
+
 		size_t chunks = MEM_SIZE / page_size;
 
 		size_t chunk = rand() % chunks;
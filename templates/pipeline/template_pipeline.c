@@ -40,6 +40,9 @@
   * INSTR1
   * INSTR2
   * INSTR3
+  *
+  * Compiled with -DRUNTIME_PARAMS, the parameters are read at startup
+  * instead (see template_params.h)
 	*/
 
 
@@ -48,6 +51,30 @@
 #include <stdlib.h>
 #include <time.h>
 
+#ifdef RUNTIME_PARAMS
+#include "../template_params.h"
+
+/** Tunnable parameters, read at startup */
+static double A0, A1, A2, A3, A4, A5, A6, A7;
+static int INSTR[3];
+
+/**
+ @brief Read the tunnable parameters
+ */
+static void read_params(int argc, char *argv[])
+{
+    A0 = param_double(argc, argv, "A0");
+    A1 = param_double(argc, argv, "A1");
+    A2 = param_double(argc, argv, "A2");
+    A3 = param_double(argc, argv, "A3");
+    A4 = param_double(argc, argv, "A4");
+    A5 = param_double(argc, argv, "A5");
+    A6 = param_double(argc, argv, "A6");
+    A7 = param_double(argc, argv, "A7");
+    param_instr(argc, argv, INSTR, 3);
+}
+#endif
+
 /**
  * @brief Calculate sin with no stalls
  * This version of calculating sin is designed to keep the pipeline full by
@@ -86,6 +113,20 @@ double sin_buble_pipeline(double x)
 /** Stall pipeline polinomial calculation */
 #define BUBLE_PIPELINE(x,res) res+= sin_buble_pipeline(x)
 
+#ifdef RUNTIME_PARAMS
+/** Runtime selection of the nth tunnable instruction */
+#define INSTR_V(n, x, res)                                  \
+    do {                                                    \
+        if (INSTR[n] == 1) FULL_PIPELINE(x, res);           \
+        else if (INSTR[n] == 2) BUBLE_PIPELINE(x, res);     \
+    } while (0)
+
+#define INSTR1_V(x, res) INSTR_V(0, x, res)
+#define INSTR2_V(x, res) INSTR_V(1, x, res)
+#define INSTR3_V(x, res) INSTR_V(2, x, res)
+
+#else
+
 /** 1st tunnable parameter */
 #if INSTR1 == 1
 #define INSTR1_V(x, res) FULL_PIPELINE(x, res)
@@ -113,12 +154,19 @@ double sin_buble_pipeline(double x)
 #define INSTR3_V(x, res)
 #endif
 
+#endif
+
 /**
  @brief this main func
  @ return 0 on success
  */
-int main()
+int main(int argc, char *argv[])
 {
+#ifdef RUNTIME_PARAMS
+    read_params(argc, argv);
+    param_listen(argc, argv);
+#endif
+
     srand(time(NULL));
 
 
@@ -126,6 +174,10 @@ int main()
 
     while(1)
     {
+#ifdef RUNTIME_PARAMS
+        if (param_update(&argc, &argv))
+            read_params(argc, argv);
+#endif
         INSTR1_V(rand(), sum);
         INSTR2_V(rand(), sum);
         INSTR3_V(rand(), sum);
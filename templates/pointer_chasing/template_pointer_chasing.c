@@ -9,6 +9,19 @@
 #define CACHE_LINE_SIZE   (64)
 #define PAD_CACHE_LINEPTR (CACHE_LINE_SIZE - sizeof(void *))
 
+/*
+ * Compiled with -DRUNTIME_PARAMS, ELEMENTS and STRIDE are read at startup
+ * (see template_params.h). The INSTRn are pasted in inline assembly, so they
+ * always have to be given as defines.
+ */
+#ifdef RUNTIME_PARAMS
+#include "../template_params.h"
+
+/** Tunnable parameters, read at startup */
+static long ELEMENTS;
+static long STRIDE;
+#endif
+
 
 #if defined(__i386__) || defined(__amd64__)
 /** Load instruction x86 */
@@ -165,6 +178,11 @@ int launch()
 
 int main(int argc, char *argv[]) {
 
+#ifdef RUNTIME_PARAMS
+    ELEMENTS = param_long(argc, argv, "ELEMENTS");
+    STRIDE = param_long(argc, argv, "STRIDE");
+#endif
+
     launch();
 
     return(EXIT_SUCCESS);
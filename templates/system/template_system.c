@@ -34,6 +34,9 @@
   * INSTR3
 	* INSTR4
 	* INSTR5
+	*
+	* Compiled with -DRUNTIME_PARAMS, the parameters are read at startup
+	* instead (see template_params.h)
 	*/
 
 
@@ -53,6 +56,32 @@
 /** REOPEN */
 #define MY_INSTR_REOPEN(fp, value, filename) fclose(fp); fp = fopen(filename, "w")
 
+#ifdef RUNTIME_PARAMS
+#include "../template_params.h"
+
+/** Tunnable parameters, read at startup */
+static int INSTR[5];
+
+/** Runtime selection of the nth tunnable instruction */
+#define INSTR_V(n, fp, value, filename)                                 \
+    do {                                                                \
+        switch (INSTR[n]) {                                             \
+        case 1: MY_INSTR_SEEK(fp, value, filename); break;              \
+        case 2: MY_INSTR_READ(fp, value, filename); break;              \
+        case 3: MY_INSTR_WRITE(fp, value, filename); break;             \
+        case 4: MY_INSTR_REOPEN(fp, value, filename); break;            \
+        default: break;                                                 \
+        }                                                               \
+    } while (0)
+
+#define INSTR1_V(fp, value, filename) INSTR_V(0, fp, value, filename)
+#define INSTR2_V(fp, value, filename) INSTR_V(1, fp, value, filename)
+#define INSTR3_V(fp, value, filename) INSTR_V(2, fp, value, filename)
+#define INSTR4_V(fp, value, filename) INSTR_V(3, fp, value, filename)
+#define INSTR5_V(fp, value, filename) INSTR_V(4, fp, value, filename)
+
+#else
+
 /** 1st tunnable parameter */
 #if INSTR1 == 1
 #define INSTR1_V(fp, value, filename) MY_INSTR_SEEK(fp, value, filename)
@@ -118,20 +147,31 @@
 #define INSTR5_V(fp, value, filename)
 #endif
 
+#endif
+
 /**
  @brief this main func
  @ return 0 on success
  */
-int main ()
+int main (int argc, char *argv[])
 {
 	char file_name[25]="dummy.txt";
 	FILE *fp;
 	int value;
 
+#ifdef RUNTIME_PARAMS
+	param_instr(argc, argv, INSTR, 5);
+	param_listen(argc, argv);
+#endif
+
 	srand(time(NULL));
 
 	while(1)
 	{
+#ifdef RUNTIME_PARAMS
+		if (param_update(&argc, &argv))
+			param_instr(argc, argv, INSTR, 5);
+#endif
 		fp = fopen(file_name,"w");
  		if( fp == NULL )
    	{
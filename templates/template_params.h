@@ -0,0 +1,188 @@
+/*******************************************************************************
+ * Copyright (c) 2017 Dan Iorga, Tyler Sorenson, Alastair Donaldson
+
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+
+ * The above copyright notice and this permission notice shall be included in all
+ * copies or substantial portions of the Software.
+
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ * SOFTWARE.
+ *******************************************************************************/
+
+ /**
+  * @file template_params.h
+  * @author Dan Iorga, Tyler Sorenson, Alastair Donaldson
+  * @date 1 Nov 2017
+  * @brief Read the tunable parameters of a template at startup
+  *
+  * When a template is compiled with -DRUNTIME_PARAMS, its tunable parameters
+  * are not given as -D macros. They are read when the enemy starts, as
+  * NAME=VALUE arguments, or from the environment if they are not in argv.
+  *
+  * An enemy launched with --listen can also be reconfigured while it runs:
+  * the harness writes a new line of NAME=VALUE parameters on its stdin and
+  * sends it SIGUSR1. The template picks them up at its next outer iteration.
+  * The line starts with SEQ=n, and the enemy prints "ACK n" on its stdout
+  * once the new parameters replaced the old ones, so the harness only starts
+  * measuring after that.
+  */
+
+#ifndef TEMPLATE_PARAMS_H
+#define TEMPLATE_PARAMS_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <signal.h>
+
+/** Maximum number of parameters on a reconfiguration line */
+#define PARAM_MAX_ARGS 64
+
+/** Set by SIGUSR1 when new parameters are waiting on stdin */
+static volatile sig_atomic_t param_pending = 0;
+
+/**
+ * @brief Find the value of a parameter
+ * Looks for NAME=VALUE in the arguments first and then in the environment.
+ * Terminates execution if the parameter can not be found.
+ * @param argc The argument count of main
+ * @param argv The arguments of main
+ * @param name The name of the parameter
+ * *return The value as a string
+ */
+static inline const char *param_lookup(int argc, char *argv[], const char *name)
+{
+    size_t len = strlen(name);
+    const char *value;
+
+    for (int i = 1; i < argc; i++) {
+        if (strncmp(argv[i], name, len) == 0 && argv[i][len] == '=')
+            return argv[i] + len + 1;
+    }
+
+    value = getenv(name);
+    if (value == NULL) {
+        fprintf(stderr, "Missing parameter %s\n", name);
+        exit(EXIT_FAILURE);
+    }
+
+    return value;
+}
+
+/**
+ * @brief Read an integer parameter
+ * *return The value of the parameter
+ */
+static inline long param_long(int argc, char *argv[], const char *name)
+{
+    return strtol(param_lookup(argc, argv, name), NULL, 10);
+}
+
+/**
+ * @brief Read a floating point parameter
+ * *return The value of the parameter
+ */
+static inline double param_double(int argc, char *argv[], const char *name)
+{
+    return strtod(param_lookup(argc, argv, name), NULL);
+}
+
+/**
+ * @brief Read all the INSTRn parameters
+ * @param argc The argument count of main
+ * @param argv The arguments of main
+ * @param instr Where the instructions are stored, instr[0] holds INSTR1
+ * @param count How many instructions the template has
+ */
+static inline void param_instr(int argc, char *argv[], int *instr, int count)
+{
+    char name[16];
+
+    for (int n = 0; n < count; n++) {
+        snprintf(name, sizeof(name), "INSTR%d", n + 1);
+        instr[n] = (int) param_long(argc, argv, name);
+    }
+}
+
+/**
+ * @brief Signal handler, flags that new parameters are waiting
+ */
+static inline void param_signal(int sig)
+{
+    param_pending = 1;
+}
+
+/**
+ * @brief Accept new parameters while running, if launched with --listen
+ * @param argc The argument count of main
+ * @param argv The arguments of main
+ */
+static inline void param_listen(int argc, char *argv[])
+{
+    struct sigaction action;
+
+    for (int i = 1; i < argc; i++) {
+        if (strcmp(argv[i], "--listen") == 0) {
+            memset(&action, 0, sizeof(action));
+            action.sa_handler = param_signal;
+            action.sa_flags = SA_RESTART;
+            sigaction(SIGUSR1, &action, NULL);
+            return;
+        }
+    }
+}
+
+/**
+ * @brief Replace the parameters with the line waiting on stdin
+ * Only reads stdin after a SIGUSR1, so the check is a single load otherwise.
+ * @param argc The argument count, updated to the new parameters
+ * @param argv The arguments, updated to the new parameters
+ * *return 1 if the parameters were replaced, 0 otherwise
+ */
+static inline int param_update(int *argc, char ***argv)
+{
+    static char line[4096];
+    static char *args[PARAM_MAX_ARGS + 1];
+    char *sequence = NULL;
+    int n = 0;
+
+    if (!param_pending)
+        return 0;
+    param_pending = 0;
+
+    if (fgets(line, sizeof(line), stdin) == NULL)
+        return 0;
+
+    args[n++] = (*argv)[0];
+    for (char *token = strtok(line, " \n"); token != NULL && n < PARAM_MAX_ARGS; token = strtok(NULL, " \n")) {
+        if (strncmp(token, "SEQ=", 4) == 0)
+            sequence = token + 4;
+        else
+            args[n++] = token;
+    }
+    args[n] = NULL;
+
+    *argc = n;
+    *argv = args;
+
+    /* Tell the harness the old parameters are no longer used */
+    if (sequence != NULL) {
+        printf("ACK %s\n", sequence);
+        fflush(stdout);
+    }
+
+    return 1;
+}
+
+#endif